@@ -1,5 +1,6 @@
 # core/classifier/base.py
 from abc import ABC, abstractmethod
+from typing import List, Sequence, Tuple
 
 class BaseClassifier(ABC):
     @abstractmethod
@@ -11,3 +12,56 @@ class BaseClassifier(ABC):
     def predict_proba(self, event: dict) -> float:
         """Devuelve un score de confianza entre 0 y 1"""
         pass
+
+    def classify(self, event: dict) -> Tuple[str, float]:
+        """Etiqueta y score de un evento, en una sola pasada si el modelo lo permite"""
+        labels, scores = self.classify_batch([event])
+        return labels[0], scores[0]
+
+    def classify_batch(self, events: Sequence) -> Tuple[List[str], List[float]]:
+        """
+        Etiquetas y scores de un lote de dicts de features. Las subclases lo
+        sobrescriben para evaluar todo el lote de una vez; las que vectorizan
+        con `FeatureBuffer` aceptan también un EventBatch que lleve todas las
+        features del modelo (`EventBatch.set_feature`), si no ValueError.
+        """
+        from core.parser.event import EventBatch
+
+        if isinstance(events, EventBatch):
+            raise TypeError(f"{type(self).__name__} classifies feature dicts, not an EventBatch")
+        return [self.predict(e) for e in events], [self.predict_proba(e) for e in events]
+
+    def predict_batch(self, events: Sequence) -> List[str]:
+        return self.classify_batch(events)[0]
+
+    def predict_proba_batch(self, events: Sequence) -> List[float]:
+        return self.classify_batch(events)[1]
+
+
+class FeatureBuffer:
+    """
+    Matriz float32 (n, f) reutilizable entre lotes: crece a la potencia de 2
+    siguiente cuando un lote no cabe y devuelve una vista de las primeras n
+    filas, así el modelo no reserva memoria por llamada. La vectorización la
+    hace el `FeatureVectorizer` del modelo. No es thread-safe: un buffer por
+    clasificador y por hilo.
+    """
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.feature_order = vectorizer.feature_order
+        self._data = None
+
+    def fill(self, events, scale: bool = True):
+        """Vectoriza `events` (EventBatch, matriz ya construida o dicts) en el buffer."""
+        import numpy as np
+
+        if isinstance(events, np.ndarray):
+            events = np.ascontiguousarray(events, dtype=np.float32)
+            return self.vectorizer.apply_scaling(events.copy()) if scale else events
+
+        n = len(events)
+        width = len(self.feature_order)
+        if self._data is None or self._data.shape[0] < n:
+            self._data = np.empty((max(1 << max(n - 1, 0).bit_length(), 1), width), dtype=np.float32)
+        return self.vectorizer.transform(events, out=self._data[:n], scale=scale)
@@ -0,0 +1,70 @@
+# core/classifier/decision_cache.py
+"""
+Caché de decisiones del clasificador.
+
+Durante un ataque de fuerza bruta una misma IP produce rachas de vectores de
+features casi idénticos. La caché guarda la decisión (etiqueta, probabilidad)
+por vector cuantizado + hash del modelo adoptado, así esas rachas no pasan
+por el modelo. Cada feature se redondea a múltiplos de `quantum` veces su
+desviación típica del entrenamiento (o `quantum` a secas si el modelo no
+escala), de modo que dos eventos sólo comparten decisión si el modelo los ve
+prácticamente iguales.
+
+Expulsión LRU + TTL (`core.context.cache.TTLCache`); se vacía entera cuando
+se adopta un modelo nuevo (`core.context.utils.on_model_adopted`).
+"""
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.context.cache import TTLCache
+
+load_dotenv()
+
+DECISION_CACHE_ENABLED = os.getenv("DECISION_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "50000"))
+DECISION_CACHE_TTL = float(os.getenv("DECISION_CACHE_TTL", "300"))
+DECISION_CACHE_QUANTUM = float(os.getenv("DECISION_CACHE_QUANTUM", "0.01"))
+
+
+class DecisionCache:
+    """Decisiones por (hash del modelo, vector cuantizado). Thread-safe."""
+
+    def __init__(self, maxsize: int = DECISION_CACHE_SIZE, ttl: float = DECISION_CACHE_TTL,
+                 quantum: float = DECISION_CACHE_QUANTUM):
+        self.quantum = quantum
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def steps(self, scale) -> np.ndarray:
+        """Paso de cuantización por feature a partir de la escala del vectorizer (o None)."""
+        if scale is None:
+            return None
+        return np.asarray(scale, dtype=np.float64) * self.quantum
+
+    def keys(self, model_hash: str, X: np.ndarray, steps: Optional[np.ndarray] = None) -> List[tuple]:
+        """Una clave por fila de la matriz de features sin escalar `X`."""
+        q = X / (steps if steps is not None else self.quantum)
+        q = np.floor(q + 0.5).astype(np.int64)
+        return [(model_hash, row.tobytes()) for row in q]
+
+    def get_many(self, keys: Sequence[tuple]) -> list:
+        get = self._cache.get
+        return [get(key) for key in keys]
+
+    def set_many(self, keys: Sequence[tuple], decisions: Sequence[tuple]):
+        for key, decision in zip(keys, decisions):
+            self._cache.set(key, decision)
+
+    def invalidate(self, *_):
+        """Vacía la caché (se registra como listener de adopción de modelos)."""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["quantum"] = self.quantum
+        return stats
@@ -0,0 +1,104 @@
+# core/classifier/export.py
+"""
+Exporta un checkpoint de FirewallNet (+ StandardScaler) al artefacto que
+carga `core.classifier.numpy_runtime`. Necesita torch y joblib; el runtime no.
+"""
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from .numpy_runtime import NumpyNNClassifier, write_artifact
+
+ARTIFACT_VERSION = 1
+
+
+def _dense_layers(state_dict) -> list:
+    """
+    Nombres de las capas Linear en orden de definición (`fc1`, `fc2`, ...).
+    Cualquier otro parámetro o buffer (BatchNorm, embeddings, ...) no lo sabe
+    evaluar el runtime, así que se rechaza en lugar de exportar algo distinto.
+    """
+    layers = []
+    for key, tensor in state_dict.items():
+        name, _, kind = key.rpartition(".")
+        if kind == "weight" and tensor.dim() == 2 and f"{name}.bias" in state_dict:
+            layers.append(name)
+        elif not (kind == "bias" and name in layers):
+            raise ValueError(f"Unsupported parameter in FirewallNet state_dict: {key}")
+    return layers
+
+
+def export_firewallnet(checkpoint_path: str, out_path: str, scaler_path: Optional[str] = None,
+                       check_rows: int = 1024) -> Dict:
+    """
+    Escribe el artefacto y comprueba sobre `check_rows` filas aleatorias que
+    el runtime NumPy da las mismas etiquetas que el modelo torch (y las mismas
+    probabilidades salvo redondeo float32). Si no coinciden borra el artefacto
+    y lanza ValueError.
+    """
+    import torch
+    import torch.nn.functional as F
+    from joblib import load
+    from models.net import FirewallNet
+
+    checkpoint = torch.load(checkpoint_path, map_location="cpu", weights_only=False)
+    state_dict = checkpoint["model_state_dict"]
+    feature_order = list(checkpoint["feature_order"])
+    classes = [str(c) for c in checkpoint["label_encoder"].classes_]
+    layers = _dense_layers(state_dict)
+
+    arrays = {}
+    for name in layers:
+        arrays[f"{name}.weight"] = state_dict[f"{name}.weight"].detach().cpu().numpy().astype(np.float32)
+        arrays[f"{name}.bias"] = state_dict[f"{name}.bias"].detach().cpu().numpy().astype(np.float32)
+
+    scaler = load(scaler_path) if scaler_path else None
+    if scaler is None and checkpoint.get("vectorizer"):
+        from core.vectorizer.features import FeatureVectorizer
+        scaler = FeatureVectorizer.from_checkpoint(checkpoint)
+        if scaler.mean_ is None:
+            scaler = None
+    if scaler is not None:
+        arrays["scaler.mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scaler.scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    header = {
+        "version"       : ARTIFACT_VERSION,
+        "feature_order" : feature_order,
+        "classes"       : classes,
+        "layers"        : layers,
+        "activation"    : "relu",
+        "source"        : os.path.basename(checkpoint_path),
+    }
+    write_artifact(out_path, header, arrays)
+
+    # Verificación contra el modelo torch
+    model = FirewallNet(input_size=len(feature_order), output_size=arrays[f"{layers[-1]}.weight"].shape[0])
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    rng = np.random.default_rng(42)
+    x = rng.standard_normal((check_rows, len(feature_order)))
+    if scaler is not None:
+        x = x * scaler.scale_ + scaler.mean_
+    with torch.inference_mode():
+        scaled = scaler.transform(x) if scaler is not None else x
+        expected = F.softmax(model(torch.tensor(scaled, dtype=torch.float32)), dim=1).numpy()
+
+    runtime = NumpyNNClassifier(out_path)
+    probs = runtime.probabilities(x)
+    max_diff = float(np.abs(probs - expected).max())
+    if not np.array_equal(probs.argmax(axis=1), expected.argmax(axis=1)) or max_diff > 1e-5:
+        del runtime
+        os.remove(out_path)
+        raise ValueError(f"NumPy runtime does not match the torch model (max prob diff {max_diff:.2e})")
+
+    return {
+        "path"          : out_path,
+        "bytes"         : os.path.getsize(out_path),
+        "layers"        : layers,
+        "features"      : len(feature_order),
+        "classes"       : classes,
+        "max_prob_diff" : max_diff,
+    }
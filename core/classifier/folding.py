@@ -0,0 +1,44 @@
+# core/classifier/folding.py
+"""
+Plegado del StandardScaler en la primera capa lineal de FirewallNet.
+
+    W · ((x - mean) / scale) + b  =  (W / scale) · x + (b - (W / scale) · mean)
+
+Con los pesos plegados la red recibe las features crudas y el escalado
+desaparece del camino de inferencia. El cálculo se hace en float64 y se
+guarda en el dtype original de los pesos.
+"""
+
+
+def first_linear_layer(state_dict) -> str:
+    """Nombre de la primera capa con pesos 2-D (`fc1` en FirewallNet)."""
+    for key, tensor in state_dict.items():
+        name, _, kind = key.rpartition(".")
+        if kind == "weight" and tensor.dim() == 2:
+            return name
+    raise ValueError("No linear layer found in state_dict")
+
+
+def fold_scaler(state_dict, mean, scale) -> dict:
+    """
+    Devuelve una copia de `state_dict` con `mean`/`scale` (arrays de longitud
+    igual a las entradas, o None si el scaler no centra / no escala) plegados
+    en la primera capa lineal.
+    """
+    import torch
+
+    name = first_linear_layer(state_dict)
+    weight = state_dict[f"{name}.weight"]
+    bias = state_dict[f"{name}.bias"]
+
+    folded_weight = weight.double()
+    if scale is not None:
+        folded_weight = folded_weight / torch.as_tensor(scale, dtype=torch.float64)
+    folded_bias = bias.double()
+    if mean is not None:
+        folded_bias = folded_bias - folded_weight @ torch.as_tensor(mean, dtype=torch.float64)
+
+    folded = dict(state_dict)
+    folded[f"{name}.weight"] = folded_weight.to(weight.dtype)
+    folded[f"{name}.bias"] = folded_bias.to(bias.dtype)
+    return folded
@@ -1,15 +1,18 @@
 # core/classifier/model.py
 import joblib
 import numpy as np
-from .base import BaseClassifier
+from .base import BaseClassifier, FeatureBuffer
+from core.vectorizer.features import FeatureVectorizer
 
 class MLClassifier(BaseClassifier):
     def __init__(self, model_path: str, feature_order: list[str]):
         self.model = joblib.load(model_path)
         self.feature_order = feature_order
+        self.vectorizer = FeatureVectorizer.from_feature_order(feature_order)
+        self._buffer = FeatureBuffer(self.vectorizer)
 
     def _extract_features(self, event: dict) -> np.ndarray:
-        return np.array([[event.get(feat, 0) for feat in self.feature_order]])
+        return self.vectorizer.transform([event])
 
     def predict(self, event: dict) -> str:
         x = self._extract_features(event)
@@ -18,3 +21,18 @@ class MLClassifier(BaseClassifier):
     def predict_proba(self, event: dict) -> float:
         x = self._extract_features(event)
         return float(np.max(self.model.predict_proba(x)))
+
+    def classify_batch(self, events):
+        """
+        Una sola llamada a `predict_proba` para todo el lote: la etiqueta es
+        el argmax (lo mismo que `predict` en los clasificadores de sklearn).
+        Un EventBatch sin todas las features del modelo da ValueError.
+        """
+        if len(events) == 0:
+            return [], []
+        x = self._buffer.fill(events)
+        if not hasattr(self.model, "predict_proba"):
+            return list(self.model.predict(x)), [1.0] * len(x)
+        probs = self.model.predict_proba(x)
+        idx = np.argmax(probs, axis=1)
+        return self.model.classes_[idx].tolist(), probs[np.arange(len(idx)), idx].tolist()
@@ -1,15 +1,18 @@
 # core/classifier/nn_model.py
 
+import joblib
 import torch
 import torch.nn.functional as F
 import numpy as np
-from .base import BaseClassifier
+from .base import BaseClassifier, FeatureBuffer
+from .predictor import SCALER_FILE
 from core.config import MODEL_PATH
+from core.vectorizer.features import FeatureVectorizer
 from models.net import FirewallNet
 
 
 class NNClassifier(BaseClassifier):
-    def __init__(self, model_path: str = MODEL_PATH):
+    def __init__(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_FILE):
         # Cargar el checkpoint entrenado
         checkpoint = torch.load(model_path, map_location=torch.device("cpu"))
 
@@ -22,18 +25,43 @@ class NNClassifier(BaseClassifier):
         self.model.load_state_dict(checkpoint["model_state_dict"])
         self.model.eval()
 
+        self.classes = np.asarray(self.label_encoder.classes_)
+        # Los checkpoints nuevos guardan su vectorizer (categorías + escalado
+        # del entrenamiento); los antiguos se reconstruyen desde feature_order
+        # y el scaler del entrenamiento, así que ambos reciben features escaladas.
+        scaler = None if checkpoint.get("vectorizer") else joblib.load(scaler_path)
+        self.vectorizer = FeatureVectorizer.from_checkpoint(checkpoint, scaler)
+        self._buffer = FeatureBuffer(self.vectorizer)
+
     def _vectorize(self, event: dict) -> torch.Tensor:
-        values = [float(event.get(f, 0)) for f in self.feature_order]
-        return torch.tensor([values], dtype=torch.float32)
+        return torch.from_numpy(self.vectorizer.transform([event]))
+
+    def _forward(self, x: torch.Tensor):
+        """Una sola pasada: devuelve (índices de clase, probabilidad máxima) como arrays"""
+        with torch.inference_mode():
+            probs = F.softmax(self.model(x), dim=1)
+            scores, idx = torch.max(probs, dim=1)
+        return idx.numpy(), scores.numpy()
 
     def predict(self, event: dict) -> str:
-        x = self._vectorize(event)
-        logits = self.model(x)
-        predicted_idx = torch.argmax(logits, dim=1).item()
-        return self.label_encoder.inverse_transform([predicted_idx])[0]
+        return self.classify(event)[0]
 
     def predict_proba(self, event: dict) -> float:
-        x = self._vectorize(event)
-        logits = self.model(x)
-        probs = F.softmax(logits, dim=1)
-        return float(torch.max(probs))
+        return self.classify(event)[1]
+
+    def classify(self, event: dict):
+        idx, scores = self._forward(self._vectorize(event))
+        return self.classes[idx[0]], float(scores[0])
+
+    def classify_batch(self, events):
+        """
+        Vectoriza el lote (matriz, lista de dicts o un EventBatch con todas
+        las features del modelo; si le falta alguna, ValueError) en un buffer
+        preasignado, hace un único forward y decodifica las etiquetas
+        indexando `classes_` (equivale a `inverse_transform`).
+        """
+        if len(events) == 0:
+            return [], []
+        x = torch.from_numpy(self._buffer.fill(events))
+        idx, scores = self._forward(x)
+        return self.classes[idx].tolist(), scores.tolist()
@@ -0,0 +1,148 @@
+# core/classifier/numpy_runtime.py
+"""
+Inference de FirewallNet solo con NumPy.
+
+Carga el artefacto que escribe `core.classifier.export` (pesos, estadísticas
+del StandardScaler, orden de features y clases) mapeado en memoria: arrancar
+un scorer cuesta milisegundos y varios procesos comparten las mismas páginas
+de pesos. No importa torch, sklearn ni pandas.
+
+Formato del artefacto (little-endian):
+
+    MAGIC (8 bytes) | uint32 longitud del header | header JSON | padding | arrays
+
+El header describe cada array (offset relativo al inicio de la zona de
+datos, shape, dtype); cada array empieza alineado a 64 bytes.
+"""
+import json
+import struct
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from core.vectorizer.features import FeatureVectorizer
+
+from .base import BaseClassifier, FeatureBuffer
+
+MAGIC = b"AFWNET\x00\x01"
+ALIGNMENT = 64
+
+
+def _data_offset(header_size: int) -> int:
+    end = len(MAGIC) + 4 + header_size
+    return -(-end // ALIGNMENT) * ALIGNMENT
+
+
+def read_artifact(path: str) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """Devuelve (header, arrays); los arrays son vistas de solo lectura sobre un memmap."""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a FirewallNet artifact")
+        (header_size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_size))
+
+    offset = _data_offset(header_size)
+    data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+        start = spec["offset"]
+        arrays[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+    return header, arrays
+
+
+def write_artifact(path: str, header: Dict, arrays: Dict[str, np.ndarray]):
+    """Escribe `arrays` y `header` (al que se añade la tabla de arrays) en el formato de arriba."""
+    table = {}
+    offset = 0
+    blobs = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        table[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        blob = array.tobytes()
+        blobs.append((offset, blob))
+        offset = -(-(offset + len(blob)) // ALIGNMENT) * ALIGNMENT
+
+    header = dict(header, arrays=table)
+    raw_header = json.dumps(header).encode()
+    data_start = _data_offset(len(raw_header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(raw_header)))
+        f.write(raw_header)
+        for blob_offset, blob in blobs:
+            f.seek(data_start + blob_offset)
+            f.write(blob)
+        f.truncate(data_start + offset)
+
+
+class NumpyFirewallNet:
+    """
+    Red densa (Linear + ReLU, sin activación en la última capa) evaluada con
+    NumPy en float32, igual que FirewallNet en modo eval.
+    """
+
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray]]):
+        # Se guardan las matrices transpuestas para hacer x @ W.T sin copias.
+        self.layers = [(weight.T, bias) for weight, bias in layers]
+
+    def logits(self, x: np.ndarray) -> np.ndarray:
+        last = len(self.layers) - 1
+        for i, (weight_t, bias) in enumerate(self.layers):
+            x = x @ weight_t
+            x += bias
+            if i < last:
+                np.maximum(x, 0, out=x)
+        return x
+
+
+class NumpyNNClassifier(BaseClassifier):
+    """
+    Clasificador equivalente a NNClassifier + scaler sin torch: escala con
+    las estadísticas del StandardScaler (en float64, como sklearn), evalúa la
+    red y devuelve la clase de mayor probabilidad y esa probabilidad.
+    """
+
+    def __init__(self, artifact_path: str):
+        self.artifact_path = artifact_path
+        header, arrays = read_artifact(artifact_path)
+        self.header = header
+        self.feature_order: List[str] = header["feature_order"]
+        self.classes = np.asarray(header["classes"])
+        self.net = NumpyFirewallNet([
+            (arrays[f"{name}.weight"], arrays[f"{name}.bias"]) for name in header["layers"]
+        ])
+        self.scaler_mean = arrays.get("scaler.mean")
+        self.scaler_scale = arrays.get("scaler.scale")
+        # Vectorizer sin estadísticas: `_scale()` es la única estandarización
+        self._buffer = FeatureBuffer(FeatureVectorizer.from_feature_order(self.feature_order))
+
+    def _scale(self, x: np.ndarray) -> np.ndarray:
+        if self.scaler_mean is None:
+            return x
+        return ((x - self.scaler_mean) / self.scaler_scale).astype(np.float32)
+
+    def probabilities(self, events) -> np.ndarray:
+        """Matriz (n, clases) de probabilidades softmax."""
+        logits = self.net.logits(self._scale(self._buffer.fill(events, scale=False)))
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def classify_batch(self, events: Sequence):
+        if len(events) == 0:
+            return [], []
+        probs = self.probabilities(events)
+        idx = probs.argmax(axis=1)
+        return self.classes[idx].tolist(), probs[np.arange(len(idx)), idx].tolist()
+
+    def predict(self, event: dict) -> str:
+        return self.classify(event)[0]
+
+    def predict_proba(self, event: dict) -> float:
+        return self.classify(event)[1]
@@ -0,0 +1,384 @@
+# core/classifier/predictor.py
+"""
+Predicción de la acción (label_action) para un evento crudo.
+
+Importar este módulo no toca el disco, Postgres ni torch: el modelo, el
+scaler y el label encoder se cargan la primera vez que se necesitan (o al
+llamar a `warm_up()`), una sola vez por proceso, y la verificación de
+integridad se cachea por tamaño+mtime del fichero del modelo.
+
+    from core.classifier.predictor import get_predictor
+    predictor = get_predictor()
+    predictor.warm_up()                     # opcional, al arrancar el servicio
+    predictor.predict_action(event, score, recent_event_count)
+
+Con DECISION_CACHE_ENABLED=1 el predictor compartido consulta antes una
+`DecisionCache` (ver `core.classifier.decision_cache`), que se vacía cuando
+`register_training_run` adopta un modelo nuevo en este proceso. Los
+procesos que no entrenan (el daemon de scoring) llaman periódicamente a
+`check_adopted_model()` para enterarse de las adopciones hechas por otros.
+
+Con ENRICH_FEATURE_SOURCE=store las features de contexto salen de un
+`IPFeatureStore` en memoria (cargado en `warm_up()`) en vez de Postgres, y
+cada evento predicho se añade al store con su score y la acción decidida.
+Con ENRICH_FEATURE_SOURCE=rollup el score y la acción se suman a los
+rollups por IP (`record_outcomes`), en una llamada por lote.
+"""
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+MODEL_FILE = "models/firewall_nn.pt"
+SCALER_FILE = "models/nn_firewall_scaler.joblib"
+
+
+def build_feature_row(event: Dict, score, recent_event_count, enriched: Dict) -> Dict:
+    """
+    Features básicas del evento + las de contexto (`enrich_event`). Las
+    categóricas van en crudo: el one-hot lo hace el `FeatureVectorizer` del
+    modelo con las mismas categorías que vio el entrenamiento.
+    """
+    hour = datetime.fromisoformat(event['timestamp'].replace("Z", "+00:00")).hour
+    success = int(bool(event.get('success')))
+
+    row = {
+        'hour'                  : hour,
+        'score'                 : score,
+        'recent_event_count'    : recent_event_count,
+        'success'               : success,
+        'action'                : event['action'],
+        'parse_status'          : event['parse_status'],
+    }
+    row.update(enriched)
+    return row
+
+
+class _ModelState:
+    """Modelo, vectorizer y encoder cargados, más lo que se deriva de ellos."""
+
+    def __init__(self, model, scaler, vectorizer, label_encoder, folded: bool,
+                 model_hash: Optional[str] = None, cache_steps=None):
+        import numpy as np
+
+        self.model = model
+        self.scaler = scaler
+        self.vectorizer = vectorizer
+        self.feature_order = vectorizer.feature_order
+        self.label_encoder = label_encoder
+        self.classes = np.asarray(label_encoder.classes_)
+        # Con el escalado plegado en la red las features entran crudas (sin
+        # copia hacia torch); si no, las escala el vectorizer.
+        self.folded = folded
+        # Para la caché de decisiones: hash del fichero y paso de cuantización.
+        self.model_hash = model_hash
+        self.cache_steps = cache_steps
+
+
+class ActionPredictor:
+    """
+    Carga perezosa y cacheada del modelo de acciones. Es seguro usarlo desde
+    varios hilos: la carga se hace una sola vez bajo un lock y cada hilo
+    tiene su propio buffer de features.
+
+    Con `fold_scaler=True` la media/escala del StandardScaler se pliegan en la
+    primera capa lineal al cargar (ver `core.classifier.folding`), y predecir
+    un evento es escribir sus features en el buffer + un forward.
+
+    Con `decision_cache` las decisiones se memorizan por vector cuantizado +
+    hash del modelo; al adoptarse un modelo nuevo se vacía la caché y se
+    recarga el modelo en la siguiente predicción.
+
+    Con `feature_store` (un `IPFeatureStore`) el contexto se lee del store y
+    los eventos predichos se registran en él. En un lote todos los eventos
+    se enriquecen antes de registrar ninguno.
+    """
+
+    def __init__(self, model_path: str = MODEL_FILE, scaler_path: str = SCALER_FILE,
+                 verify_integrity: bool = True, fold_scaler: bool = True,
+                 decision_cache=None, feature_store=None):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.verify_integrity = verify_integrity
+        self.fold_scaler = fold_scaler
+        self.decision_cache = decision_cache
+        self.feature_store = feature_store
+        self._store_loaded = False
+        self._listening = False
+        self._adopted = None        # (training_run_id, model_hash) visto en la última consulta
+        self._state: Optional[_ModelState] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    def _load(self) -> _ModelState:
+        import torch
+        from joblib import load
+        from core.vectorizer.features import FeatureVectorizer
+        from models.net import FirewallNet
+
+        if self.verify_integrity:
+            # Check model integrity
+            # This ensures the model has not been tampered with or corrupted.
+            from core.context.utils import verify_model_integrity
+            verify_model_integrity(self.model_path)
+
+        checkpoint = torch.load(self.model_path, map_location="cpu", weights_only=False)
+        scaler = load(self.scaler_path)
+        vectorizer = FeatureVectorizer.from_checkpoint(checkpoint, scaler)
+        state_dict = checkpoint["model_state_dict"]
+
+        # Inferir tamaño de salida desde los pesos entrenados
+        fc2_weight = state_dict["fc2.weight"]
+        output_size = fc2_weight.shape[0]
+
+        if self.fold_scaler:
+            from .folding import fold_scaler
+            state_dict = fold_scaler(state_dict, vectorizer.mean_, vectorizer.scale_)
+
+        model = FirewallNet(input_size=len(vectorizer), output_size=output_size)
+        model.load_state_dict(state_dict)
+        model.eval()
+
+        model_hash = cache_steps = None
+        if self.decision_cache is not None:
+            from core.context.utils import compute_sha256, on_model_adopted
+            model_hash = compute_sha256(self.model_path)
+            cache_steps = self.decision_cache.steps(vectorizer.scale_)
+            if not self._listening:
+                on_model_adopted(self._on_model_adopted)
+                self._listening = True
+
+        return _ModelState(model, scaler, vectorizer, checkpoint["label_encoder"],
+                           folded=self.fold_scaler, model_hash=model_hash, cache_steps=cache_steps)
+
+    @property
+    def state(self) -> _ModelState:
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = self._load()
+                state = self._state
+        return state
+
+    def warm_up(self):
+        """
+        Carga y verifica el modelo, hace una inferencia en vacío y, si hay
+        feature store, lo carga desde Postgres (arranque de servicios).
+        """
+        import numpy as np
+
+        state = self.state
+        self._infer(state, np.zeros((1, len(state.feature_order)), dtype=np.float32))
+        if self.feature_store is not None and not self._store_loaded:
+            self.feature_store.warm_start()
+            self._store_loaded = True
+        return self
+
+    def reset(self):
+        """Descarta el estado cargado; la próxima predicción vuelve a cargar el modelo."""
+        with self._lock:
+            self._state = None
+
+    def _on_model_adopted(self, model_hash):
+        if self.decision_cache is not None:
+            self.decision_cache.invalidate()
+        self.reset()
+
+    def check_adopted_model(self) -> bool:
+        """
+        Consulta el último modelo adoptado en training_runs. Si cambió desde
+        la consulta anterior (adoptado por otro proceso), vacía la caché de
+        decisiones y recarga el modelo ya, no en la siguiente predicción.
+        La primera llamada sólo toma nota. Devuelve True si recargó.
+        """
+        from core.context.utils import get_active_model_info
+
+        info = get_active_model_info()
+        adopted = (info["training_run_id"], info["model_hash"])
+        previous, self._adopted = self._adopted, adopted
+        if previous is None or adopted == previous:
+            return False
+        self._on_model_adopted(info["model_hash"])
+        self.warm_up()
+        return True
+
+    @property
+    def feature_order(self):
+        return self.state.feature_order
+
+    def vectorize(self, row: Dict):
+        """Matriz (1, f) sin escalar en el orden del modelo; las features ausentes valen 0."""
+        return self.state.vectorizer.transform([row], scale=False)
+
+    def _row_buffer(self, state: _ModelState):
+        """Buffer (1, f) reutilizable del hilo actual para `state`."""
+        import numpy as np
+
+        cached = getattr(self._local, "buffer", None)
+        if cached is None or cached[0] is not state:
+            cached = (state, np.empty((1, len(state.feature_order)), dtype=np.float32))
+            self._local.buffer = cached
+        return cached[1]
+
+    def _infer(self, state: _ModelState, x):
+        """
+        Probabilidades softmax de las filas sin escalar `x` con el modelo de
+        `state`, el mismo que vectorizó `x` (no se relee `self.state`, que
+        `check_adopted_model()` puede cambiar entre medias).
+        """
+        import numpy as np
+        import torch
+        import torch.nn.functional as F
+
+        if not state.folded:
+            x = state.vectorizer.transform(x)
+        with torch.inference_mode():
+            logits = state.model(torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)))
+            return F.softmax(logits, dim=1).numpy()
+
+    def _decide(self, state: _ModelState, x):
+        """
+        (etiquetas, probabilidad máxima) de las filas sin escalar `x`: las que
+        están en la caché de decisiones no pasan por el modelo.
+        """
+        import numpy as np
+
+        cache = self.decision_cache
+        if cache is None:
+            misses = None
+        else:
+            keys = cache.keys(state.model_hash, x, state.cache_steps)
+            decisions = cache.get_many(keys)
+            misses = [i for i, decision in enumerate(decisions) if decision is None]
+            if not misses:
+                return [d[0] for d in decisions], [d[1] for d in decisions]
+
+        probs = self._infer(state, x if misses is None or len(misses) == len(x) else x[misses])
+        idx = probs.argmax(axis=1)
+        labels = state.classes[idx].tolist()
+        best = probs[np.arange(len(idx)), idx].tolist()
+        if cache is None:
+            return labels, best
+
+        computed = list(zip(labels, best))
+        cache.set_many([keys[i] for i in misses], computed)
+        for i, decision in zip(misses, computed):
+            decisions[i] = decision
+        return [d[0] for d in decisions], [d[1] for d in decisions]
+
+    def _enrich(self, events):
+        from core.context.context_enricher import enrich_events
+
+        if self.feature_store is not None:
+            return self.feature_store.enrich_events(events)
+        return enrich_events(events)
+
+    def _record(self, events, scores, labels):
+        """
+        Registra score y acción decidida de los eventos en el feature store,
+        si lo hay, o en los rollups de Postgres con ENRICH_FEATURE_SOURCE=rollup.
+        Un fallo al escribir los rollups no anula la decisión ya tomada.
+        """
+        if self.feature_store is not None:
+            self.feature_store.record_outcomes(events, scores, labels)
+            return
+        from core.context.context_enricher import ENRICH_FEATURE_SOURCE, record_outcomes
+
+        if ENRICH_FEATURE_SOURCE == "rollup":
+            try:
+                record_outcomes(events, scores, labels)
+            except Exception as e:
+                print(f"⚠️ Could not record outcomes in the rollups: {e}")
+
+    def predict_action(self, event: Dict, score, recent_event_count, debug: bool = False) -> str:
+        from core.context.context_enricher import enrich_event
+
+        if self.feature_store is not None:
+            enriched = self.feature_store.features(event)
+        else:
+            enriched = enrich_event(event, debug = debug)
+        row = build_feature_row(event, score, recent_event_count, enriched)
+
+        if debug:
+            print("🧪 Final feature vector:")
+            for k, v in row.items():
+                print(f"{k:25} → {v}")
+
+        state = self.state
+        buffer = state.vectorizer.transform([row], out=self._row_buffer(state), scale=False)
+        if not debug:
+            label = self._decide(state, buffer)[0][0]
+        else:
+            # En debug se evalúa siempre el modelo para mostrar todas las probabilidades.
+            probs = self._infer(state, buffer)[0]
+            label = state.classes[probs.argmax()]
+
+            print("\n🔍 Probabilities per class:")
+            for cls, prob in zip(state.classes, probs):
+                print(f"  {cls:8} → {prob:.4f}")
+
+        self._record([event], [score], [label])
+        return label
+
+    def predict_actions(self, requests):
+        """
+        Versión por lotes de `predict_action` para una lista de
+        (event, score, recent_event_count): un único `enrich_events` y una
+        única pasada del modelo. Devuelve (etiquetas, probabilidad máxima).
+        """
+        if not requests:
+            return [], []
+        state = self.state
+        events = [event for event, _, _ in requests]
+        enriched = self._enrich(events)
+        rows = [
+            build_feature_row(event, score, recent_event_count, extra)
+            for (event, score, recent_event_count), extra in zip(requests, enriched)
+        ]
+        x = state.vectorizer.transform(rows, scale=False)
+        labels, probs = self._decide(state, x)
+        self._record(events, [score for _, score, _ in requests], labels)
+        return labels, probs
+
+
+_default_predictor: Optional[ActionPredictor] = None
+_default_lock = threading.Lock()
+
+
+def get_predictor() -> ActionPredictor:
+    """Predictor compartido del proceso (sin cargar hasta que se use)."""
+    global _default_predictor
+    if _default_predictor is None:
+        with _default_lock:
+            if _default_predictor is None:
+                from core.context.context_enricher import ENRICH_FEATURE_SOURCE
+                from .decision_cache import DECISION_CACHE_ENABLED, DecisionCache
+                cache = DecisionCache() if DECISION_CACHE_ENABLED else None
+                store = None
+                if ENRICH_FEATURE_SOURCE == "store":
+                    from core.context.feature_store import IPFeatureStore
+                    store = IPFeatureStore()
+                _default_predictor = ActionPredictor(decision_cache=cache, feature_store=store)
+    return _default_predictor
+
+
+def warm_up() -> ActionPredictor:
+    return get_predictor().warm_up()
+
+
+def predict_action(event, score, recent_event_count, debug = False):
+    return get_predictor().predict_action(event, score, recent_event_count, debug = debug)
+
+
+def vectorize_raw_event(event, score, recent_event_count):
+    """DataFrame de una fila con las features en el orden del modelo."""
+    import pandas as pd
+    from core.context.context_enricher import enrich_event
+
+    row = build_feature_row(event, score, recent_event_count, enrich_event(event))
+    vectorizer = get_predictor().state.vectorizer
+    return pd.DataFrame(vectorizer.transform([row], scale=False), columns=vectorizer.feature_order)
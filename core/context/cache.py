@@ -0,0 +1,81 @@
+"""
+Bounded TTL + LRU cache used in front of per-IP lookups.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Dict-like cache where entries expire `ttl` seconds after being set and,
+    when more than `maxsize` entries are held, the least recently used one
+    is evicted. Thread-safe. Keeps hit/miss/eviction counters for `stats()`.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key) -> bool:
+        """Drops `key`. Returns True if it was cached."""
+        with self._lock:
+            if self._data.pop(key, None) is None:
+                return False
+            self.invalidations += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size"          : len(self._data),
+                "maxsize"       : self.maxsize,
+                "ttl"           : self.ttl,
+                "hits"          : self.hits,
+                "misses"        : self.misses,
+                "hit_rate"      : self.hits / lookups if lookups else 0.0,
+                "evictions"     : self.evictions,
+                "expirations"   : self.expirations,
+                "invalidations" : self.invalidations,
+            }
@@ -1,27 +1,87 @@
-import psycopg2
 from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
 import os
 import pandas as pd
 
-load_dotenv()
-PG_DSN = os.getenv("PG_DSN")
+from core.context.cache import TTLCache
+from core.storage.pool import connection
 
-def enrich_event(event: dict, debug: bool = False) -> dict:
+# Hot attacker IPs hit the enricher hundreds of times per minute, while their
+# block history and risk score change rarely. Both lookups are cached per IP.
+# `record_outcomes` invalidates the block history of the IPs it records a
+# block for; `ip_risk_score` and the view's labels are written outside this
+# process, so those are at most ENRICH_CACHE_TTL seconds stale.
+ENRICH_CACHE_TTL = float(os.getenv("ENRICH_CACHE_TTL", "60"))
+ENRICH_CACHE_SIZE = int(os.getenv("ENRICH_CACHE_SIZE", "10000"))
+
+# "view": aggregate `event_features_for_nn` per IP (cost grows with history).
+# "rollup": read the per-IP hourly rollups of db/schema.sql (flat cost). Event
+#           counts there cover all of log_events, not only the rows of
+#           event_features_for_nn the view source counts, so count/ratio
+#           features can differ between the two (see db/functions.sql).
+#           Predictions are added with `record_outcomes` (ActionPredictor).
+# "store": the shared predictor keeps an in-process `IPFeatureStore` instead
+#          (see core.classifier.predictor); this module then reads the view.
+ENRICH_FEATURE_SOURCE = os.getenv("ENRICH_FEATURE_SOURCE", "view")
+
+block_history_cache = TTLCache(maxsize=ENRICH_CACHE_SIZE, ttl=ENRICH_CACHE_TTL)
+risk_score_cache = TTLCache(maxsize=ENRICH_CACHE_SIZE, ttl=ENRICH_CACHE_TTL)
+
+_MISSING = object()
+
+
+def invalidate_block_history(ip: str = None):
+    """Call after writing a block decision for `ip` (or for many IPs, with None)."""
+    if ip is None:
+        block_history_cache.clear()
+    else:
+        block_history_cache.invalidate(ip)
+
+
+def enrichment_cache_stats() -> dict:
+    return {
+        "block_history" : block_history_cache.stats(),
+        "risk_score"    : risk_score_cache.stats(),
+    }
+
+
+def _event_timestamp(event: dict) -> datetime:
     raw_ts = event.get("timestamp")
 
     if isinstance(raw_ts, pd.Timestamp):
-        timestamp = raw_ts.to_pydatetime().astimezone(timezone.utc)
+        return raw_ts.to_pydatetime().astimezone(timezone.utc)
     elif isinstance(raw_ts, str):
-        timestamp = datetime.fromisoformat(raw_ts.replace("Z", "+00:00")).astimezone(timezone.utc)
+        return datetime.fromisoformat(raw_ts.replace("Z", "+00:00")).astimezone(timezone.utc)
     else:
         raise ValueError(f"Unsupported timestamp format: {type(raw_ts)} — {raw_ts}")
 
-    # timestamp = datetime.fromisoformat(event["timestamp"].replace("Z", "+00:00")).astimezone(timezone.utc)
+
+def _risk_features(timestamp: datetime, row) -> dict:
+    """
+    Builds `ip_risk_score` / `ip_inactive_days` from an `ip_risk_score` row
+    (score, last_event), or from None when the IP has no row.
+    """
+    if not row:
+        return {"ip_risk_score": 0.0, "ip_inactive_days": 999}
+
+    risk_score, last_seen = row
+    features = {"ip_risk_score": float(risk_score) if risk_score else 0.0}
+    if last_seen:
+        days = (timestamp - last_seen).days
+        features["ip_inactive_days"] = days if days >= 0 else 999
+    else:
+        features["ip_inactive_days"] = 999
+    return features
+
+
+def enrich_event(event: dict, debug: bool = False) -> dict:
+    if ENRICH_FEATURE_SOURCE == "rollup":
+        return enrich_events([event], debug)[0]
+
+    timestamp = _event_timestamp(event)
     ip = event.get("ip", "")
     enriched = {}
 
-    with psycopg2.connect(PG_DSN) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
 
             def query_and_fetch(sql, params, key, fallback_sql=None, fallback_params=None):
@@ -44,14 +104,19 @@ def enrich_event(event: dict, debug: bool = False) -> dict:
 
             # 1. IP: Block history
             # This query counts how many times the IP has been blocked in the past.
-            query_and_fetch(
-                """
-                SELECT COUNT(*) FROM event_features_for_nn
-                WHERE ip = %s::inet AND label_action = 'block';
-                """,
-                (ip,),
-                key="ip_block_history"
-            )
+            block_history = block_history_cache.get(ip)
+            if block_history is None:
+                query_and_fetch(
+                    """
+                    SELECT COUNT(*) FROM event_features_for_nn
+                    WHERE ip = %s::inet AND label_action = 'block';
+                    """,
+                    (ip,),
+                    key="ip_block_history"
+                )
+                block_history_cache.set(ip, enriched["ip_block_history"])
+            else:
+                enriched["ip_block_history"] = block_history
 
             # 2. IP: Last 24 hours (general fallback)
             query_and_fetch(
@@ -85,7 +150,7 @@ def enrich_event(event: dict, debug: bool = False) -> dict:
 
             # 4. IP: Invalid_user ratio in last 24h (with fallback)
             cur.execute("""
-                SELECT 
+                SELECT
                     COUNT(*) FILTER (WHERE action = 'invalid_user')::float / NULLIF(COUNT(*), 0)
                 FROM event_features_for_nn
                 WHERE ip = %s::inet AND timestamp > %s;
@@ -93,7 +158,7 @@ def enrich_event(event: dict, debug: bool = False) -> dict:
             ratio = cur.fetchone()[0]
             if ratio is None:
                 cur.execute("""
-                    SELECT 
+                    SELECT
                         COUNT(*) FILTER (WHERE action = 'invalid_user')::float / NULLIF(COUNT(*), 0)
                     FROM event_features_for_nn
                     WHERE ip = %s::inet;
@@ -102,20 +167,196 @@ def enrich_event(event: dict, debug: bool = False) -> dict:
             enriched["invalid_user_ratio_ip"] = round(float(ratio), 4) if ratio else 0.0
 
             # 5. IP: External risk and inactivity
-            cur.execute("""
-                SELECT score, last_event FROM ip_risk_score WHERE ip = %s;
-            """, (ip,))
-            row = cur.fetchone()
-            if row:
-                risk_score, last_seen = row
-                enriched["ip_risk_score"] = float(risk_score) if risk_score else 0.0
-                if last_seen:
-                    days = (timestamp - last_seen).days
-                    enriched["ip_inactive_days"] = days if days >= 0 else 999
-                else:
-                    enriched["ip_inactive_days"] = 999
-            else:
-                enriched["ip_risk_score"] = 0.0
-                enriched["ip_inactive_days"] = 999
+            risk_row = risk_score_cache.get(ip, _MISSING)
+            if risk_row is _MISSING:
+                cur.execute("""
+                    SELECT score, last_event FROM ip_risk_score WHERE ip = %s;
+                """, (ip,))
+                risk_row = cur.fetchone()
+                risk_score_cache.set(ip, risk_row)
+            enriched.update(_risk_features(timestamp, risk_row))
+
+    return enriched
+
+
+# Set-based variant of the queries above: one row per requested (ip, timestamp),
+# in input order. Every aggregate the per-event path may need (including the
+# fallbacks) is computed in a single lateral scan per IP, so the fallback
+# decisions can be taken in Python exactly as `enrich_event` takes them.
+# IPs whose block history / risk row are cached (need_block / need_risk
+# false) skip the block count and the `ip_risk_score` probe.
+BATCH_ENRICH_SQL = """
+    SELECT
+        r.idx,
+        f.block_count,
+        f.count_24h,
+        f.count_all,
+        f.avg_score_1h,
+        f.avg_score_all,
+        f.invalid_ratio_24h,
+        f.invalid_ratio_all,
+        rs.score,
+        rs.last_event
+    FROM unnest(%s::inet[], %s::timestamptz[], %s::timestamptz[], %s::bool[], %s::bool[])
+         WITH ORDINALITY AS r(ip, since_24h, since_1h, need_block, need_risk, idx)
+    LEFT JOIN LATERAL (
+        SELECT
+            COUNT(*) FILTER (WHERE r.need_block AND e.label_action = 'block')
+                                                                    AS block_count,
+            COUNT(*) FILTER (WHERE e.timestamp > r.since_24h)       AS count_24h,
+            COUNT(*)                                                AS count_all,
+            AVG(e.score) FILTER (WHERE e.timestamp > r.since_1h)    AS avg_score_1h,
+            AVG(e.score)                                            AS avg_score_all,
+            COUNT(*) FILTER (WHERE e.action = 'invalid_user' AND e.timestamp > r.since_24h)::float
+                / NULLIF(COUNT(*) FILTER (WHERE e.timestamp > r.since_24h), 0)
+                                                                    AS invalid_ratio_24h,
+            COUNT(*) FILTER (WHERE e.action = 'invalid_user')::float
+                / NULLIF(COUNT(*), 0)                               AS invalid_ratio_all
+        FROM event_features_for_nn e
+        WHERE e.ip = r.ip
+    ) f ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT score, last_event FROM ip_risk_score
+        WHERE r.need_risk AND ip = r.ip
+        LIMIT 1
+    ) rs ON TRUE
+    ORDER BY r.idx;
+"""
+
+
+# Same columns as BATCH_ENRICH_SQL, read from `ip_hourly_rollup` (at most 25
+# rows per IP) and `ip_rollup_totals` instead of scanning the IP's history.
+# Windows start at the hour of `since_24h` / `since_1h`, so they can include
+# up to one hour more than the exact `timestamp > since` of the view queries.
+ROLLUP_ENRICH_SQL = """
+    SELECT
+        r.idx,
+        t.blocks,
+        h.count_24h,
+        t.events,
+        h.score_sum_1h / NULLIF(h.score_n_1h, 0),
+        t.score_sum / NULLIF(t.score_n, 0),
+        h.invalid_24h::float / NULLIF(h.count_24h, 0),
+        t.invalid_user::float / NULLIF(t.events, 0),
+        rs.score,
+        rs.last_event
+    FROM unnest(%s::inet[], %s::timestamptz[], %s::timestamptz[], %s::bool[], %s::bool[])
+         WITH ORDINALITY AS r(ip, since_24h, since_1h, need_block, need_risk, idx)
+    LEFT JOIN ip_rollup_totals t ON t.ip = r.ip
+    LEFT JOIN LATERAL (
+        SELECT
+            SUM(h.events)                                                           AS count_24h,
+            SUM(h.invalid_user)                                                     AS invalid_24h,
+            SUM(h.score_sum) FILTER (WHERE h.hour >= date_trunc('hour', r.since_1h)) AS score_sum_1h,
+            SUM(h.score_n) FILTER (WHERE h.hour >= date_trunc('hour', r.since_1h))   AS score_n_1h
+        FROM ip_hourly_rollup h
+        WHERE h.ip = r.ip AND h.hour >= date_trunc('hour', r.since_24h)
+    ) h ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT score, last_event FROM ip_risk_score
+        WHERE r.need_risk AND ip = r.ip
+        LIMIT 1
+    ) rs ON TRUE
+    ORDER BY r.idx;
+"""
+
+
+def record_outcomes(events: list[dict], scores: list, labels: list[str]):
+    """
+    Adds the scores and decided labels of `events` to the rollups
+    (`afw_rollup_record_outcomes`); event counts come from the `log_events`
+    trigger. Invalidates the cached block history of IPs with a block.
+    """
+    if not events:
+        return
+    ips = [event.get("ip") or None for event in events]
+    timestamps = [_event_timestamp(event) for event in events]
+    with connection() as conn:
+        with conn.cursor() as cur:
+            # Malformed addresses become NULL (skipped) instead of failing the batch
+            cur.execute(
+                "SELECT afw_rollup_record_outcomes("
+                "ARRAY(SELECT afw_try_inet(ip) FROM unnest(%s::text[]) WITH ORDINALITY AS u(ip, n) ORDER BY n), "
+                "%s::timestamptz[], %s::float8[], %s::text[]);",
+                (ips, timestamps, [None if s is None else float(s) for s in scores], list(labels)),
+            )
+    for ip in {ip for ip, label in zip(ips, labels) if ip and label == "block"}:
+        invalidate_block_history(ip)
+
 
+def _features_from_batch_row(timestamp: datetime, row) -> dict:
+    """
+    Applies the same fallback rules as `enrich_event` to one row of
+    BATCH_ENRICH_SQL, so both paths produce identical dicts.
+    """
+    (_, block_count, count_24h, count_all, avg_1h, avg_all,
+     ratio_24h, ratio_all, risk_score, last_event) = row
+
+    recent = count_24h if count_24h not in (None, 0) else count_all
+    avg_score = avg_1h if avg_1h not in (None, 0) else avg_all
+    ratio = ratio_24h if ratio_24h is not None else ratio_all
+
+    enriched = {
+        "ip_block_history"      : float(block_count) if block_count is not None else 0.0,
+        "ip_recent_event_count" : float(recent) if recent is not None else 0.0,
+        "ip_avg_score_last_hour": float(avg_score) if avg_score is not None else 0.0,
+        "invalid_user_ratio_ip" : round(float(ratio), 4) if ratio else 0.0,
+    }
+    has_risk_row = risk_score is not None or last_event is not None
+    enriched.update(_risk_features(timestamp, (risk_score, last_event) if has_risk_row else None))
     return enriched
+
+
+def _cached_batch_row(ip, row, block_history, risk_row) -> tuple:
+    """
+    Overrides the block history and risk columns of a batch row with the
+    values cached before the query (None / _MISSING when they were not), and
+    caches the fresh ones, so both enrichment paths agree.
+    """
+    row = list(row)
+    if block_history is None:
+        block_history_cache.set(ip, float(row[1]) if row[1] is not None else 0.0)
+    else:
+        row[1] = block_history
+
+    if risk_row is _MISSING:
+        has_risk_row = row[8] is not None or row[9] is not None
+        risk_score_cache.set(ip, (row[8], row[9]) if has_risk_row else None)
+    else:
+        row[8], row[9] = risk_row if risk_row else (None, None)
+    return row
+
+
+def enrich_events(events: list[dict], debug: bool = False) -> list[dict]:
+    """
+    Batch version of `enrich_event`: enriches all `events` with a single
+    set-based query and returns one dict per event, in input order, with the
+    same keys and values the per-event path would return. Reads the view or
+    the rollups depending on ENRICH_FEATURE_SOURCE.
+    """
+    if not events:
+        return []
+
+    timestamps = [_event_timestamp(event) for event in events]
+    ips = [event.get("ip", "") for event in events]
+    since_24h = [ts - timedelta(hours=24) for ts in timestamps]
+    since_1h = [ts - timedelta(hours=1) for ts in timestamps]
+    query = ROLLUP_ENRICH_SQL if ENRICH_FEATURE_SOURCE == "rollup" else BATCH_ENRICH_SQL
+    block_histories = [block_history_cache.get(ip) for ip in ips]
+    risk_rows = [risk_score_cache.get(ip, _MISSING) for ip in ips]
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            params = (ips, since_24h, since_1h,
+                      [block is None for block in block_histories],
+                      [risk is _MISSING for risk in risk_rows])
+            if debug:
+                print(f"\n🔍 Running batch enrichment for {len(events)} events:")
+                print(cur.mogrify(query, params).decode())
+            cur.execute(query, params)
+            rows = cur.fetchall()
+
+    return [
+        _features_from_batch_row(ts, _cached_batch_row(ip, row, block, risk))
+        for ip, ts, row, block, risk in zip(ips, timestamps, rows, block_histories, risk_rows)
+    ]
@@ -0,0 +1,315 @@
+"""
+In-process rolling-window feature store for streaming enrichment.
+
+`enrich_event` recomputes the per-IP context features with aggregate SQL for
+every event. `IPFeatureStore` maintains the same features incrementally as
+events flow through the pipeline:
+
+- 24h windows (event count, invalid_user count) use 24 hourly buckets.
+- The 1h score average uses 60 one-minute buckets.
+- All-time totals back the same fallbacks `enrich_event` applies.
+
+Updates and reads are O(1) (bucket expiry is amortized over the ring size).
+Window edges are quantized to the bucket size, so counts near the edge of a
+window can differ slightly from the exact SQL `timestamp > ts - interval`.
+
+Memory is bounded by `max_ips`: the least recently touched IPs are evicted.
+`warm_start()` bulk-loads the state from Postgres at startup. With
+ENRICH_FEATURE_SOURCE=store the shared predictor (and so the scoring
+daemon) reads its context features from a store instead of Postgres, see
+`core.classifier.predictor.get_predictor`.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from core.context.context_enricher import _event_timestamp, _risk_features
+from core.storage.pool import connection
+
+HOUR_BUCKETS = 24
+MINUTE_BUCKETS = 60
+
+
+class _Ring:
+    """
+    Fixed-size ring of time buckets with running totals over the live window.
+    Keeps an event count, an invalid_user count and a score sum/count.
+    """
+    __slots__ = ("size", "width", "head", "count", "invalid", "score_sum", "score_n",
+                 "total_count", "total_invalid", "total_score_sum", "total_score_n")
+
+    def __init__(self, size: int, width: int):
+        self.size = size
+        self.width = width
+        self.head = None
+        self.count = array("q", bytes(8 * size))
+        self.invalid = array("q", bytes(8 * size))
+        self.score_sum = array("d", bytes(8 * size))
+        self.score_n = array("q", bytes(8 * size))
+        self.total_count = 0
+        self.total_invalid = 0
+        self.total_score_sum = 0.0
+        self.total_score_n = 0
+
+    def advance(self, ts: float):
+        """Moves the head to the bucket of `ts`, expiring buckets that left the window."""
+        bucket = int(ts // self.width)
+        if self.head is None:
+            self.head = bucket
+            return
+        steps = bucket - self.head
+        if steps <= 0:
+            return
+        for k in range(1, min(steps, self.size) + 1):
+            slot = (self.head + k) % self.size
+            self.total_count -= self.count[slot]
+            self.total_invalid -= self.invalid[slot]
+            self.total_score_sum -= self.score_sum[slot]
+            self.total_score_n -= self.score_n[slot]
+            self.count[slot] = 0
+            self.invalid[slot] = 0
+            self.score_sum[slot] = 0.0
+            self.score_n[slot] = 0
+        self.head = bucket
+
+    def add(self, ts: float, count: int = 1, invalid: int = 0,
+            score_sum: float = 0.0, score_n: int = 0):
+        self.advance(ts)
+        bucket = int(ts // self.width)
+        if bucket <= self.head - self.size:
+            return  # Older than the window: only all-time totals care.
+        slot = bucket % self.size
+        self.count[slot] += count
+        self.invalid[slot] += invalid
+        self.score_sum[slot] += score_sum
+        self.score_n[slot] += score_n
+        self.total_count += count
+        self.total_invalid += invalid
+        self.total_score_sum += score_sum
+        self.total_score_n += score_n
+
+
+class _IPState:
+    __slots__ = ("day", "hour", "count", "invalid", "blocks", "score_sum", "score_n",
+                 "risk_score", "last_event", "has_risk_row")
+
+    def __init__(self):
+        self.day = _Ring(HOUR_BUCKETS, 3600)
+        self.hour = _Ring(MINUTE_BUCKETS, 60)
+        self.count = 0
+        self.invalid = 0
+        self.blocks = 0
+        self.score_sum = 0.0
+        self.score_n = 0
+        self.risk_score = None
+        self.last_event = None
+        self.has_risk_row = False
+
+
+class IPFeatureStore:
+    """
+    Per-IP rolling-window features, exposing the same keys as `enrich_event`.
+
+    Typical use in a streaming pipeline:
+
+        store = IPFeatureStore()
+        store.warm_start()
+        for event in events:
+            features = store.features(event)   # read first, like enrich_event
+            ...
+            store.observe(event, score=score, label_action=label)
+    """
+
+    def __init__(self, max_ips: int = 100_000):
+        self.max_ips = max_ips
+        self._ips: OrderedDict[str, _IPState] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._ips)
+
+    def _state(self, ip: str, create: bool = True):
+        state = self._ips.get(ip)
+        if state is not None:
+            self._ips.move_to_end(ip)
+            return state
+        if not create:
+            return None
+        state = self._ips[ip] = _IPState()
+        if len(self._ips) > self.max_ips:
+            self._ips.popitem(last=False)
+            self.evictions += 1
+        return state
+
+    def observe(self, event: dict, score=None, label_action=None):
+        """Adds one event to its IP's windows and totals."""
+        ip = event.get("ip")
+        if not ip:
+            return
+        ts = _event_timestamp(event).timestamp()
+        if score is None:
+            score = event.get("score")
+        if label_action is None:
+            label_action = event.get("label_action")
+        self._add(ip, ts, 1, int(event.get("action") == "invalid_user"),
+                  int(label_action == "block"),
+                  float(score) if score is not None else 0.0,
+                  int(score is not None))
+
+    def _add(self, ip, ts, count, invalid, blocks, score_sum, score_n):
+        with self._lock:
+            state = self._state(ip)
+            state.day.add(ts, count, invalid, score_sum, score_n)
+            state.hour.add(ts, count, invalid, score_sum, score_n)
+            state.count += count
+            state.invalid += invalid
+            state.blocks += blocks
+            state.score_sum += score_sum
+            state.score_n += score_n
+
+    def record_outcomes(self, events: list, scores: list, labels: list):
+        """Batch `observe`, with the same arguments as `context_enricher.record_outcomes`."""
+        for event, score, label in zip(events, scores, labels):
+            self.observe(event, score=score, label_action=label)
+
+    def set_risk_score(self, ip: str, score, last_event: datetime = None):
+        """Mirrors a write to `ip_risk_score` for `ip`."""
+        with self._lock:
+            state = self._state(ip)
+            state.risk_score = score
+            state.last_event = last_event
+            state.has_risk_row = True
+
+    def features(self, event: dict) -> dict:
+        """
+        Returns the contextual features of `event`'s IP as of its timestamp,
+        with the same keys, fallbacks and rounding as `enrich_event`.
+        """
+        timestamp = _event_timestamp(event)
+        ts = timestamp.timestamp()
+
+        with self._lock:
+            state = self._state(event.get("ip"), create=False) if event.get("ip") else None
+            if state is None:
+                return self._empty_features()
+
+            state.day.advance(ts)
+            state.hour.advance(ts)
+            day, hour = state.day, state.hour
+
+            recent = day.total_count or state.count
+
+            avg_score = hour.total_score_sum / hour.total_score_n if hour.total_score_n else None
+            if not avg_score:
+                avg_score = state.score_sum / state.score_n if state.score_n else None
+
+            if day.total_count:
+                ratio = day.total_invalid / day.total_count
+            else:
+                ratio = state.invalid / state.count if state.count else None
+
+            enriched = {
+                "ip_block_history"      : float(state.blocks),
+                "ip_recent_event_count" : float(recent),
+                "ip_avg_score_last_hour": float(avg_score) if avg_score is not None else 0.0,
+                "invalid_user_ratio_ip" : round(float(ratio), 4) if ratio else 0.0,
+            }
+            risk_row = (state.risk_score, state.last_event) if state.has_risk_row else None
+
+        enriched.update(_risk_features(timestamp, risk_row))
+        return enriched
+
+    def enrich_events(self, events: list) -> list:
+        """Drop-in for `context_enricher.enrich_events`: one feature dict per event."""
+        return [self.features(event) for event in events]
+
+    @staticmethod
+    def _empty_features() -> dict:
+        return {
+            "ip_block_history"      : 0.0,
+            "ip_recent_event_count" : 0.0,
+            "ip_avg_score_last_hour": 0.0,
+            "invalid_user_ratio_ip" : 0.0,
+            "ip_risk_score"         : 0.0,
+            "ip_inactive_days"      : 999,
+        }
+
+    def warm_start(self, as_of: datetime = None) -> int:
+        """
+        Bulk-loads `ip_risk_score`, per-IP totals and the last 24h of buckets
+        from Postgres. IPs are loaded oldest-activity first so that, when there
+        are more than `max_ips`, the most recently active ones are kept.
+        Loaded IPs replace whatever the store held for them, so calling it
+        again resynchronizes instead of adding the buckets twice. Returns the number of IPs held after loading.
+        """
+        as_of = as_of or datetime.now(timezone.utc)
+        since = as_of - timedelta(hours=HOUR_BUCKETS)
+
+        with connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT
+                        host(ip),
+                        COUNT(*),
+                        COUNT(*) FILTER (WHERE action = 'invalid_user'),
+                        COUNT(*) FILTER (WHERE label_action = 'block'),
+                        COALESCE(SUM(score), 0),
+                        COUNT(score)
+                    FROM event_features_for_nn
+                    GROUP BY ip
+                    ORDER BY MAX(timestamp);
+                """)
+                totals = cur.fetchall()
+
+                cur.execute("""
+                    SELECT
+                        host(ip),
+                        EXTRACT(EPOCH FROM date_trunc('minute', timestamp)),
+                        COUNT(*),
+                        COUNT(*) FILTER (WHERE action = 'invalid_user'),
+                        COALESCE(SUM(score), 0),
+                        COUNT(score)
+                    FROM event_features_for_nn
+                    WHERE timestamp > %s AND timestamp <= %s
+                    GROUP BY 1, 2
+                    ORDER BY 2;
+                """, (since, as_of))
+                buckets = cur.fetchall()
+
+                cur.execute("SELECT host(ip), score, last_event FROM ip_risk_score;")
+                risks = cur.fetchall()
+
+        with self._lock:
+            # Risk rows first: IPs that only have a risk score are the coldest
+            # and are the first to go if the store overflows.
+            for ip, score, last_event in risks:
+                state = self._state(ip)
+                state.risk_score = score
+                state.last_event = last_event
+                state.has_risk_row = True
+
+            for ip, count, invalid, blocks, score_sum, score_n in totals:
+                state = self._state(ip)
+                state.count = count
+                state.invalid = invalid
+                state.blocks = blocks
+                state.score_sum = float(score_sum)
+                state.score_n = score_n
+                # The buckets below are added, so start from empty windows.
+                state.day = _Ring(HOUR_BUCKETS, 3600)
+                state.hour = _Ring(MINUTE_BUCKETS, 60)
+
+            for ip, minute_ts, count, invalid, score_sum, score_n in buckets:
+                state = self._state(ip, create=False)
+                if state is None:
+                    continue
+                ts = float(minute_ts)
+                state.day.add(ts, count, invalid, float(score_sum), score_n)
+                state.hour.add(ts, count, invalid, float(score_sum), score_n)
+
+            return len(self._ips)
+
+    def stats(self) -> dict:
+        return {"ips": len(self._ips), "max_ips": self.max_ips, "evictions": self.evictions}
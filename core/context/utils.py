@@ -1,39 +1,22 @@
 # core/contect/utils.py
-import psycopg2
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 from config.config import MODEL_PATH 
-
-load_dotenv()
-PG_DSN = os.getenv("PG_DSN")
+from core.storage.pool import connection
 
 def get_active_strategy_view():
-    conn = psycopg2.connect(os.getenv("PG_DSN"))
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT materialized_view_name
-            FROM enrichment_strategies
-            WHERE is_active = TRUE
-            LIMIT 1;
-        """)
-        result = cur.fetchone()
-        if not result:
-            raise ValueError("No active enrichment strategy found.")
-        return result[0]
-
-def get_active_strategy_id():
-    conn = psycopg2.connect(os.getenv("PG_DSN"))
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT id FROM enrichment_strategies
-            WHERE is_active = TRUE
-            LIMIT 1;
-        """)
-        row = cur.fetchone()
-        if not row:
-            raise ValueError("No active enrichment strategy found.")
-        return row[0]
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT materialized_view_name
+                FROM enrichment_strategies
+                WHERE is_active = TRUE
+                LIMIT 1;
+            """)
+            result = cur.fetchone()
+            if not result:
+                raise ValueError("No active enrichment strategy found.")
+            return result[0]
 
 def is_valid_view_name(name):
     return name.isidentifier() and not any(char in name for char in [';', '--', ' '])
@@ -44,7 +27,7 @@ def get_active_strategy_id():
     Returns the ID of the currently active enrichment strategy.
     Raises an exception if no active strategy is found.
     """
-    with psycopg2.connect(PG_DSN) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 SELECT id FROM enrichment_strategies
@@ -57,7 +40,7 @@ def get_active_strategy_id():
             return row[0]
 
 def adopt_strategy(recall):
-    with psycopg2.connect(PG_DSN) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             # 1. Get active strategy 
             cur.execute("SELECT id FROM enrichment_strategies WHERE is_active = TRUE LIMIT 1;")
@@ -78,15 +61,51 @@ def adopt_strategy(recall):
             # 3. Assessment of the new training run
             return previous_recall is None or recall > previous_recall
 
-def register_training_run(accuracy, recall, loss, notes="", training_duration=None, model_hash=False, compress=False):
+# Callbacks run (in this process) when register_training_run adopts a model
+_adoption_listeners = []
+
+def on_model_adopted(callback):
+    """
+    Registers `callback(model_hash)` to be called after a training run
+    adopts a new model (e.g. to drop caches tied to the previous model).
+    `model_hash` is None when the run was registered without a hash.
+    """
+    _adoption_listeners.append(callback)
+    return callback
+
+def _notify_model_adopted(model_hash):
+    for callback in list(_adoption_listeners):
+        try:
+            callback(model_hash)
+        except Exception as e:
+            print(f"⚠️ Model adoption listener failed: {e}")
+
+def register_training_run(accuracy, recall, loss, notes="", training_duration=None, model_hash=False, compress=False,
+                          data_watermark=None, epoch_log=None):
     """
     Registers a new training run in the database.
     Returns True if the new model was adopted, False otherwise.
+    Adoption listeners (`on_model_adopted`) are notified after the commit.
+    `data_watermark` (newest row timestamp the model was trained on) is
+    stored in `training_runs.data_watermark` for incremental retraining, and
+    `epoch_log` (per-epoch timings / metrics from the training engine) in
+    `training_runs.epoch_log`.
     """
     adopted = adopt_strategy(recall)
     is_better = adopted
+    strategy_id = get_active_strategy_id()
+    model_sha = get_model_hash() if model_hash else None
+
+    # Optional columns (db/schema.sql) are only sent when given, so databases
+    # without them keep working
+    optional = {}
+    if data_watermark is not None:
+        optional["data_watermark"] = data_watermark
+    if epoch_log is not None:
+        from psycopg2.extras import Json
+        optional["epoch_log"] = Json(epoch_log)
     
-    with psycopg2.connect(PG_DSN) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             #Insert the new training run
             cur.execute("""
@@ -102,11 +121,14 @@ def register_training_run(accuracy, recall, loss, notes="", training_duration=No
                     notes,
                     training_duration_seconds,
                     model_hash,
-                    model_compressed_path
+                    model_compressed_path{optional_columns}
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """, (
-                get_active_strategy_id(),
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s{optional_values});
+            """.format(
+                optional_columns="".join(f", {column}" for column in optional),
+                optional_values=", %s" * len(optional),
+            ), (
+                strategy_id,
                 datetime.utcnow(),
                 MODEL_PATH,
                 accuracy,
@@ -116,9 +138,9 @@ def register_training_run(accuracy, recall, loss, notes="", training_duration=No
                 adopted,
                 notes or "Trained with new batch of data",
                 training_duration if training_duration is not None else None,
-                get_model_hash() if model_hash else None,
+                model_sha,
                 f"{MODEL_PATH}.zip" if compress else None
-            ))
+            ) + tuple(optional.values()))
 
             if compress:
                 compress_model(MODEL_PATH, f"{MODEL_PATH}.zip")
@@ -131,7 +153,9 @@ def register_training_run(accuracy, recall, loss, notes="", training_duration=No
                 print("ℹModel not adopted — recall not better than previous.")
             conn.commit()
 
-            return adopted
+    if adopted:
+        _notify_model_adopted(model_sha)
+    return adopted
         
 def compute_sha256(filepath):
     import hashlib
@@ -190,7 +214,7 @@ def get_active_model_info():
         LIMIT 1;
     """
 
-    with psycopg2.connect(PG_DSN) as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query)
             row = cur.fetchone()
@@ -208,10 +232,32 @@ def get_active_model_info():
                 "loss"              : row[7],
             }
         
+def get_training_watermark(training_run_id):
+    """
+    Returns `data_watermark` of a training run (None if it was not recorded),
+    i.e. the newest row timestamp its model was trained on.
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT data_watermark FROM training_runs WHERE id = %s;", (training_run_id,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+# path -> (size, mtime_ns) del fichero cuando pasó la verificación
+_verified_models = {}
+
 def verify_model_integrity(path: str):
-    import hashlib
-    with open(path, "rb") as f:
-        content = f.read()
-    actual_hash = hashlib.sha256(content).hexdigest()
+    """
+    Compara el SHA-256 del modelo con el del último modelo adoptado.
+    El resultado se cachea por tamaño+mtime: mientras el fichero no cambie,
+    las llamadas siguientes no leen el modelo ni consultan Postgres.
+    """
+    st = os.stat(path)
+    signature = (st.st_size, st.st_mtime_ns)
+    if _verified_models.get(path) == signature:
+        return
+
+    actual_hash = compute_sha256(path)
     if actual_hash != get_active_model_info()['model_hash']:
         raise RuntimeError("Model integrity check failed!")
+    _verified_models[path] = signature
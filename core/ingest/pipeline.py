@@ -0,0 +1,215 @@
+"""
+Pipelined ingest runner.
+
+    read -> parse -> [enrich] -> store
+
+Stages are connected by bounded asyncio queues and each runs a configurable
+number of workers. Lines are read and parsed in chunks (parsing goes into
+columnar EventBatches), so reading, parsing and Postgres writes overlap.
+When Postgres slows down the store queue fills up, `put()` blocks, and the
+backpressure propagates up to the reader instead of buffering unboundedly.
+
+Each stage reports throughput and queue depth, see `IngestPipeline.report()`.
+
+The enrich stage is only a hook: nothing downstream reads extra columns
+yet (`PostgresLogger` stores the `log_events` columns), so the ingest
+entry points run read -> parse -> store.
+"""
+import asyncio
+import time
+from itertools import islice
+from typing import AsyncIterable, Callable, Dict, Iterable, Optional, Union
+
+from core.parser.auth import AuthLogParser
+from core.parser.event import EventBatch
+
+_DONE = object()
+
+
+class StageStats:
+    """Per-stage counters: items (events), busy time and input queue depth."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def sample_depth(self, depth: int):
+        self.depth_samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def snapshot(self, elapsed: float) -> Dict:
+        return {
+            "stage"             : self.name,
+            "batches"           : self.batches,
+            "items"             : self.items,
+            "items_per_sec"     : self.items / elapsed if elapsed else 0.0,
+            "busy_seconds"      : self.busy_seconds,
+            "avg_queue_depth"   : self.depth_total / self.depth_samples if self.depth_samples else 0.0,
+            "max_queue_depth"   : self.depth_max,
+        }
+
+
+class IngestPipeline:
+    """
+    Runs lines from `source` through parse, optional enrich, and store.
+
+    - `parser`: object with `parse_batch(lines) -> EventBatch` (AuthLogParser
+      by default). Parsing runs in a worker thread so the loop keeps
+      serving Postgres I/O. Parsers keep state across chunks (the year
+      inference of the timestamp decoder, multi-line records that are
+      completed by `flush_batch()` at the end of input), so there is a single
+      parse worker and chunks are parsed in input order.
+    - `enrich`: optional `callable(EventBatch) -> EventBatch`, also run in a
+      worker thread. Its result must be something the store writes.
+    - `store`: object with `async insert_batch(EventBatch)`, typically a
+      `PostgresLogger`.
+    """
+
+    def __init__(self, store, parser=None, enrich: Optional[Callable[[EventBatch], EventBatch]] = None,
+                 chunk_size: int = 2000, queue_size: int = 8,
+                 parse_workers: int = 1, enrich_workers: int = 1, store_workers: int = 2,
+                 report_interval: Optional[float] = None):
+        if parse_workers != 1:
+            raise ValueError("The parse stage is stateful and order-sensitive: parse_workers must be 1")
+        self.store = store
+        self.parser = parser or AuthLogParser()
+        self.enrich = enrich
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.workers = {"parse": parse_workers, "enrich": enrich_workers, "store": store_workers}
+        self.report_interval = report_interval
+        self.stats = {name: StageStats(name) for name in ("read", "parse", "enrich", "store")}
+        if enrich is None:
+            del self.stats["enrich"]
+        self._started = None
+
+    async def run(self, source: Union[Iterable[str], AsyncIterable]) -> Dict:
+        """Ingests every line of `source`. Returns the final report."""
+        self._started = time.perf_counter()
+        stages = list(self.stats)
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in stages[1:]}
+
+        tasks = [asyncio.create_task(self._read(source, queues["parse"]))]
+        for i, name in enumerate(stages[1:], start=1):
+            out_name = stages[i + 1] if i + 1 < len(stages) else None
+            tasks.append(asyncio.create_task(self._run_stage(
+                name, queues[name], queues.get(out_name), self.workers.get(out_name, 0),
+            )))
+        if self.report_interval:
+            tasks.append(asyncio.create_task(self._report_periodically()))
+
+        try:
+            await asyncio.gather(*tasks[:len(stages)])
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.report()
+
+    async def _read(self, source, out_q: asyncio.Queue):
+        stats = self.stats["read"]
+        loop = asyncio.get_running_loop()
+
+        if hasattr(source, "__aiter__"):
+            # Async sources may yield lines or ready-made lists of lines (e.g.
+            # LogFollower.abatches()); lists are passed on as soon as they
+            # arrive so live tails are not held back waiting for a full chunk.
+            chunk = []
+            async for item in source:
+                if isinstance(item, list):
+                    if chunk:
+                        await self._emit(stats, out_q, chunk)
+                        chunk = []
+                    await self._emit(stats, out_q, item)
+                    continue
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    await self._emit(stats, out_q, chunk)
+                    chunk = []
+            if chunk:
+                await self._emit(stats, out_q, chunk)
+        else:
+            lines = iter(source)
+            while True:
+                start = time.perf_counter()
+                chunk = await loop.run_in_executor(None, list, islice(lines, self.chunk_size))
+                stats.busy_seconds += time.perf_counter() - start
+                if not chunk:
+                    break
+                await self._emit(stats, out_q, chunk)
+
+        for _ in range(self.workers["parse"]):
+            await out_q.put(_DONE)
+
+    @staticmethod
+    async def _emit(stats: StageStats, out_q: asyncio.Queue, chunk: list):
+        stats.batches += 1
+        stats.items += len(chunk)
+        await out_q.put(chunk)
+
+    async def _process(self, name: str, item):
+        if name == "parse":
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.parser.parse_batch, item)
+        if name == "enrich":
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.enrich, item)
+        await self.store.insert_batch(item)
+        return None
+
+    async def _run_stage(self, name: str, in_q: asyncio.Queue, out_q: Optional[asyncio.Queue],
+                         downstream_workers: int):
+        stats = self.stats[name]
+
+        async def worker():
+            while True:
+                stats.sample_depth(in_q.qsize())
+                item = await in_q.get()
+                if item is _DONE:
+                    if name == "parse" and hasattr(self.parser, "flush_batch"):
+                        # Stateful parsers (e.g. OdooLogParser) hold back the
+                        # last multi-line record until the input ends.
+                        tail = self.parser.flush_batch()
+                        if len(tail):
+                            await out_q.put(tail)
+                    return
+                start = time.perf_counter()
+                result = await self._process(name, item)
+                stats.busy_seconds += time.perf_counter() - start
+                stats.batches += 1
+                stats.items += len(item)
+                if out_q is not None:
+                    await out_q.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(self.workers[name])))
+        if out_q is not None:
+            for _ in range(downstream_workers):
+                await out_q.put(_DONE)
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.print_report()
+
+    def report(self) -> Dict:
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "elapsed_seconds"   : elapsed,
+            "stages"            : [stats.snapshot(elapsed) for stats in self.stats.values()],
+        }
+
+    def print_report(self):
+        report = self.report()
+        print(f"📊 Ingest after {report['elapsed_seconds']:.1f}s")
+        for stage in report["stages"]:
+            print(
+                f"  {stage['stage']:7} {stage['items']:>10,} items "
+                f"{stage['items_per_sec']:>10,.0f}/s  busy {stage['busy_seconds']:7.2f}s  "
+                f"queue avg {stage['avg_queue_depth']:4.1f} max {stage['max_queue_depth']}"
+            )
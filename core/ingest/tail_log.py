@@ -0,0 +1,323 @@
+"""
+Log file readers.
+
+- `replay_log(path)`: reads a finished file once, in large buffered chunks.
+- `LogFollower(path)`: follows a live file like `tail -F`. It uses inotify
+  where available and falls back to polling. It survives logrotate in both
+  rename and copytruncate modes, and persists byte-offset/inode
+  checkpoints, so a restart resumes exactly where the previous run stopped.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional
+
+CHUNK_SIZE = 1 << 20
+
+
+def _split_lines(buffer: bytes):
+    """Returns (complete lines as str, trailing partial line as bytes)."""
+    end = buffer.rfind(b"\n")
+    if end < 0:
+        return [], buffer
+    lines = buffer[:end].decode("utf-8", errors="replace").split("\n")
+    return lines, buffer[end + 1:]
+
+
+def replay_log(path, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yields every line of `path` (without the newline), reading in large chunks."""
+    with open(path, "rb") as f:
+        pending = b""
+        while chunk := f.read(chunk_size):
+            lines, pending = _split_lines(pending + chunk)
+            yield from lines
+        if pending:
+            yield pending.decode("utf-8", errors="replace")
+
+
+class Checkpoint:
+    """
+    Persists the follower position ({"dev", "inode", "offset"}) as JSON,
+    written atomically (temp file + rename) so a crash never leaves it torn.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, dev: int, inode: int, offset: int):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dev": dev, "inode": inode, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class _Inotify:
+    """Minimal inotify watcher on a directory, via libc. Raises OSError if unsupported."""
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, directory: str):
+        # find_library("c") locates the C library inotify_* is exported from.
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_MOVED_FROM | self.IN_MOVED_TO
+                | self.IN_CREATE | self.IN_DELETE)
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def wait(self, timeout: float):
+        """Blocks until something changes in the directory or `timeout` expires."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LogFollower:
+    """
+    Follows `path` and yields batches of complete lines as they are written.
+
+    - Rotation by rename: the old file is drained to EOF, then the new file
+      is read from the start.
+    - Rotation by copytruncate: a size below the current offset means
+      truncation, and reading restarts at offset 0.
+    - Checkpoints: with `checkpoint_path`, the position is saved each time
+      the consumer asks for the next batch, i.e. once it is done with the
+      previous one. With `autocommit=False`, call `commit()` yourself after
+      the lines are durably stored. On start, a checkpoint for the current
+      inode resumes at its offset. A checkpoint for the rotated-away file
+      (`<path>.1`) drains that file first.
+    """
+
+    def __init__(self, path, checkpoint_path=None, chunk_size: int = CHUNK_SIZE,
+                 poll_interval: float = 1.0, from_end: bool = False, autocommit: bool = True,
+                 use_inotify: bool = True):
+        self.path = str(path)
+        self.checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.from_end = from_end
+        self.autocommit = autocommit
+        self._file = None
+        self._dev = self._inode = None
+        self._offset = 0          # Bytes consumed up to the last complete line.
+        self._pending = b""
+        self._closed = False
+        self._busy = False        # A reader thread is inside `_step()`.
+        self._lock = threading.Lock()
+        self._watcher = None
+        if use_inotify:
+            try:
+                self._watcher = _Inotify(os.path.dirname(os.path.abspath(self.path)))
+            except (OSError, AttributeError):
+                self._watcher = None
+
+    @property
+    def position(self) -> dict:
+        return {"dev": self._dev, "inode": self._inode, "offset": self._offset}
+
+    def commit(self, position: dict = None):
+        """Saves `position` (default: the current one) to the checkpoint file."""
+        position = position or self.position
+        if self.checkpoint is not None and position["inode"] is not None:
+            self.checkpoint.save(position["dev"], position["inode"], position["offset"])
+
+    def _open(self, path: str, offset: int = 0) -> bool:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return False
+        st = os.fstat(f.fileno())
+        if offset > st.st_size:
+            offset = 0
+        f.seek(offset)
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        self._dev, self._inode = st.st_dev, st.st_ino
+        self._offset = offset
+        self._pending = b""
+        return True
+
+    def _resume(self):
+        saved = self.checkpoint.load() if self.checkpoint else None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+
+        if saved and st and (st.st_dev, st.st_ino) == (saved["dev"], saved["inode"]):
+            self._open(self.path, saved["offset"])
+            return
+        if saved:
+            rotated = self.path + ".1"
+            try:
+                rst = os.stat(rotated)
+                if (rst.st_dev, rst.st_ino) == (saved["dev"], saved["inode"]):
+                    self._open(rotated, saved["offset"])
+                    return
+            except FileNotFoundError:
+                pass
+        if st:
+            self._open(self.path, st.st_size if self.from_end and not saved else 0)
+
+    def _read_available(self) -> List[str]:
+        """Reads everything currently in the open file, one chunk at a time."""
+        lines = []
+        while True:
+            chunk = self._file.read(self.chunk_size)
+            if not chunk:
+                return lines
+            complete, self._pending = _split_lines(self._pending + chunk)
+            self._offset = self._file.tell() - len(self._pending)
+            lines.extend(complete)
+            if len(lines) >= 10_000:
+                return lines
+
+    def _truncated(self) -> bool:
+        """copytruncate: same inode, but smaller than what was already read."""
+        size = os.fstat(self._file.fileno()).st_size
+        return size < self._offset + len(self._pending)
+
+    def _replaced(self) -> bool:
+        """Rename rotation: `path` now points to a different inode."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # Renamed, new file not created yet: keep the old one.
+        return (st.st_dev, st.st_ino) != (self._dev, self._inode)
+
+    def _wait(self):
+        if self._watcher is not None:
+            self._watcher.wait(self.poll_interval)
+        else:
+            time.sleep(self.poll_interval)
+
+    def _step(self) -> List[str]:
+        """
+        One unit of blocking work: returns the next lines to hand out, or []
+        after opening the file, handling a truncation / rotation or waiting
+        for the file to change.
+        """
+        if self._file is None:
+            self._resume()
+            if self._file is None:
+                self._wait()
+            return []
+
+        lines = self._read_available()
+        if lines:
+            return lines
+
+        if self._truncated():
+            self._file.seek(0)
+            self._offset = 0
+            self._pending = b""
+            if self.autocommit:
+                self.commit()
+            return []
+
+        if self._replaced():
+            # Old file is at EOF; hand over its unterminated last line, if
+            # any, as consumed, then switch to the new file.
+            if self._pending:
+                tail, self._pending = self._pending, b""
+                self._offset += len(tail)
+                return [tail.decode("utf-8", errors="replace")]
+            if self._open(self.path, 0):
+                if self.autocommit:
+                    self.commit()
+            else:
+                self._wait()
+            return []
+
+        self._wait()
+        return []
+
+    def batches(self) -> Iterator[List[str]]:
+        """Yields non-empty lists of lines until `close()` is called."""
+        while True:
+            with self._lock:
+                if self._closed:
+                    break
+                self._busy = True
+            try:
+                lines = self._step()
+            finally:
+                with self._lock:
+                    self._busy = False
+                    closed = self._closed
+            if closed:
+                break       # Uncommitted lines are read again after a restart.
+            if lines:
+                yield lines
+                if self.autocommit:
+                    self.commit()
+        self._release()
+
+    def __iter__(self) -> Iterator[str]:
+        for lines in self.batches():
+            yield from lines
+
+    async def abatches(self) -> AsyncIterator[List[str]]:
+        """Async variant of `batches()`: blocking reads/waits run in a thread."""
+        loop = asyncio.get_running_loop()
+        iterator = self.batches()
+        while True:
+            lines = await loop.run_in_executor(None, next, iterator, None)
+            if lines is None:
+                return
+            yield lines
+
+    def close(self):
+        """
+        Stops the follower. If a reader thread is inside a read or wait, it
+        releases the file and the watcher itself when that step ends.
+        """
+        with self._lock:
+            self._closed = True
+            if self._busy:
+                return
+        self._release()
+
+    def _release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
@@ -1,82 +1,123 @@
 import re
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Iterator, List
 
+from .event import EventBatch
 
-def parse_auth_log_line(line: str) -> Optional[Dict]:
+HEADER_PATTERN = re.compile(
+    r"^(?P<month>\w{3}) +(?P<day>\d{1,2}) (?P<time>\d{2}:\d{2}:\d{2}) "
+    r"(?P<host>\S+) (?P<process>\w+)\[(?P<pid>\d+)\]: (?P<message>.+)$"
+)
+
+FAILED_PATTERN = re.compile(r"Failed password for (\w+) from ([\d.]+) port (\d+)")
+ACCEPTED_PATTERN = re.compile(r"Accepted password for (\w+) from ([\d.]+) port (\d+)")
+INVALID_USER_PATTERN = re.compile(r"Invalid user (\w+) from ([\d.]+)(?: port (\d+))?")
+
+# (marker, action, success, pattern), in the order markers are looked for.
+MESSAGE_RULES = (
+    ("Failed password for", "login_attempt", False, FAILED_PATTERN),
+    ("Accepted password for", "login_attempt", True, ACCEPTED_PATTERN),
+    ("Invalid user", "invalid_user", False, INVALID_USER_PATTERN),
+)
+_RULES_BY_PREFIX = {rule[0][:3]: rule for rule in MESSAGE_RULES}
+
+MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+
+class SyslogTimestampDecoder:
     """
-    Parses a line from /var/log/auth.log and returns a structured event dict.
+    Turns syslog "Mon DD HH:MM:SS" stamps into ISO timestamps.
+
+    Syslog lines carry no year, so it is inferred against a reference date
+    (now, unless one is given): months after the reference month belong to
+    the previous year, e.g. a December line read in January. The date part is
+    cached per (month, day) and the cache is dropped whenever the month wraps
+    around (Dec -> Jan), so long-running readers pick up the new year, or
+    when it holds more than `max_dates` days.
     """
-    raw = line.strip()
 
-    pattern = re.compile(
-        r"^(?P<month>\w{3}) +(?P<day>\d{1,2}) (?P<time>\d{2}:\d{2}:\d{2}) "
-        r"(?P<host>\S+) (?P<process>\w+)\[(?P<pid>\d+)\]: (?P<message>.+)$"
-    )
+    def __init__(self, reference: datetime = None, max_dates: int = 64):
+        self.reference = reference
+        self.max_dates = max_dates
+        self._dates = {}
+        self._last_month = None
+        self._last_month_num = 0
 
-    match = pattern.match(raw)
-    if not match:
-        return None
+    def decode(self, month: str, day: str, time_str: str) -> str:
+        if month != self._last_month:
+            month_num = MONTHS.get(month)
+            if month_num is None:
+                raise ValueError(f"Unknown month: {month}")
+            if month_num < self._last_month_num:
+                self._dates.clear()
+            self._last_month = month
+            self._last_month_num = month_num
+
+        date_prefix = self._dates.get((month, day))
+        if date_prefix is None:
+            date_prefix = self._date_prefix(month, day)
+            if len(self._dates) >= self.max_dates:
+                self._dates.clear()
+            self._dates[(month, day)] = date_prefix
+
+        if not (time_str[:2] < "24" and time_str[3] < "6" and time_str[6] < "6"):
+            raise ValueError(f"Invalid time: {time_str}")
+        return date_prefix + time_str
+
+    def _date_prefix(self, month: str, day: str) -> str:
+        reference = self.reference or datetime.now()
+        month_num = MONTHS[month]
+        year = reference.year - 1 if month_num > reference.month else reference.year
+        # Validates the day for that month/year (e.g. Feb 29).
+        return datetime(year, month_num, int(day)).strftime("%Y-%m-%dT")
+
+
+_default_decoder = SyslogTimestampDecoder()
 
-    data = match.groupdict()
-    month = data["month"]
-    day = int(data["day"])
-    time_str = data["time"]
-    year = datetime.now().year
-
-    # Reconstruct timestamp
-    timestamp_str = f"{month} {day} {year} {time_str}"
-    timestamp = datetime.strptime(timestamp_str, "%b %d %Y %H:%M:%S")
-
-    message = data["message"]
-    process = data["process"]
-
-    ip = None
-    port = None
-    user = None
-    action = "other"
-    success = None
-
-    # Case 1: Failed password
-    if "Failed password for" in message:
-        action = "login_attempt"
-        success = False
-        m = re.search(r"Failed password for (\w+) from ([\d.]+) port (\d+)", message)
-        if m:
-            user, ip, port = m.groups()
-
-    # Case 2: Accepted password
-    elif "Accepted password for" in message:
-        action = "login_attempt"
-        success = True
-        m = re.search(r"Accepted password for (\w+) from ([\d.]+) port (\d+)", message)
-        if m:
-            user, ip, port = m.groups()
-
-    # Case 3: Invalid user
-    elif "Invalid user" in message:
-        action = "invalid_user"
-        success = False
-        m = re.search(r"Invalid user (\w+) from ([\d.]+) port (\d+)", message)
-        if not m:
-            m = re.search(r"Invalid user (\w+) from ([\d.]+)", message)
-        if m:
-            groups = m.groups()
-            user = groups[0]
-            ip = groups[1]
-            if len(groups) > 2:
-                port = groups[2]
-
-    # Determine parse_status
+
+def _classify_message(message: str):
+    """
+    Returns (action, success, user, ip, port) for an sshd message.
+
+    Messages are dispatched once on their prefix; markers that are not at the
+    start (e.g. "message repeated 2 times: [ Failed password ...]") fall back
+    to a substring scan in MESSAGE_RULES order.
+    """
+    rule = _RULES_BY_PREFIX.get(message[:3])
+    if rule is not None and message.startswith(rule[0]):
+        match = rule[3].match(message)
+    else:
+        for rule in MESSAGE_RULES:
+            if rule[0] in message:
+                break
+        else:
+            return "other", None, None, None, None
+        match = rule[3].search(message)
+
+    _, action, success, _ = rule
+    if match:
+        user, ip, port = match.groups()
+        return action, success, user, ip, port
+    return action, success, None, None, None
+
+
+def _parse_status(ip, port, user) -> str:
     if ip and port:
-        parse_status = "parsed"
+        return "parsed"
     elif ip or user:
-        parse_status = "partial"
-    else:
-        parse_status = "unparsed"
+        return "partial"
+    return "unparsed"
+
+
+def _build_event(timestamp: str, host: str, process: str, message: str, raw: str) -> Dict:
+    action, success, user, ip, port = _classify_message(message)
+    parse_status = _parse_status(ip, port, user)
 
     return {
-        "timestamp": timestamp.isoformat(),
+        "timestamp": timestamp,
         "ip": ip,
         "port": int(port) if port else None,
         "process": process,
@@ -86,7 +127,7 @@ def parse_auth_log_line(line: str) -> Optional[Dict]:
         "source": "auth",
         "raw": raw,
         "parsed": {
-            "host": data.get("host"),
+            "host": host,
             "message": message,
             "ip": ip,
             "port": port,
@@ -96,6 +137,37 @@ def parse_auth_log_line(line: str) -> Optional[Dict]:
     }
 
 
+def _failed_event(raw: str) -> Dict:
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "ip": None,
+        "port": None,
+        "process": None,
+        "user": None,
+        "action": "unparsed",
+        "success": None,
+        "source": "auth",
+        "raw": raw,
+        "parsed": {},
+        "parse_status": "failed"
+    }
+
+
+def parse_auth_log_line(line: str) -> Optional[Dict]:
+    """
+    Parses a line from /var/log/auth.log and returns a structured event dict.
+    """
+    raw = line.strip()
+
+    match = HEADER_PATTERN.match(raw)
+    if not match:
+        return None
+
+    month, day, time_str, host, process, _pid, message = match.groups()
+    timestamp = _default_decoder.decode(month, day, time_str)
+    return _build_event(timestamp, host, process, message, raw)
+
+
 def parse_with_status(line: str) -> Dict:
     """
     Always returns a structured event dict, even if the line can't be parsed.
@@ -104,16 +176,87 @@ def parse_with_status(line: str) -> Dict:
     if parsed:
         return parsed
     else:
-        return {
-            "timestamp": datetime.utcnow().isoformat(),
-            "ip": None,
-            "port": None,
-            "process": None,
-            "user": None,
-            "action": "unparsed",
-            "success": None,
-            "source": "auth",
-            "raw": line.strip(),
-            "parsed": {},
-            "parse_status": "failed"
-        }
\ No newline at end of file
+        return _failed_event(line.strip())
+
+
+class AuthLogParser:
+    """
+    Bulk auth.log parser. Produces the same events as `parse_with_status`,
+    one per input line, with a per-parser timestamp decoder. Lines with an
+    impossible date/time are reported as failed instead of raising.
+
+    `reference` anchors the year inference of the timestamp decoder; pass the
+    file's mtime when importing rotated archives.
+    """
+
+    def __init__(self, reference: datetime = None):
+        self.decoder = SyslogTimestampDecoder(reference)
+
+    def parse_line(self, line: str) -> Dict:
+        raw = line.strip()
+        match = HEADER_PATTERN.match(raw)
+        if not match:
+            return _failed_event(raw)
+
+        month, day, time_str, host, process, _pid, message = match.groups()
+        try:
+            timestamp = self.decoder.decode(month, day, time_str)
+        except ValueError:
+            return _failed_event(raw)
+        return _build_event(timestamp, host, process, message, raw)
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[Dict]:
+        parse_line = self.parse_line
+        for line in lines:
+            yield parse_line(line)
+
+    def parse_buffer(self, data: bytes) -> List[Dict]:
+        """Parses a block of newline-separated auth.log bytes."""
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        parse_line = self.parse_line
+        return [parse_line(line) for line in lines]
+
+    def parse_batch(self, lines: Iterable[str], batch: EventBatch = None) -> EventBatch:
+        """
+        Parses `lines` straight into a columnar EventBatch (appending to
+        `batch` if given), without building per-event dicts.
+        """
+        batch = batch if batch is not None else EventBatch()
+        append = batch.append_fields
+        decode = self.decoder.decode
+        for line in lines:
+            raw = line.strip()
+            match = HEADER_PATTERN.match(raw)
+            timestamp = None
+            if match:
+                month, day, time_str, host, process, _pid, message = match.groups()
+                try:
+                    timestamp = decode(month, day, time_str)
+                except ValueError:
+                    pass
+            if timestamp is None:
+                append(datetime.utcnow(), None, None, None, None, "unparsed", None,
+                       "auth", raw, None, -1, "failed")
+                continue
+
+            action, success, user, ip, port = _classify_message(message)
+            append(timestamp, ip, port, process, user, action, success, "auth", raw,
+                   host, match.start("message"), _parse_status(ip, port, user))
+        return batch
+
+    def parse_buffer_batch(self, data: bytes, batch: EventBatch = None) -> EventBatch:
+        """Columnar variant of `parse_buffer`."""
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        return self.parse_batch(lines, batch)
+
+
+def parse_lines(lines: Iterable[str], reference: datetime = None) -> Iterator[Dict]:
+    return AuthLogParser(reference).parse_lines(lines)
+
+
+def parse_buffer(data: bytes, reference: datetime = None) -> List[Dict]:
+    return AuthLogParser(reference).parse_buffer(data)
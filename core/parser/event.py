@@ -0,0 +1,427 @@
+"""
+Compact event representations shared by parsers, storage and classifiers.
+
+Parsers historically return one dict per event, carrying the raw line twice
+(`raw` and `parsed.message`) and ip/port/user twice. Buffering hundreds of
+thousands of those between stages dominates RSS. This module provides:
+
+- `Event`: a `__slots__` record. `parsed.message` is kept as an offset into
+  `raw`, and low-cardinality strings are interned.
+- `EventBatch`: a struct-of-arrays container (typed `array` columns, small
+  integer codes for action/process/source/parse_status) that parsers fill,
+  `PostgresLogger` writes and classifiers vectorize directly.
+
+`to_dict()` rebuilds the original parser dict and is kept only as a
+compatibility view.
+"""
+import json
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Vocabulary:
+    """Bidirectional string <-> small int mapping. Code 0 is reserved for None."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[Optional[str]] = [None]
+        self.codes: Dict[Optional[str], int] = {None: 0}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __getitem__(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+
+# Process-wide vocabularies; unseen values are appended on first use.
+ACTIONS = Vocabulary(("other", "login_attempt", "invalid_user", "unparsed"))
+PARSE_STATUSES = Vocabulary(("parsed", "partial", "unparsed", "failed"))
+SOURCES = Vocabulary(("auth", "nginx", "odoo"))
+PROCESSES = Vocabulary(("sshd",))
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+def _to_micros(timestamp) -> tuple:
+    """Returns (microseconds since epoch, tz-aware flag) for an ISO string or datetime."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        return (timestamp - _EPOCH) // timedelta(microseconds=1), 0
+    return (timestamp - _EPOCH_UTC) // timedelta(microseconds=1), 1
+
+
+def _from_micros(micros: int, aware: int) -> datetime:
+    if aware:
+        return _EPOCH_UTC + timedelta(microseconds=micros)
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class Event:
+    """Slotted event record. See `to_dict()` for the parser dict view."""
+    __slots__ = ("timestamp", "ip", "port", "process", "user", "action", "success",
+                 "source", "raw", "host", "message_offset", "parse_status", "extra")
+
+    def __init__(self, timestamp, ip=None, port=None, process=None, user=None,
+                 action="other", success=None, source="auth", raw="", host=None,
+                 message_offset=-1, parse_status="unparsed", extra=None):
+        self.timestamp = timestamp
+        self.ip = _intern(ip)
+        self.port = port
+        self.process = _intern(process)
+        self.user = _intern(user)
+        self.action = _intern(action)
+        self.success = success
+        self.source = _intern(source)
+        self.raw = raw
+        self.host = _intern(host)
+        self.message_offset = message_offset
+        self.parse_status = _intern(parse_status)
+        self.extra = extra
+
+    @property
+    def message(self) -> Optional[str]:
+        return self.raw[self.message_offset:] if self.message_offset >= 0 else None
+
+    @classmethod
+    def from_dict(cls, event: Dict) -> "Event":
+        parsed = event.get("parsed") or {}
+        raw = event.get("raw") or ""
+        message = parsed.get("message")
+        offset = raw.rfind(message) if message else -1
+        extra = {k: v for k, v in parsed.items()
+                 if k not in ("host", "message", "ip", "port", "user")} or None
+        return cls(
+            timestamp=event["timestamp"],
+            ip=event.get("ip"),
+            port=event.get("port"),
+            process=event.get("process"),
+            user=event.get("user"),
+            action=event.get("action"),
+            success=event.get("success"),
+            source=event.get("source"),
+            raw=raw,
+            host=parsed.get("host"),
+            message_offset=offset,
+            parse_status=event.get("parse_status"),
+            extra=extra,
+        )
+
+    def to_dict(self) -> Dict:
+        """Compatibility view: the dict `parse_with_status` used to return."""
+        if self.parse_status == "failed":
+            parsed = {}
+        else:
+            parsed = {
+                "host": self.host,
+                "message": self.message,
+                "ip": self.ip,
+                "port": str(self.port) if self.port is not None else None,
+                "user": self.user,
+            }
+            if self.extra:
+                parsed.update(self.extra)
+        timestamp = self.timestamp
+        return {
+            "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+            "ip": self.ip,
+            "port": self.port,
+            "process": self.process,
+            "user": self.user,
+            "action": self.action,
+            "success": self.success,
+            "source": self.source,
+            "raw": self.raw,
+            "parsed": parsed,
+            "parse_status": self.parse_status,
+        }
+
+    def get(self, key, default=None):
+        """Dict-style access so code written against event dicts keeps working."""
+        if key == "parsed":
+            return self.to_dict()["parsed"]
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ and key != "parsed":
+            raise KeyError(key)
+        return self.get(key)
+
+    def __repr__(self):
+        return f"Event({self.timestamp!r}, ip={self.ip!r}, action={self.action!r}, parse_status={self.parse_status!r})"
+
+
+class EventBatch:
+    """
+    Struct-of-arrays container of events.
+
+    Columns are typed arrays (timestamps as int64 microseconds, ports with -1
+    for None, success as -1/0/1, vocabulary codes for action/process/source/
+    parse_status) plus lists of interned strings for ip/user/host and the raw
+    lines. Source-specific parsed fields are kept sparsely in `extra`.
+
+    Model features that do not come from the log line itself (score,
+    recent_event_count, the ip_* context features) are attached as float64
+    columns with `set_feature()`; `to_matrix()` refuses to vectorize a batch
+    that lacks any of the features it is asked for.
+    """
+
+    # Columns of `log_events`, in the order `records()` yields them.
+    LOG_EVENTS_COLUMNS = (
+        "timestamp", "ip", "port", "process", "user_name",
+        "action", "success", "source", "parse_status",
+        "raw", "parsed",
+    )
+
+    def __init__(self):
+        self.ts_us = array("q")
+        self.ts_aware = array("b")
+        self.ip: List[Optional[str]] = []
+        self.port = array("l")
+        self.process = array("H")
+        self.user: List[Optional[str]] = []
+        self.action = array("B")
+        self.success = array("b")
+        self.source = array("B")
+        self.raw: List[str] = []
+        self.host: List[Optional[str]] = []
+        self.message_offset = array("l")
+        self.parse_status = array("B")
+        self.extra: Dict[int, Dict] = {}
+        self.features: Dict[str, array] = {}
+
+    def __len__(self):
+        return len(self.raw)
+
+    # Vocabulary codes are process-local, so pickled batches (e.g. returned
+    # by worker processes) carry the vocabularies and are remapped on load.
+    _CODED = (("action", ACTIONS), ("process", PROCESSES), ("source", SOURCES),
+              ("parse_status", PARSE_STATUSES))
+    # One-hot feature prefixes vectorized from the coded columns.
+    _ONE_HOT = (("action_", "action", ACTIONS), ("parse_status_", "parse_status", PARSE_STATUSES),
+                ("source_", "source", SOURCES))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_vocabularies"] = {name: list(vocab.values) for name, vocab in self._CODED}
+        return state
+
+    def __setstate__(self, state):
+        vocabularies = state.pop("_vocabularies", None)
+        self.__dict__.update(state)
+        if not vocabularies:
+            return
+        for name, vocab in self._CODED:
+            remote = vocabularies[name]
+            if remote == vocab.values[:len(remote)]:
+                continue
+            remap = [vocab.code(value) for value in remote]
+            codes = getattr(self, name)
+            setattr(self, name, array(codes.typecode, (remap[c] for c in codes)))
+
+    def append_fields(self, timestamp, ip, port, process, user, action, success,
+                      source, raw, host, message_offset, parse_status, extra=None):
+        """Appends one event from its fields, without building a dict."""
+        micros, aware = _to_micros(timestamp)
+        if extra:
+            self.extra[len(self.raw)] = extra
+        self.ts_us.append(micros)
+        self.ts_aware.append(aware)
+        self.ip.append(_intern(ip))
+        self.port.append(int(port) if port is not None else -1)
+        self.process.append(PROCESSES.code(process))
+        self.user.append(_intern(user))
+        self.action.append(ACTIONS.code(action))
+        self.success.append(-1 if success is None else int(success))
+        self.source.append(SOURCES.code(source))
+        self.raw.append(raw)
+        self.host.append(_intern(host))
+        self.message_offset.append(message_offset)
+        self.parse_status.append(PARSE_STATUSES.code(parse_status))
+
+    def append(self, event):
+        """Appends an `Event` or a parser event dict."""
+        if isinstance(event, dict):
+            event = Event.from_dict(event)
+        self.append_fields(
+            event.timestamp, event.ip, event.port, event.process, event.user,
+            event.action, event.success, event.source, event.raw, event.host,
+            event.message_offset, event.parse_status, event.extra,
+        )
+
+    # Per-event columns, in the order `append_fields` fills them.
+    _COLUMNS = ("ts_us", "ts_aware", "ip", "port", "process", "user", "action", "success",
+                "source", "raw", "host", "message_offset", "parse_status")
+
+    def extend(self, events: Iterable):
+        """Appends events; another EventBatch is concatenated column by column."""
+        if isinstance(events, EventBatch):
+            self._extend_batch(events)
+            return
+        for event in events:
+            self.append(event)
+
+    def _extend_batch(self, other: "EventBatch"):
+        offset = len(self)
+        # Feature columns survive only if both sides have them.
+        if offset:
+            names = [name for name in self.features if name in other.features]
+        else:
+            names = list(other.features)
+        self.features = {name: self.features.get(name, array("d")) + other.features[name]
+                         for name in names}
+        for name in self._COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+        for i, extra in other.extra.items():
+            self.extra[offset + i] = extra
+
+    @classmethod
+    def from_events(cls, events: Iterable) -> "EventBatch":
+        batch = cls()
+        batch.extend(events)
+        return batch
+
+    def timestamp(self, i: int) -> datetime:
+        return _from_micros(self.ts_us[i], self.ts_aware[i])
+
+    def __getitem__(self, i: int) -> Event:
+        port = self.port[i]
+        success = self.success[i]
+        return Event(
+            timestamp=self.timestamp(i).isoformat(),
+            ip=self.ip[i],
+            port=port if port >= 0 else None,
+            process=PROCESSES[self.process[i]],
+            user=self.user[i],
+            action=ACTIONS[self.action[i]],
+            success=None if success < 0 else bool(success),
+            source=SOURCES[self.source[i]],
+            raw=self.raw[i],
+            host=self.host[i],
+            message_offset=self.message_offset[i],
+            parse_status=PARSE_STATUSES[self.parse_status[i]],
+            extra=self.extra.get(i),
+        )
+
+    def __iter__(self) -> Iterator[Event]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self) -> List[Dict]:
+        """Compatibility view: one parser dict per event."""
+        return [event.to_dict() for event in self]
+
+    def _parsed(self, i: int) -> Optional[Dict]:
+        if PARSE_STATUSES[self.parse_status[i]] == "failed":
+            return None
+        port = self.port[i]
+        offset = self.message_offset[i]
+        parsed = {
+            "host": self.host[i],
+            "message": self.raw[i][offset:] if offset >= 0 else None,
+            "ip": self.ip[i],
+            "port": str(port) if port >= 0 else None,
+            "user": self.user[i],
+        }
+        extra = self.extra.get(i)
+        if extra:
+            parsed.update(extra)
+        return parsed
+
+    def records(self) -> Iterator[tuple]:
+        """Yields one `log_events` row per event, see LOG_EVENTS_COLUMNS."""
+        for i in range(len(self)):
+            port = self.port[i]
+            success = self.success[i]
+            parsed = self._parsed(i)
+            yield (
+                self.timestamp(i),
+                self.ip[i],
+                port if port >= 0 else None,
+                PROCESSES[self.process[i]],
+                self.user[i],
+                ACTIONS[self.action[i]],
+                None if success < 0 else bool(success),
+                SOURCES[self.source[i]],
+                PARSE_STATUSES[self.parse_status[i]],
+                self.raw[i],
+                json.dumps(parsed) if parsed else None,
+            )
+
+    def set_feature(self, name: str, values: Iterable[float]):
+        """Attaches one numeric feature column (one value per event, None as 0)."""
+        column = array("d", (0.0 if v is None else v for v in values))
+        if len(column) != len(self):
+            raise ValueError(f"Feature {name!r} has {len(column)} values for {len(self)} events")
+        self.features[name] = column
+
+    def has_column(self, name: str) -> bool:
+        return (name in self.features or name in ("port", "success", "hour")
+                or any(name.startswith(prefix) for prefix, _, _ in self._ONE_HOT))
+
+    def column(self, name: str):
+        """
+        Returns one numeric feature column as float32, vectorized from the
+        arrays. Supports `port`, `success`, `hour`, one-hot names
+        `action_<value>`, `parse_status_<value>`, `source_<value>` (zeros
+        for values no event has) and the columns added with `set_feature()`.
+        Raises KeyError for anything else. `hour` is the wall-clock hour for
+        naive timestamps and the UTC hour for aware ones.
+        """
+        import numpy as np
+
+        n = len(self)
+        if name in self.features:
+            return np.frombuffer(self.features[name], dtype=np.float64).astype(np.float32)
+        if name == "port":
+            col = np.frombuffer(self.port, dtype=f"i{self.port.itemsize}")
+            return np.where(col >= 0, col, 0).astype(np.float32)
+        if name == "success":
+            col = np.frombuffer(self.success, dtype=np.int8)
+            return (col > 0).astype(np.float32)
+        if name == "hour":
+            micros = np.frombuffer(self.ts_us, dtype=np.int64)
+            return ((micros // 3_600_000_000) % 24).astype(np.float32)
+        for prefix, attr, vocab in self._ONE_HOT:
+            if name.startswith(prefix):
+                code = vocab.codes.get(name[len(prefix):])
+                if code is None:
+                    return np.zeros(n, dtype=np.float32)
+                return (np.frombuffer(getattr(self, attr), dtype=np.uint8) == code).astype(np.float32)
+        raise KeyError(name)
+
+    def to_matrix(self, feature_order: List[str], out=None):
+        """
+        Writes the features in `feature_order` into an (n, f) float32 array.
+        Raises ValueError, before writing anything, if the batch cannot
+        produce some of them (e.g. context features never attached).
+        """
+        import numpy as np
+
+        missing = [name for name in feature_order if not self.has_column(name)]
+        if missing:
+            raise ValueError(f"EventBatch has no column for features {missing}; "
+                             f"attach them with set_feature()")
+        if out is None:
+            out = np.empty((len(self), len(feature_order)), dtype=np.float32)
+        for j, name in enumerate(feature_order):
+            out[:, j] = self.column(name)
+        return out
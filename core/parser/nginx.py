@@ -0,0 +1,327 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .auth import MONTHS
+from .event import EventBatch
+
+COMBINED_FORMAT = (
+    '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent '
+    '"$http_referer" "$http_user_agent"'
+)
+
+VARIABLE_PATTERN = re.compile(r"\$(\w+)|\$\{(\w+)\}")
+
+# Variables with a known shape get a tighter sub-pattern than "up to the next
+# literal character", so a malformed line fails instead of matching garbage.
+VARIABLE_PATTERNS = {
+    "remote_addr": r"[0-9A-Fa-f.:]+",
+    "remote_port": r"\d+",
+    "time_local": r"\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4}",
+    "time_iso8601": r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:[+-]\d{2}:\d{2}|Z)",
+    "status": r"\d{3}",
+    "body_bytes_sent": r"\d+|-",
+    "bytes_sent": r"\d+|-",
+    "request_length": r"\d+|-",
+    "request_time": r"[\d.]+|-",
+    "upstream_response_time": r"[\d., :-]+",
+}
+
+# (nginx variable, key in `parsed`, converter); variables not listed here are
+# kept under their own name as strings.
+FIELDS = {
+    "status": ("status", int),
+    "body_bytes_sent": ("bytes_sent", int),
+    "bytes_sent": ("bytes_sent", int),
+    "request_length": ("request_length", int),
+    "request_time": ("request_time", float),
+    "http_referer": ("referer", str),
+    "http_user_agent": ("user_agent", str),
+    "host": ("vhost", str),
+}
+
+
+class LogFormat:
+    """
+    An nginx `log_format` string compiled into one anchored regex.
+
+    Each `$variable` becomes a group matching up to the next literal
+    character of the format (or the sub-pattern in VARIABLE_PATTERNS), so
+    a line is split in a single `match()` without backtracking. `fields` maps
+    each variable to its group index for `match.groups()`.
+    """
+
+    def __init__(self, log_format: str = COMBINED_FORMAT):
+        self.log_format = log_format
+        parts = []
+        names = []
+        pos = 0
+        matches = list(VARIABLE_PATTERN.finditer(log_format))
+        for i, m in enumerate(matches):
+            parts.append(re.escape(log_format[pos:m.start()]))
+            name = m.group(1) or m.group(2)
+            following = log_format[m.end():m.end() + 1]
+            if name in VARIABLE_PATTERNS:
+                pattern = VARIABLE_PATTERNS[name]
+            elif not following:
+                pattern = ".*"
+            elif following == "$":
+                pattern = r"\S*"
+            else:
+                pattern = f"[^{re.escape(following)}]*"
+            if name in names:
+                parts.append(f"(?:{pattern})")
+            else:
+                parts.append(f"({pattern})")
+                names.append(name)
+            pos = m.end()
+        parts.append(re.escape(log_format[pos:]))
+
+        self.pattern = re.compile("^" + "".join(parts) + "$")
+        self.fields = {name: i for i, name in enumerate(names)}
+
+    def match(self, line: str):
+        return self.pattern.match(line)
+
+
+class NginxTimestampDecoder:
+    """
+    Turns `$time_local` ("10/Oct/2024:13:55:36 +0200") into an ISO timestamp
+    with offset. Busy vhosts log many lines per second, so the last stamp is
+    remembered as a whole; date and offset parts are cached separately.
+    """
+
+    def __init__(self):
+        self._dates = {}
+        self._offsets = {}
+        self._last = None
+        self._last_decoded = None
+
+    def decode(self, value: str) -> str:
+        if value == self._last:
+            return self._last_decoded
+
+        date_prefix = self._dates.get(value[:11])
+        if date_prefix is None:
+            day, month, year = value[:11].split("/")
+            month_num = MONTHS.get(month)
+            if month_num is None:
+                raise ValueError(f"Unknown month: {month}")
+            date_prefix = datetime(int(year), month_num, int(day)).strftime("%Y-%m-%dT")
+            self._dates[value[:11]] = date_prefix
+
+        offset = self._offsets.get(value[21:])
+        if offset is None:
+            tz = value[21:]
+            offset = f"{tz[:3]}:{tz[3:]}"
+            self._offsets[tz] = offset
+
+        time_str = value[12:20]
+        if not (time_str[:2] < "24" and time_str[3] < "6" and time_str[6] < "6"):
+            raise ValueError(f"Invalid time: {time_str}")
+        self._last = value
+        self._last_decoded = date_prefix + time_str + offset
+        return self._last_decoded
+
+
+def _split_request(request: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """'GET /path HTTP/1.1' -> (method, path, protocol); junk requests keep only the path."""
+    parts = request.split(" ")
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    return None, request or None, None
+
+
+def _failed_event(raw: str) -> Dict:
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "ip": None,
+        "port": None,
+        "process": None,
+        "user": None,
+        "action": "unparsed",
+        "success": None,
+        "source": "nginx",
+        "raw": raw,
+        "parsed": {},
+        "parse_status": "failed"
+    }
+
+
+class NginxLogParser:
+    """
+    Bulk nginx access-log parser for any `log_format` (combined by default).
+
+    Events follow the `core.parser.auth` schema: `ip` from $remote_addr,
+    `port` from $remote_port, `user` from $remote_user, `process` "nginx",
+    `source` "nginx", `action` "http_request" and `success` = status < 400.
+    Request and response fields (method, path, protocol, status, bytes_sent,
+    referer, user_agent, ...) go into `parsed` next to ip/port/user, and
+    `parsed.message` is the text from the request on. Lines that do not
+    match the format, or carry an impossible timestamp, are "failed".
+    """
+
+    def __init__(self, log_format: str = COMBINED_FORMAT):
+        self.format = LogFormat(log_format)
+        self.decoder = NginxTimestampDecoder()
+        self._last_timestamp = self._last_datetime = None
+        fields = self.format.fields
+        self._ip = fields.get("remote_addr")
+        self._port = fields.get("remote_port")
+        self._user = fields.get("remote_user")
+        self._time_local = fields.get("time_local")
+        self._time_iso = fields.get("time_iso8601")
+        self._request = fields.get("request")
+        self._status = fields.get("status")
+        self._message_group = (self._request if self._request is not None else 0) + 1
+        self._extra = [
+            (index,) + FIELDS.get(name, (name, str))
+            for name, index in fields.items()
+            if name not in ("remote_addr", "remote_port", "remote_user", "time_local",
+                            "time_iso8601", "request")
+        ]
+
+    def _checked(self, timestamp: str) -> str:
+        """
+        Raises ValueError unless `timestamp` is a valid ISO timestamp (the
+        regexes accept e.g. month 13). Checked once per distinct value; the
+        parsed datetime is kept in `_last_datetime`.
+        """
+        if timestamp != self._last_timestamp:
+            self._last_datetime = datetime.fromisoformat(timestamp)
+            self._last_timestamp = timestamp
+        return timestamp
+
+    def _fields(self, match):
+        """
+        Returns (timestamp, ip, port, user, success, extra) for a matched
+        line; raises ValueError if its timestamp is impossible.
+        """
+        values = match.groups()
+        if self._time_local is not None:
+            timestamp = self._checked(self.decoder.decode(values[self._time_local]))
+        elif self._time_iso is not None:
+            timestamp = self._checked(values[self._time_iso].replace("Z", "+00:00"))
+        else:
+            timestamp = self._checked(datetime.utcnow().isoformat())
+
+        ip = values[self._ip] if self._ip is not None else None
+        port = values[self._port] if self._port is not None else None
+        user = values[self._user] if self._user is not None else None
+        if user == "-" or user == "":
+            user = None
+
+        extra = {}
+        if self._request is not None:
+            extra["method"], extra["path"], extra["protocol"] = _split_request(values[self._request])
+        for index, key, convert in self._extra:
+            value = values[index]
+            if value == "-" or value == "":
+                extra[key] = None
+            elif convert is str:
+                extra[key] = value
+            else:
+                try:
+                    extra[key] = convert(value)
+                except ValueError:
+                    extra[key] = value
+        status = extra.get("status")
+        success = status < 400 if isinstance(status, int) else None
+        return timestamp, ip, port, user, success, extra
+
+    @staticmethod
+    def _parse_status(ip, success) -> str:
+        if ip and success is not None:
+            return "parsed"
+        elif ip:
+            return "partial"
+        return "unparsed"
+
+    def parse_line(self, line: str) -> Dict:
+        raw = line.strip()
+        match = self.format.match(raw)
+        if not match:
+            return _failed_event(raw)
+        try:
+            timestamp, ip, port, user, success, extra = self._fields(match)
+        except ValueError:
+            return _failed_event(raw)
+
+        parsed = {
+            "host": None,
+            "message": raw[match.start(self._message_group):],
+            "ip": ip,
+            "port": port,
+            "user": user,
+        }
+        parsed.update(extra)
+        return {
+            "timestamp": timestamp,
+            "ip": ip,
+            "port": int(port) if port else None,
+            "process": "nginx",
+            "user": user,
+            "action": "http_request",
+            "success": success,
+            "source": "nginx",
+            "raw": raw,
+            "parsed": parsed,
+            "parse_status": self._parse_status(ip, success),
+        }
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[Dict]:
+        parse_line = self.parse_line
+        for line in lines:
+            yield parse_line(line)
+
+    def parse_buffer(self, data: bytes) -> List[Dict]:
+        """Parses a block of newline-separated access-log bytes."""
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        parse_line = self.parse_line
+        return [parse_line(line) for line in lines]
+
+    def parse_batch(self, lines: Iterable[str], batch: EventBatch = None) -> EventBatch:
+        """Parses `lines` straight into a columnar EventBatch."""
+        batch = batch if batch is not None else EventBatch()
+        append = batch.append_fields
+        match_line = self.format.match
+        fields = self._fields
+        message_group = self._message_group
+        parse_status = self._parse_status
+
+        for line in lines:
+            raw = line.strip()
+            match = match_line(raw)
+            values = None
+            if match:
+                try:
+                    values = fields(match)
+                except ValueError:
+                    pass
+            if values is None:
+                append(datetime.utcnow(), None, None, None, None, "unparsed", None,
+                       "nginx", raw, None, -1, "failed")
+                continue
+
+            _, ip, port, user, success, extra = values
+            # `fields` just checked this line's timestamp: reuse its datetime.
+            append(self._last_datetime, ip, port, "nginx", user, "http_request", success, "nginx", raw,
+                   None, match.start(message_group), parse_status(ip, success), extra)
+        return batch
+
+    def parse_buffer_batch(self, data: bytes, batch: EventBatch = None) -> EventBatch:
+        """Columnar variant of `parse_buffer`."""
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        if lines and not lines[-1]:
+            lines.pop()
+        return self.parse_batch(lines, batch)
+
+
+def parse_lines(lines: Iterable[str], log_format: str = COMBINED_FORMAT) -> Iterator[Dict]:
+    return NginxLogParser(log_format).parse_lines(lines)
+
+
+def parse_buffer(data: bytes, log_format: str = COMBINED_FORMAT) -> List[Dict]:
+    return NginxLogParser(log_format).parse_buffer(data)
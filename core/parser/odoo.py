@@ -0,0 +1,284 @@
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .event import EventBatch
+
+HEADER_PATTERN = re.compile(
+    r"^(?P<date>\d{4}-\d{2}-\d{2}) (?P<time>\d{2}:\d{2}:\d{2}),(?P<ms>\d{3}) (?P<pid>\d+) "
+    r"(?P<level>[A-Z]+) (?P<db>\S+) (?P<logger>[\w.]+): (?P<message>.*)$"
+)
+
+LOGIN_PATTERN = re.compile(r"Login (successful|failed) for db:(\S*) login:(\S*) from (\S+)")
+ACCESS_DENIED_PATTERN = re.compile(
+    r"Access Denied(?: by ACLs)?(?: for operation: (?P<operation>\w+), uid: (?P<uid>\d+), model: (?P<model>[\w.]+))?"
+)
+WERKZEUG_PATTERN = re.compile(
+    r'^(?P<ip>\S+) - - \[[^\]]+\] "(?P<method>\S+) (?P<path>\S+) [^"]*" (?P<status>\d{3})'
+)
+RPC_PATH_PATTERN = re.compile(
+    r"^/(?:xmlrpc/(?:2/)?(?P<service>\w+)|jsonrpc|web/dataset/call_kw(?:/(?P<model>[\w.]+)/(?P<method>\w+))?"
+    r"|web/dataset/call_button|web/session/authenticate)"
+)
+ACCESS_DENIED_MARKERS = ("Access Denied", "AccessDenied", "AccessError")
+
+
+def _failed_event(raw: str) -> Dict:
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "ip": None,
+        "port": None,
+        "process": None,
+        "user": None,
+        "action": "unparsed",
+        "success": None,
+        "source": "odoo",
+        "raw": raw,
+        "parsed": {},
+        "parse_status": "failed"
+    }
+
+
+def _classify_record(logger: str, message: str, continuation: List[str]):
+    """
+    Returns (action, success, user, ip, extra) for one Odoo record.
+
+    - res_users "Login successful/failed for db:.. login:.. from ip"
+    - "Access Denied" messages, or a traceback ending in AccessDenied/AccessError
+    - werkzeug request lines on RPC endpoints (xmlrpc, jsonrpc, call_kw, ...);
+      other werkzeug requests are reported as plain http_request.
+    """
+    if message.startswith("Login "):
+        match = LOGIN_PATTERN.match(message)
+        if match:
+            outcome, db, login, ip = match.groups()
+            return "login_attempt", outcome == "successful", login or None, ip, {"login_db": db}
+
+    if logger == "werkzeug":
+        match = WERKZEUG_PATTERN.match(message)
+        if match:
+            status = int(match.group("status"))
+            extra = {"method": match.group("method"), "path": match.group("path"), "status": status}
+            rpc = RPC_PATH_PATTERN.match(match.group("path"))
+            if rpc is None:
+                return "http_request", status < 400, None, match.group("ip"), extra
+            extra["rpc_service"] = rpc.group("service")
+            extra["rpc_model"] = rpc.group("model")
+            extra["rpc_method"] = rpc.group("method")
+            return "rpc_call", status < 400, None, match.group("ip"), extra
+
+    last_line = continuation[-1] if continuation else ""
+    if any(marker in message or marker in last_line for marker in ACCESS_DENIED_MARKERS):
+        extra = {"exception": last_line.strip() or None}
+        match = ACCESS_DENIED_PATTERN.search(message)
+        if match and match.group("model"):
+            extra["operation"] = match.group("operation")
+            extra["uid"] = int(match.group("uid"))
+            extra["model"] = match.group("model")
+        return "access_denied", False, None, None, extra
+
+    if continuation:
+        return "other", None, None, None, {"exception": last_line.strip() or None}
+    return "other", None, None, None, {}
+
+
+def _parse_status(ip, user) -> str:
+    if ip:
+        return "parsed"
+    elif user:
+        return "partial"
+    return "unparsed"
+
+
+class OdooLogParser:
+    """
+    Streaming Odoo server-log parser.
+
+    Odoo writes one header line per record ("2024-01-15 10:23:45,123 4242
+    INFO db logger: message"). Tracebacks and other multi-line messages
+    follow as continuation lines without a header. The parser keeps at most
+    one pending record and emits it when the next header arrives, so memory
+    stays flat whatever the file size. Per record at most
+    `max_continuation_lines` lines / `max_record_bytes` bytes are kept; the
+    rest is counted in `parsed.truncated_lines` and dropped.
+
+    Each record becomes one event in the `core.parser.auth` schema with
+    `source`/`process` "odoo" and the whole record as `raw`. Level, db,
+    logger and pid go to `parsed`, along with the classification fields of
+    `_classify_record`. Continuation lines before the first header are
+    reported as one failed event.
+
+    The parser is stateful: `parse_lines()` and `parse_batch()` hold back the
+    last record until more input or `flush()` / `flush_batch()` completes
+    it, so a record split across chunks is still emitted once. Feed chunks
+    in order, from a single thread (one parse worker in IngestPipeline).
+    """
+
+    def __init__(self, max_continuation_lines: int = 200, max_record_bytes: int = 64 * 1024):
+        self.max_continuation_lines = max_continuation_lines
+        self.max_record_bytes = max_record_bytes
+        self._header = None            # Match of the pending record, or None.
+        self._continuation: List[str] = []
+        self._orphans: List[str] = []  # Continuation lines seen before any header.
+        self._size = 0
+        self._truncated = 0
+        self._dates = {}
+
+    def _timestamp(self, date: str, time_str: str, ms: str) -> str:
+        if date not in self._dates:
+            # Validates the date once (e.g. Feb 30) and caches it.
+            datetime.strptime(date, "%Y-%m-%d")
+            self._dates[date] = date + "T"
+        if not (time_str[:2] < "24" and time_str[3] < "6" and time_str[6] < "6"):
+            raise ValueError(f"Invalid time: {time_str}")
+        return f"{self._dates[date]}{time_str}.{ms}000"
+
+    def _feed(self, line: str):
+        """Consumes one line. Returns a completed record (header, continuation, truncated) or None."""
+        line = line.rstrip("\r\n")
+        match = HEADER_PATTERN.match(line)
+        if match is None:
+            if self._header is None:
+                if line.strip() and len(self._orphans) < self.max_continuation_lines:
+                    self._orphans.append(line)
+                return None
+            if (len(self._continuation) < self.max_continuation_lines
+                    and self._size + len(line) <= self.max_record_bytes):
+                self._continuation.append(line)
+                self._size += len(line) + 1
+            else:
+                self._truncated += 1
+            return None
+
+        record = self._take()
+        self._header = match
+        self._size = len(line)
+        return record
+
+    def _take(self):
+        if self._header is None:
+            return None
+        record = (self._header, self._continuation, self._truncated)
+        self._header, self._continuation, self._size, self._truncated = None, [], 0, 0
+        return record
+
+    def _take_orphans(self) -> Optional[str]:
+        if not self._orphans:
+            return None
+        raw, self._orphans = "\n".join(self._orphans), []
+        return raw
+
+    def _fields(self, record):
+        """Returns the event fields of a record, raising ValueError on a bad timestamp."""
+        match, continuation, truncated = record
+        date, time_str, ms, pid, level, db, logger, message = match.groups()
+        timestamp = self._timestamp(date, time_str, ms)
+        raw = "\n".join([match.string] + continuation) if continuation else match.string
+        action, success, user, ip, extra = _classify_record(logger, message, continuation)
+        extra.update({"level": level, "db": None if db == "?" else db, "logger": logger, "pid": int(pid)})
+        if continuation:
+            extra["continuation_lines"] = len(continuation)
+        if truncated:
+            extra["truncated_lines"] = truncated
+        return timestamp, raw, match.start("message"), action, success, user, ip, extra
+
+    def _event(self, record) -> Dict:
+        try:
+            timestamp, raw, offset, action, success, user, ip, extra = self._fields(record)
+        except ValueError:
+            return _failed_event("\n".join([record[0].string] + record[1]))
+        parsed = {
+            "host": None,
+            "message": raw[offset:],
+            "ip": ip,
+            "port": None,
+            "user": user,
+        }
+        parsed.update(extra)
+        return {
+            "timestamp": timestamp,
+            "ip": ip,
+            "port": None,
+            "process": "odoo",
+            "user": user,
+            "action": action,
+            "success": success,
+            "source": "odoo",
+            "raw": raw,
+            "parsed": parsed,
+            "parse_status": _parse_status(ip, user),
+        }
+
+    def parse_lines(self, lines: Iterable[str], final: bool = True) -> Iterator[Dict]:
+        """
+        Yields one event per completed record. With `final=False` the last
+        record stays pending for the next call (streaming input).
+        """
+        for line in lines:
+            record = self._feed(line)
+            orphans = self._take_orphans() if self._header is not None else None
+            if orphans is not None:
+                yield _failed_event(orphans)
+            if record is not None:
+                yield self._event(record)
+        if final:
+            yield from self.flush()
+
+    def flush(self) -> Iterator[Dict]:
+        """Emits the pending record (end of input)."""
+        orphans = self._take_orphans()
+        if orphans is not None:
+            yield _failed_event(orphans)
+        record = self._take()
+        if record is not None:
+            yield self._event(record)
+
+    def parse_file(self, path) -> Iterator[Dict]:
+        """Streams the events of an Odoo log file, line by line."""
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from self.parse_lines(f)
+
+    def _append(self, batch: EventBatch, record):
+        try:
+            timestamp, raw, offset, action, success, user, ip, extra = self._fields(record)
+        except ValueError:
+            batch.append_fields(datetime.utcnow(), None, None, None, None, "unparsed", None, "odoo",
+                                "\n".join([record[0].string] + record[1]), None, -1, "failed")
+            return
+        batch.append_fields(timestamp, ip, None, "odoo", user, action, success, "odoo", raw,
+                            None, offset, _parse_status(ip, user), extra)
+
+    def parse_batch(self, lines: Iterable[str], batch: EventBatch = None) -> EventBatch:
+        """
+        Streaming columnar variant: appends the records completed by `lines`.
+        The last record is held back until the next call or `flush_batch()`.
+        """
+        batch = batch if batch is not None else EventBatch()
+        for line in lines:
+            record = self._feed(line)
+            orphans = self._take_orphans() if self._header is not None else None
+            if orphans is not None:
+                batch.append_fields(datetime.utcnow(), None, None, None, None, "unparsed", None,
+                                    "odoo", orphans, None, -1, "failed")
+            if record is not None:
+                self._append(batch, record)
+        return batch
+
+    def flush_batch(self, batch: EventBatch = None) -> EventBatch:
+        batch = batch if batch is not None else EventBatch()
+        orphans = self._take_orphans()
+        if orphans is not None:
+            batch.append_fields(datetime.utcnow(), None, None, None, None, "unparsed", None,
+                                "odoo", orphans, None, -1, "failed")
+        record = self._take()
+        if record is not None:
+            self._append(batch, record)
+        return batch
+
+
+def parse_lines(lines: Iterable[str]) -> Iterator[Dict]:
+    return OdooLogParser().parse_lines(lines)
+
+
+def parse_file(path) -> Iterator[Dict]:
+    return OdooLogParser().parse_file(path)
@@ -0,0 +1,344 @@
+"""
+Local scoring daemon.
+
+Keeps the adopted model, scaler and the Postgres pool warm in one process
+and answers scoring requests over a Unix socket or localhost TCP, one JSON
+object per line:
+
+    -> {"event": {...}, "score": 120, "recent_event_count": 8}
+    <- {"action": "block", "probability": 0.97, "batch_size": 12, "latency_ms": 3.1}
+
+    -> {"cmd": "stats"}
+    <- {"requests": ..., "latency_ms": {"p50": .., "p99": ..}, "batch_sizes": {...}, ...}
+       (plus "decision_cache" hit/miss counters when the decision cache is on,
+        and the Postgres pool's checkout metrics under "pool")
+
+Concurrent requests are coalesced into micro-batches: the batcher waits for
+the first request, then keeps collecting until `max_batch_size` requests are
+queued or the collection window closes. The window adapts so that queueing
+plus the (moving average) batch service time stays within
+`latency_budget_ms`, i.e. it shrinks when batches get slow, and it is
+skipped when requests arrive too sparsely to be worth waiting for. Each batch is
+enriched with one `enrich_events` query and scored with one forward pass, in
+a worker thread, so the event loop keeps accepting connections meanwhile.
+
+Malformed requests are rejected in `submit()`, before they join a batch. If
+a batch still fails (e.g. one event's IP breaks the enrich query), its
+requests are retried one by one so only the offending request gets an error.
+
+Every `model_poll_interval` seconds the daemon checks which model is adopted
+in training_runs; when a training run in another process adopted a new one,
+the decision cache is dropped and the model reloaded
+(`ActionPredictor.check_adopted_model`).
+
+The Unix socket is created with mode 0600 (owner only), and each connection
+has at most `max_pipelined` requests in flight: past that, the server stops
+reading from it until answers have been written.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from core.classifier.predictor import ActionPredictor, build_feature_row, get_predictor
+from core.storage.pool import pool_metrics
+
+load_dotenv()
+
+SCORING_SOCKET = os.getenv("SCORING_SOCKET", "/tmp/afw-scoring.sock")
+SCORING_MAX_BATCH = int(os.getenv("SCORING_MAX_BATCH", "256"))
+SCORING_LATENCY_BUDGET_MS = float(os.getenv("SCORING_LATENCY_BUDGET_MS", "20"))
+SCORING_MAX_PIPELINED = int(os.getenv("SCORING_MAX_PIPELINED", "1024"))
+SCORING_MODEL_POLL_SECONDS = float(os.getenv("SCORING_MODEL_POLL_SECONDS", "30"))
+
+
+class LatencyStats:
+    """Recent request latencies (for p50/p99) and a power-of-two batch-size histogram."""
+
+    def __init__(self, window: int = 10_000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_batch(self, size: int):
+        self.batches += 1
+        self.batch_sizes[1 << (size - 1).bit_length()] += 1
+
+    def record_request(self, latency: float):
+        self.requests += 1
+        self.latencies.append(latency)
+
+    @staticmethod
+    def _percentile(ordered, q: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.latencies)
+        to_ms = lambda v: None if v is None else round(v * 1000, 3)
+        return {
+            "requests"      : self.requests,
+            "batches"       : self.batches,
+            "errors"        : self.errors,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "latency_ms"    : {
+                "p50"   : to_ms(self._percentile(ordered, 0.50)),
+                "p90"   : to_ms(self._percentile(ordered, 0.90)),
+                "p99"   : to_ms(self._percentile(ordered, 0.99)),
+                "max"   : to_ms(ordered[-1] if ordered else None),
+            },
+            # Bucket b counts batches of size in (b/2, b].
+            "batch_sizes"   : {f"<={size}": count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+
+class MicroBatcher:
+    """Coalesces `submit()` calls into batches scored by `predictor.predict_actions`."""
+
+    def __init__(self, predictor: ActionPredictor, max_batch_size: int = SCORING_MAX_BATCH,
+                 latency_budget_ms: float = SCORING_LATENCY_BUDGET_MS):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.latency_budget = latency_budget_ms / 1000
+        self.stats = LatencyStats()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._service_time = 0.0        # EWMA of batch scoring time, seconds.
+        self._arrival_gap = None        # EWMA of the time between requests, seconds.
+        self._last_arrival = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def window(self) -> float:
+        """
+        How long to keep collecting after the first request of a batch: what
+        is left of the latency budget after the expected service time, and
+        nothing at all when requests arrive too sparsely for another one to
+        show up within that time.
+        """
+        window = max(0.0, self.latency_budget - self._service_time)
+        if self._arrival_gap is None or self._arrival_gap > window:
+            return 0.0
+        return window
+
+    async def submit(self, event: Dict, score, recent_event_count) -> Dict:
+        """
+        Scores one request. Raises right away (without joining a batch) if
+        the event lacks the fields the feature row is built from.
+        """
+        build_feature_row(event, score, recent_event_count, {})
+        now = time.perf_counter()
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self._arrival_gap = gap if self._arrival_gap is None else 0.8 * self._arrival_gap + 0.2 * gap
+        self._last_arrival = now
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((event, score, recent_event_count), future, now))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window()
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without yielding to the loop...
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                break
+            # ...then wait for more until the window closes.
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _score(self, batch):
+        """
+        (label, probability) or the exception of each request in `batch`:
+        one `predict_actions` call, and one call per request if it fails.
+        """
+        loop = asyncio.get_running_loop()
+        requests = [item[0] for item in batch]
+        try:
+            labels, probs = await loop.run_in_executor(None, self.predictor.predict_actions, requests)
+            return list(zip(labels, probs))
+        except Exception:
+            if len(requests) == 1:
+                raise
+        results = []
+        for request in requests:
+            try:
+                labels, probs = await loop.run_in_executor(None, self.predictor.predict_actions, [request])
+                results.append((labels[0], probs[0]))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            start = time.perf_counter()
+            try:
+                results = await self._score(batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            finished = time.perf_counter()
+            self._service_time = 0.8 * self._service_time + 0.2 * (finished - start)
+            self.stats.record_batch(len(batch))
+
+            for (_, future, submitted), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    self.stats.errors += 1
+                    future.set_exception(result)
+                    continue
+                latency = finished - submitted
+                self.stats.record_request(latency)
+                label, prob = result
+                future.set_result({
+                    "action"        : label,
+                    "probability"   : prob,
+                    "batch_size"    : len(batch),
+                    "latency_ms"    : round(latency * 1000, 3),
+                })
+
+
+class ScoringServer:
+    """JSON-lines front end for a MicroBatcher, on a Unix socket or localhost TCP port."""
+
+    def __init__(self, batcher: MicroBatcher, socket_path: Optional[str] = SCORING_SOCKET,
+                 host: str = "127.0.0.1", port: Optional[int] = None,
+                 max_pipelined: int = SCORING_MAX_PIPELINED,
+                 model_poll_interval: Optional[float] = SCORING_MODEL_POLL_SECONDS):
+        self.batcher = batcher
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.max_pipelined = max_pipelined
+        self.model_poll_interval = model_poll_interval
+        self._server = None
+        self._model_watch = None
+        self._connections = {}      # handler task -> writer
+
+    async def start(self):
+        self.batcher.start()
+        if self.model_poll_interval:
+            self._model_watch = asyncio.create_task(self._watch_model())
+        if self.port is not None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        else:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+            os.chmod(self.socket_path, 0o600)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        for writer in list(self._connections.values()):
+            writer.close()          # Handlers see EOF and finish on their own.
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._model_watch is not None:
+            self._model_watch.cancel()
+            await asyncio.gather(self._model_watch, return_exceptions=True)
+        await self.batcher.stop()
+        if self.port is None and self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _watch_model(self):
+        """Polls for a newly adopted model; the reload runs in a worker thread."""
+        loop = asyncio.get_running_loop()
+        predictor = self.batcher.predictor
+        while True:
+            try:
+                if await loop.run_in_executor(None, predictor.check_adopted_model):
+                    print("🔄 New adopted model: decision cache cleared, model reloaded")
+            except Exception as e:
+                print(f"⚠️ Adopted model check failed: {e}")
+            await asyncio.sleep(self.model_poll_interval)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests on one connection are scored concurrently (a pipelining
+        # client fills batches by itself) and answered in order. The queue is
+        # bounded so a client that never reads its answers stalls its own
+        # connection instead of growing the daemon's memory.
+        answers: asyncio.Queue = asyncio.Queue(maxsize=self.max_pipelined)
+
+        async def write_answers():
+            while (task := await answers.get()) is not None:
+                writer.write(json.dumps(await task).encode() + b"\n")
+                await writer.drain()
+
+        writer_task = asyncio.create_task(write_answers())
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while line := await reader.readline():
+                await answers.put(asyncio.create_task(self._answer(line)))
+            await answers.put(None)
+            await writer_task
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer_task.cancel()
+            writer.close()
+
+    async def _answer(self, line: bytes) -> Dict:
+        try:
+            request = json.loads(line)
+            if request.get("cmd") == "stats":
+                stats = self.batcher.stats.snapshot()
+                cache = getattr(self.batcher.predictor, "decision_cache", None)
+                if cache is not None:
+                    stats["decision_cache"] = cache.stats()
+                stats["pool"] = pool_metrics()["sync"]
+                return stats
+            return await self.batcher.submit(
+                request["event"], request.get("score", 0), request.get("recent_event_count", 0),
+            )
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+
+async def serve(socket_path: Optional[str] = SCORING_SOCKET, port: Optional[int] = None,
+                max_batch_size: int = SCORING_MAX_BATCH,
+                latency_budget_ms: float = SCORING_LATENCY_BUDGET_MS):
+    """Warms up the model and the DB pool, then serves until cancelled."""
+    from core.storage.pool import connection
+
+    predictor = get_predictor().warm_up()
+    with connection():
+        pass
+
+    server = ScoringServer(MicroBatcher(predictor, max_batch_size, latency_budget_ms), socket_path, port=port)
+    where = f"127.0.0.1:{port}" if port is not None else socket_path
+    print(f"✅ Scoring daemon listening on {where} (batch ≤ {max_batch_size}, budget {latency_budget_ms} ms)")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
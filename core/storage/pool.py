@@ -0,0 +1,226 @@
+"""
+Process-wide PostgreSQL connection pools.
+
+Both flavours are created lazily on first use and shared by every caller in
+the process:
+
+- `connection()`: psycopg2 connection checked out of a ThreadedConnectionPool.
+  Used by the synchronous helpers (context enrichment, training registry).
+- `acquire()`: asyncpg connection checked out of an asyncpg pool. Used by the
+  async ingest / storage code.
+
+Sizes come from the environment (PG_POOL_MIN_SIZE / PG_POOL_MAX_SIZE) and
+both pools keep checkout, wait-time and in-use metrics, see `pool_metrics()`
+(reported by `PostgresLogger.flush_stats()` and the scoring daemon's stats).
+
+A forked child (e.g. a `ProcessPoolExecutor` worker) must not talk to Postgres
+over its parent's sockets: after `fork()` both pools are forgotten in the
+child, which opens its own on first use. The inherited connections are kept
+referenced, never closed, so the child cannot terminate the parent's sessions.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+PG_DSN = os.getenv("PG_DSN")
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+
+class PoolMetrics:
+    """Checkout counters for one pool. Updated under the pool's own lock."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, waited: float):
+        self.checkouts += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def record_release(self):
+        self.in_use -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "max_size"          : self.max_size,
+            "checkouts"         : self.checkouts,
+            "in_use"            : self.in_use,
+            "peak_in_use"       : self.peak_in_use,
+            "wait_seconds"      : self.wait_seconds,
+            "avg_wait_seconds"  : self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+            "max_wait_seconds"  : self.max_wait_seconds,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Sync flavour (psycopg2)
+# ---------------------------------------------------------------------------
+
+_sync_pool = None
+_sync_slots = None
+_sync_metrics = PoolMetrics(PG_POOL_MAX_SIZE)
+_sync_lock = threading.Lock()
+
+
+def _get_sync_pool():
+    """Returns (pool, slots): the semaphore belongs to that pool and is released with it."""
+    global _sync_pool, _sync_slots
+    with _sync_lock:
+        if _sync_pool is None:
+            from psycopg2.pool import ThreadedConnectionPool
+            _sync_slots = threading.BoundedSemaphore(PG_POOL_MAX_SIZE)
+            _sync_pool = ThreadedConnectionPool(PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE, PG_DSN)
+        return _sync_pool, _sync_slots
+
+
+@contextmanager
+def connection():
+    """
+    Checks a psycopg2 connection out of the shared pool.
+
+    Behaves like `with psycopg2.connect(PG_DSN) as conn:` — the transaction is
+    committed on success and rolled back on error — except that the
+    connection goes back to the pool instead of being left open. Blocks
+    while the pool is exhausted (ThreadedConnectionPool would raise instead).
+    """
+    pool, slots = _get_sync_pool()
+
+    start = time.perf_counter()
+    slots.acquire()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    with _sync_lock:
+        _sync_metrics.record_checkout(time.perf_counter() - start)
+
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        if pool.closed:
+            # close_sync_pool() ran meanwhile: this connection has no pool to go back to.
+            conn.close()
+        else:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        with _sync_lock:
+            _sync_metrics.record_release()
+        slots.release()
+
+
+def close_sync_pool():
+    """Closes the idle connections; connections still checked out are closed on release."""
+    global _sync_pool, _sync_slots
+    with _sync_lock:
+        if _sync_pool is not None:
+            _sync_pool.closeall()
+            _sync_pool = None
+            _sync_slots = None
+
+
+# ---------------------------------------------------------------------------
+# Async flavour (asyncpg)
+# ---------------------------------------------------------------------------
+
+_async_pool = None
+_async_loop = None
+_async_metrics = PoolMetrics(PG_POOL_MAX_SIZE)
+_async_lock = None
+_async_lock_loop = None
+
+
+def async_pool_open() -> bool:
+    """True if the shared asyncpg pool exists and belongs to the running event loop."""
+    return _async_pool is not None and _async_loop is asyncio.get_running_loop()
+
+
+async def get_async_pool(dsn: str = None, min_size: int = PG_POOL_MIN_SIZE,
+                         max_size: int = PG_POOL_MAX_SIZE):
+    """
+    Returns the shared asyncpg pool, creating it on first call (with `dsn`,
+    PG_DSN by default). asyncpg pools are bound to their event loop, so a
+    pool left over from a previous `asyncio.run()` is replaced.
+    """
+    global _async_pool, _async_loop, _async_lock, _async_lock_loop, _async_metrics
+    loop = asyncio.get_running_loop()
+    if _async_pool is None or _async_loop is not loop:
+        if _async_lock is None or _async_lock_loop is not loop:
+            _async_lock, _async_lock_loop = asyncio.Lock(), loop
+        async with _async_lock:
+            if _async_pool is None or _async_loop is not loop:
+                import asyncpg
+                _async_pool = await asyncpg.create_pool(dsn=dsn or PG_DSN, min_size=min_size, max_size=max_size)
+                _async_loop = loop
+                _async_metrics = PoolMetrics(max_size)
+    return _async_pool
+
+
+@asynccontextmanager
+async def acquire():
+    """Checks an asyncpg connection out of the shared pool."""
+    pool = await get_async_pool()
+
+    start = time.perf_counter()
+    async with pool.acquire() as conn:
+        _async_metrics.record_checkout(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            _async_metrics.record_release()
+
+
+async def close_async_pool():
+    global _async_pool, _async_loop
+    if _async_pool is not None:
+        pool, _async_pool, _async_loop = _async_pool, None, None
+        await pool.close()
+
+
+def pool_metrics() -> dict:
+    """Returns a snapshot of both pools' metrics."""
+    with _sync_lock:
+        sync = _sync_metrics.snapshot()
+    return {"sync": sync, "async": _async_metrics.snapshot()}
+
+
+# ---------------------------------------------------------------------------
+# Fork guard
+# ---------------------------------------------------------------------------
+
+_inherited = []     # Parent's pools, kept alive (never closed) in a forked child.
+
+
+def _forget_pools_after_fork():
+    global _sync_pool, _sync_slots, _sync_lock, _sync_metrics
+    global _async_pool, _async_loop, _async_lock, _async_lock_loop, _async_metrics
+    _inherited.extend(pool for pool in (_sync_pool, _async_pool) if pool is not None)
+    _sync_pool = _sync_slots = None
+    _sync_lock = threading.Lock()
+    _sync_metrics = PoolMetrics(PG_POOL_MAX_SIZE)
+    _async_pool = _async_loop = _async_lock = _async_lock_loop = None
+    _async_metrics = PoolMetrics(PG_POOL_MAX_SIZE)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pools_after_fork)
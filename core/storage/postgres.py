@@ -1,18 +1,77 @@
-import asyncpg
-from typing import Dict
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
 from datetime import datetime
 import json
 
+from core.parser.event import EventBatch
+from core.storage.pool import (
+    PG_POOL_MAX_SIZE, PG_POOL_MIN_SIZE, acquire, async_pool_open, close_async_pool, get_async_pool, pool_metrics,
+)
+
+logger = logging.getLogger(__name__)
+
+
 class PostgresLogger:
-    def __init__(self, dsn: str):
+    """
+    Writes parsed events into `log_events`.
+
+    By default every `insert_event` is one INSERT. With `buffered=True`
+    events are accumulated in a columnar EventBatch and written with binary
+    COPY (`copy_records_to_table`) whenever `batch_size` events are pending
+    or `flush_interval` seconds have passed, and on `flush()` / `close()`.
+    Use it as an async context manager so pending events are always flushed:
+
+        async with PostgresLogger(dsn, buffered=True) as logger:
+            await logger.insert_event(event)
+
+    Every flush is recorded in `flush_history` (rows, approximate bytes,
+    latency); `flush_stats()` aggregates them.
+
+    Connections come from the process-wide asyncpg pool of
+    `core.storage.pool` (`dsn` / sizes apply if this logger creates it, and
+    the logger that created it closes it).
+    """
+
+    def __init__(self, dsn: str, min_size: int = PG_POOL_MIN_SIZE, max_size: int = PG_POOL_MAX_SIZE,
+                 buffered: bool = False, batch_size: int = 5000, flush_interval: float = 1.0):
         self.dsn = dsn
         self.pool = None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.buffered = buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_history = deque(maxlen=1000)
+        self._buffer = EventBatch()
+        self._flush_lock = None
+        self._flusher = None
+        self._last_flush = time.monotonic()
+        self._owns_pool = False
 
     async def connect(self):
-        self.pool = await asyncpg.create_pool(dsn=self.dsn, min_size=1, max_size=2)
+        self._owns_pool = not async_pool_open()
+        self.pool = await get_async_pool(self.dsn, self.min_size, self.max_size)
+        self._flush_lock = asyncio.Lock()
+        if self.buffered and self.flush_interval:
+            self._flusher = asyncio.create_task(self._flush_periodically())
 
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def insert_event(self, event: Dict):
+        if self.buffered:
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                await self.flush()
+            return
+
         query = """
         INSERT INTO log_events (
             timestamp, ip, port, process, user_name,
@@ -24,7 +83,7 @@ class PostgresLogger:
             $10, $11
         )
         """
-        async with self.pool.acquire() as conn:
+        async with acquire() as conn:
             await conn.execute(query,
                 datetime.fromisoformat(event["timestamp"]) if isinstance(event["timestamp"], str) else event["timestamp"],
                 event.get("ip"),
@@ -39,5 +98,85 @@ class PostgresLogger:
                 json.dumps(event.get("parsed")) if event.get("parsed") else None
             )
 
+    async def insert_batch(self, batch: EventBatch):
+        """
+        Writes every event of a columnar EventBatch with one binary COPY.
+        In buffered mode the batch's columns are appended to the buffer.
+        """
+        if self.buffered:
+            self._buffer.extend(batch)
+            if len(self._buffer) >= self.batch_size:
+                await self.flush()
+            return
+        await self._copy(batch)
+
+    async def flush(self) -> Optional[Dict]:
+        """Writes all pending events. Returns the flush metrics, or None if idle."""
+        async with self._flush_lock:
+            if not len(self._buffer):
+                return None
+            batch, self._buffer = self._buffer, EventBatch()
+            try:
+                return await self._copy(batch)
+            except Exception:
+                # Keep the events (and anything queued meanwhile) for the next flush.
+                batch.extend(self._buffer)
+                self._buffer = batch
+                raise
+
+    async def _copy(self, batch: EventBatch) -> Dict:
+        start = time.perf_counter()
+        records = list(batch.records())
+        async with acquire() as conn:
+            await conn.copy_records_to_table(
+                "log_events",
+                records=records,
+                columns=list(EventBatch.LOG_EVENTS_COLUMNS),
+            )
+        self._last_flush = time.monotonic()
+
+        metrics = {
+            "rows"      : len(records),
+            # Text payload plus the fixed-width columns; close to the COPY size.
+            "bytes"     : sum(len(r[9]) + (len(r[10]) if r[10] else 0) + 48 for r in records),
+            "seconds"   : time.perf_counter() - start,
+            "at"        : datetime.utcnow(),
+        }
+        self.flush_history.append(metrics)
+        return metrics
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.warning("Periodic flush failed, will retry", exc_info=True)
+
+    def flush_stats(self) -> Dict:
+        rows = sum(m["rows"] for m in self.flush_history)
+        seconds = sum(m["seconds"] for m in self.flush_history)
+        return {
+            "flushes"       : len(self.flush_history),
+            "rows"          : rows,
+            "bytes"         : sum(m["bytes"] for m in self.flush_history),
+            "seconds"       : seconds,
+            "rows_per_sec"  : rows / seconds if seconds else 0.0,
+            "pending"       : len(self._buffer),
+            "pool"          : pool_metrics()["async"],
+        }
+
     async def close(self):
-        await self.pool.close()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.buffered:
+            await self.flush()
+        if self._owns_pool:
+            await close_async_pool()
+        self.pool = None
@@ -0,0 +1,191 @@
+"""
+Streaming training data source.
+
+`load_training_data(view)` replaces `pd.read_sql("SELECT * FROM <view>")` +
+`get_dummies` + `train_test_split` + `StandardScaler` in the training scripts:
+
+1. One aggregate query gets the row count, the categories and the labels,
+   so the vectorizer, the label encoder and the output arrays exist before
+   any row is read.
+2. Only the feature and label columns (not `ip` / `timestamp`) are streamed
+   through a server-side cursor, `chunk_rows` at a time. Each chunk is
+   vectorized and scattered into a single preallocated float32 matrix, with
+   the training rows first and the test rows after them, so X_train / X_test
+   are views and the split makes no copy.
+3. The scaler is fitted incrementally on the training rows of each chunk and
+   applied in place at the end.
+
+Both queries run in one REPEATABLE READ snapshot, so the count and the
+streamed rows agree. Peak memory is the float32 matrix plus one chunk.
+The split is the same as `train_test_split(X, y, test_size, random_state)`
+on the full DataFrame, in the same row order.
+
+`where` restricts the rows, or `source` replaces them with a query over
+the view (e.g. a UNION ALL). Either must select the same rows on every
+evaluation within the snapshot (no `random()`), and passing the adopted model's
+`vectorizer` / `label_encoder` reuses its features, categories and scaling
+instead of fitting new ones (incremental training). `watermark` is the
+newest `timestamp` loaded.
+"""
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from core.vectorizer.features import CATEGORICAL_COLUMNS, NON_FEATURE_COLUMNS, FeatureVectorizer
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+
+class TrainingData:
+    """Vectorized training set: rows [0, n_train) are the training split, the rest the test split."""
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, n_train: int, vectorizer: FeatureVectorizer,
+                 label_encoder, watermark=None, elapsed: float = 0.0):
+        self.X = X
+        self.y = y
+        self.n_train = n_train
+        self.vectorizer = vectorizer
+        self.label_encoder = label_encoder
+        self.watermark = watermark
+        self.elapsed = elapsed
+
+    @property
+    def X_train(self) -> np.ndarray:
+        return self.X[:self.n_train]
+
+    @property
+    def X_test(self) -> np.ndarray:
+        return self.X[self.n_train:]
+
+    @property
+    def y_train(self) -> np.ndarray:
+        return self.y[:self.n_train]
+
+    @property
+    def y_test(self) -> np.ndarray:
+        return self.y[self.n_train:]
+
+    @property
+    def feature_order(self):
+        return self.vectorizer.feature_order
+
+    def describe(self) -> str:
+        return (f"{len(self.X):,} rows ({self.n_train:,} train / {len(self.X) - self.n_train:,} test), "
+                f"{self.X.shape[1]} features, {self.X.nbytes / 2**20:.1f} MiB float32, "
+                f"loaded in {self.elapsed:.1f}s")
+
+
+def split_positions(n: int, test_size: float = 0.2, random_state: Optional[int] = 42):
+    """
+    Where each source row goes in the output matrix: the rows that
+    `train_test_split` puts in the training split come first, in the order
+    it returns them, then the test rows. Returns (positions, n_train).
+    """
+    if not test_size or n < 2:
+        return np.arange(n), n
+    from sklearn.model_selection import train_test_split
+
+    train_idx, test_idx = train_test_split(np.arange(n), test_size=test_size, random_state=random_state)
+    positions = np.empty(n, dtype=np.int64)
+    positions[train_idx] = np.arange(len(train_idx))
+    positions[test_idx] = len(train_idx) + np.arange(len(test_idx))
+    return positions, len(train_idx)
+
+
+def load_training_data(view_name: str, categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+                       exclude: Iterable[str] = NON_FEATURE_COLUMNS, label_column: str = "label_action",
+                       test_size: float = 0.2, random_state: Optional[int] = 42,
+                       chunk_rows: int = DEFAULT_CHUNK_ROWS, scale: bool = True,
+                       where=None, params: tuple = (), source=None,
+                       vectorizer: Optional[FeatureVectorizer] = None, label_encoder=None) -> TrainingData:
+    """
+    Streams `view_name` into a TrainingData (see the module docstring). With
+    `scale=False` the matrix is left unscaled, but the scaler is still fitted.
+    `where` is a psycopg2 `sql.Composable` condition with `params` placeholders;
+    `source` a `sql.Composable` SELECT over the view's columns, used instead
+    of the view (with `params`).
+    """
+    from psycopg2 import sql
+    from sklearn.preprocessing import LabelEncoder
+    from core.context.utils import is_valid_view_name
+    from core.storage.pool import connection
+
+    if not is_valid_view_name(view_name):
+        raise ValueError(f"Invalid view name: {view_name}")
+
+    start = time.perf_counter()
+    view = sql.Identifier(view_name)
+    if source is not None:
+        source = sql.SQL("({}) AS training_rows").format(source)
+    elif where is not None:
+        source = sql.SQL("{} WHERE {}").format(view, where)
+    else:
+        source = view
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cur.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(view))
+            columns = [d[0] for d in cur.description]
+
+            if vectorizer is None:
+                categorical = [name for name in categorical if name in columns]
+                skip = set(exclude) | set(categorical) | {label_column}
+                numeric = [name for name in columns if name not in skip]
+            else:
+                # Features the model knows and the view has; the rest stay 0.
+                categorical = [name for name in vectorizer.categories if name in columns]
+                numeric = [name for name in vectorizer.numeric if name in columns]
+
+            # Row count, newest timestamp, categories and labels in one scan
+            cur.execute(sql.SQL("SELECT count(*), {}, {} FROM {}").format(
+                sql.SQL("max({})").format(sql.Identifier("timestamp")) if "timestamp" in columns else sql.SQL("NULL"),
+                sql.SQL(", ").join(
+                    sql.SQL("array_agg(DISTINCT {})").format(sql.Identifier(name))
+                    for name in categorical + [label_column]
+                ),
+                source,
+            ), params)
+            count, watermark, *distinct = cur.fetchone()
+            distinct = [[v for v in values or () if v is not None] for values in distinct]
+
+        if vectorizer is None:
+            categories = {name: sorted(values) for name, values in zip(categorical, distinct[:-1])}
+            vectorizer = FeatureVectorizer(numeric, categories)
+            fit_scaler = True
+        else:
+            fit_scaler = False
+        if label_encoder is None:
+            label_encoder = LabelEncoder().fit(distinct[-1])
+        unknown = set(distinct[-1]) - set(label_encoder.classes_)
+        if unknown:
+            raise ValueError(f"Labels unknown to the model: {sorted(unknown)}; a full retrain is needed")
+        label_index = {label: i for i, label in enumerate(label_encoder.classes_)}
+
+        positions, n_train = split_positions(count, test_size, random_state)
+        X = np.empty((count, len(vectorizer)), dtype=np.float32)
+        y = np.empty(count, dtype=np.int64)
+        chunk_buffer = np.empty((min(chunk_rows, max(count, 1)), len(vectorizer)), dtype=np.float32)
+        names = numeric + categorical + [label_column]
+
+        with conn.cursor(name="afw_training_data") as cur:
+            cur.itersize = chunk_rows
+            cur.execute(sql.SQL("SELECT {} FROM {}").format(
+                sql.SQL(", ").join(sql.Identifier(name) for name in names), source,
+            ), params)
+            offset = 0
+            while rows := cur.fetchmany(chunk_rows):
+                chunk = dict(zip(names, zip(*rows)))
+                slots = positions[offset:offset + len(rows)]
+                out = vectorizer.transform(chunk, out=chunk_buffer[:len(rows)], scale=False)
+                if fit_scaler:
+                    vectorizer.partial_fit_scaler(out[slots < n_train])
+                X[slots] = out
+                y[slots] = [label_index[label] for label in chunk[label_column]]
+                offset += len(rows)
+
+    if offset != count:
+        raise RuntimeError(f"Expected {count} rows from {view_name}, streamed {offset}")
+    if scale:
+        vectorizer.apply_scaling(X)
+    return TrainingData(X, y, n_train, vectorizer, label_encoder, watermark, time.perf_counter() - start)
@@ -0,0 +1,191 @@
+"""
+Training loop shared by the FirewallNet training scripts.
+
+    from core.training.engine import train
+    result = train(model, X_train, y_train, X_test, y_test, epochs=100, class_weights=w)
+    result["state"], result["recall"], result["epochs"]
+
+- Each epoch the training set is shuffled once into a preallocated
+  contiguous buffer (`index_select(..., out=)`), so minibatches are plain
+  slices instead of a fancy-indexed gather per step.
+- Batch size, learning rate and torch intra-op threads are parameters
+  (defaults from TRAIN_BATCH_SIZE / TRAIN_THREADS / TRAIN_EVAL_EVERY).
+- Evaluation runs every `eval_every` epochs (and on the last one), in
+  inference mode and in chunks. The confusion matrix, accuracy and macro
+  recall are computed with torch ops, with the same label handling as
+  sklearn's `recall_score(average="macro")`.
+- Early stopping is on the average training loss. The best state is always
+  evaluated at the end, so its metrics are exact even when `eval_every > 1`.
+- Every epoch is logged (loss, seconds, samples/s, eval seconds and metrics
+  when evaluated); `register_training_run(epoch_log=...)` stores the log.
+"""
+import copy
+import os
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "64"))
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", "0"))          # 0: torch default
+TRAIN_EVAL_EVERY = int(os.getenv("TRAIN_EVAL_EVERY", "1"))
+
+EVAL_CHUNK_ROWS = 65_536
+
+
+def set_threads(threads: Optional[int]):
+    """Sets torch intra-op threads (None / 0 keeps torch's default)."""
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def confusion_matrix(y_true, y_pred, num_classes: int):
+    """(num_classes, num_classes) int64 tensor: rows are true labels, columns predictions."""
+    import torch
+
+    counts = torch.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes)
+    return counts.view(num_classes, num_classes)
+
+
+def metrics_from_confusion(confusion) -> Dict:
+    """Accuracy and macro recall over the labels present in y_true or y_pred (as sklearn)."""
+    import torch
+
+    confusion = confusion.double()
+    total = confusion.sum()
+    support = confusion.sum(dim=1)
+    present = (support > 0) | (confusion.sum(dim=0) > 0)
+    recall = torch.diagonal(confusion) / support.clamp(min=1)
+    return {
+        "accuracy"  : (torch.trace(confusion) / total).item() if total else 0.0,
+        "recall"    : recall[present].mean().item() if present.any() else 0.0,
+    }
+
+
+def evaluate(model, X, y, num_classes: int) -> Dict:
+    """Accuracy, macro recall and confusion matrix of `model` on X / y."""
+    import torch
+
+    confusion = torch.zeros((num_classes, num_classes), dtype=torch.int64)
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(X), EVAL_CHUNK_ROWS):
+            logits = model(X[start:start + EVAL_CHUNK_ROWS])
+            target = y[start:start + EVAL_CHUNK_ROWS]
+            confusion += confusion_matrix(target, logits.argmax(dim=1), num_classes)
+    result = metrics_from_confusion(confusion)
+    result["confusion"] = confusion.tolist()
+    return result
+
+
+def train(model, X_train, y_train, X_test, y_test, *, epochs: int = 100,
+          batch_size: int = TRAIN_BATCH_SIZE, lr: float = 1e-3, patience: int = 5,
+          eval_every: int = TRAIN_EVAL_EVERY, threads: Optional[int] = TRAIN_THREADS,
+          class_weights=None, num_classes: Optional[int] = None, seed: Optional[int] = None,
+          train_rows=None, verbose: bool = True) -> Dict:
+    """
+    Trains `model` (from its current weights) on numpy arrays or tensors.
+    `train_rows` (row indices) trains on a subset of X_train without copying
+    it, e.g. a cross-validation fold of a shared matrix.
+    Returns {"state", "loss", "accuracy", "recall", "confusion", "epochs",
+    "duration"}, where "state" is a copy of the best state_dict.
+    """
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+
+    set_threads(threads)
+    X_train, y_train = torch.as_tensor(X_train), torch.as_tensor(y_train, dtype=torch.long)
+    X_test, y_test = torch.as_tensor(X_test), torch.as_tensor(y_test, dtype=torch.long)
+    if num_classes is None:
+        num_classes = int(max(y_train.max().item() if len(y_train) else 0,
+                              y_test.max().item() if len(y_test) else 0)) + 1
+
+    weight = None if class_weights is None else torch.as_tensor(class_weights, dtype=torch.float32)
+    criterion = nn.CrossEntropyLoss(weight=weight)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    generator = torch.Generator()
+    if seed is not None:
+        generator.manual_seed(seed)
+
+    rows = None if train_rows is None else torch.as_tensor(train_rows, dtype=torch.long)
+    n = len(X_train) if rows is None else len(rows)
+    X_epoch = torch.empty((n,) + tuple(X_train.shape[1:]), dtype=X_train.dtype)
+    y_epoch = torch.empty(n, dtype=y_train.dtype)
+
+    history: List[Dict] = []
+    best_loss = float("inf")
+    best_state = copy.deepcopy(model.state_dict())
+    epochs_without_improvement = 0
+    start = time.perf_counter()
+
+    for epoch in range(epochs):
+        epoch_start = time.perf_counter()
+        model.train()
+        permutation = torch.randperm(n, generator=generator)
+        if rows is not None:
+            permutation = rows[permutation]
+        torch.index_select(X_train, 0, permutation, out=X_epoch)
+        torch.index_select(y_train, 0, permutation, out=y_epoch)
+
+        epoch_loss = 0.0
+        for i in range(0, n, batch_size):
+            batch_x = X_epoch[i:i + batch_size]
+            batch_y = y_epoch[i:i + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(model(batch_x), batch_y)
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item() * len(batch_x)
+
+        train_seconds = time.perf_counter() - epoch_start
+        entry = {
+            "epoch"             : epoch + 1,
+            "loss"              : epoch_loss / max(n, 1),
+            "seconds"           : round(train_seconds, 4),
+            "samples_per_sec"   : round(n / train_seconds, 1) if train_seconds else None,
+        }
+
+        last = epoch == epochs - 1
+        if (epoch + 1) % max(eval_every, 1) == 0 or last:
+            eval_start = time.perf_counter()
+            metrics = evaluate(model, X_test, y_test, num_classes)
+            entry["eval_seconds"] = round(time.perf_counter() - eval_start, 4)
+            entry["accuracy"] = metrics["accuracy"]
+            entry["recall"] = metrics["recall"]
+        history.append(entry)
+
+        if verbose:
+            line = f"Epoch {epoch + 1}/{epochs} - Loss: {entry['loss']:.4f} ({entry['samples_per_sec'] or 0:,.0f} samples/s)"
+            if "recall" in entry:
+                line += f"  Accuracy: {entry['accuracy']:.4f}  Recall: {entry['recall']:.4f}  [eval {entry['eval_seconds']:.2f}s]"
+            print(line)
+
+        if entry["loss"] < best_loss:
+            best_loss = entry["loss"]
+            best_state = copy.deepcopy(model.state_dict())
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+            if epochs_without_improvement >= patience:
+                if verbose:
+                    print(f"Early stopping at epoch {epoch + 1}")
+                break
+
+    # The model keeps the best state; its metrics, whichever epochs were evaluated
+    model.load_state_dict(best_state)
+    final = evaluate(model, X_test, y_test, num_classes)
+
+    return {
+        "state"     : best_state,
+        "loss"      : best_loss,
+        "accuracy"  : final["accuracy"],
+        "recall"    : final["recall"],
+        "confusion" : final["confusion"],
+        "epochs"    : history,
+        "duration"  : time.perf_counter() - start,
+    }
@@ -0,0 +1,156 @@
+"""
+Incremental (warm-start) retraining of the adopted FirewallNet.
+
+Instead of training from random weights on the whole view, `incremental_train`:
+
+1. loads the adopted checkpoint (`get_active_model_info`) and keeps its
+   vectorizer (features, categories, scaling) and label encoder,
+2. streams only the rows newer than the adopted run's `data_watermark`,
+   plus a bounded replay sample of older rows so the model does not forget
+   what it learned from them,
+3. fine-tunes from the adopted weights with a smaller learning rate,
+4. registers the run through `register_training_run` with the new watermark.
+
+The rows are one UNION ALL (`replay_source`): the new rows by a range
+condition on "timestamp" (an index scan when the view is indexed on it) and
+the replay sample by `TABLESAMPLE SYSTEM (p) REPEATABLE (seed)`, with `p`
+sized from the planner's row estimate. Only the sampled pages are read, so
+a retrain costs the new rows plus about `replay_rows`, whatever the size of
+the view, and the fixed seed makes the aggregate pass and the streaming
+pass of `load_training_data` see the same sample.
+
+The test split is drawn from that mix of new and replayed rows, so the
+recall of an incremental run is not comparable with the recall of a full
+run on the whole view; the run notes say so.
+"""
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from core.training.data import load_training_data
+from core.training.engine import TRAIN_BATCH_SIZE, TRAIN_EVAL_EVERY, TRAIN_THREADS, train
+
+load_dotenv()
+
+REPLAY_ROWS = int(os.getenv("TRAIN_REPLAY_ROWS", "200000"))
+FINE_TUNE_EPOCHS = 10
+FINE_TUNE_LR = 1e-4
+FINE_TUNE_PATIENCE = 3
+SCALER_FILE = "models/nn_firewall_scaler.joblib"
+
+def replay_source(view_name: str, watermark, replay_rows: int, seed: int):
+    """
+    SELECT of the rows of `view_name` newer than `watermark` UNION ALL about
+    `replay_rows` older rows. Returns (query, params, sampling description).
+
+    The sample is `TABLESAMPLE SYSTEM` with `REPEATABLE (seed)` on the
+    materialized view, at the percentage `replay_rows` is of
+    `pg_class.reltuples`. For a plain view, or one never analyzed, it falls
+    back to the `replay_rows` older rows with the smallest seeded hash of
+    (ip, timestamp): deterministic too, but that branch scans the older rows.
+    """
+    from psycopg2 import sql
+    from core.storage.pool import connection
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT relkind, reltuples FROM pg_class WHERE oid = quote_ident(%s)::regclass;",
+                        (view_name,))
+            relkind, estimated_rows = cur.fetchone()
+
+    view, ts, ip = sql.Identifier(view_name), sql.Identifier("timestamp"), sql.Identifier("ip")
+    new_rows = sql.SQL("SELECT * FROM {view} WHERE {ts} > %s").format(view=view, ts=ts)
+    if relkind in ("r", "m", "p") and estimated_rows > 0:
+        percent = min(100.0, 100.0 * replay_rows / estimated_rows)
+        replay = sql.SQL(
+            "SELECT * FROM {view} TABLESAMPLE SYSTEM (%s) REPEATABLE (%s) WHERE {ts} <= %s"
+        ).format(view=view, ts=ts)
+        params = (watermark, percent, seed, watermark)
+        described = f"TABLESAMPLE SYSTEM {percent:.4g}% of ~{estimated_rows:,.0f} rows"
+    else:
+        replay = sql.SQL(
+            "SELECT * FROM {view} WHERE {ts} <= %s ORDER BY hashtext({ip}::text || {ts}::text || %s) LIMIT %s"
+        ).format(view=view, ts=ts, ip=ip)
+        params = (watermark, watermark, str(seed), replay_rows)
+        described = f"hash sample of up to {replay_rows:,} rows"
+    query = sql.SQL("({}) UNION ALL ({})").format(new_rows, replay)
+    return query, params, described
+
+
+def incremental_train(view_name: Optional[str] = None, replay_rows: int = REPLAY_ROWS,
+                      epochs: int = FINE_TUNE_EPOCHS, lr: float = FINE_TUNE_LR,
+                      batch_size: int = TRAIN_BATCH_SIZE, threads: Optional[int] = TRAIN_THREADS,
+                      eval_every: int = TRAIN_EVAL_EVERY) -> bool:
+    """
+    Fine-tunes the adopted model on the rows added since its training run.
+    Returns True if the new model was adopted, False if it was not or there
+    were no new rows.
+    """
+    import torch
+    from joblib import load
+    from config.config import MODEL_PATH
+    from core.context.utils import (
+        adopt_strategy, get_active_model_info, get_active_strategy_view, get_training_watermark,
+        register_training_run, verify_model_integrity,
+    )
+    from core.vectorizer.features import FeatureVectorizer
+    from models.net import FirewallNet
+
+    info = get_active_model_info()
+    view_name = view_name or get_active_strategy_view()
+    watermark = get_training_watermark(info["training_run_id"])
+    if watermark is None:
+        raise ValueError("The adopted model has no data_watermark; run a full training first")
+
+    source_path = info["model_path"]
+    verify_model_integrity(source_path)
+    checkpoint = torch.load(source_path, map_location="cpu", weights_only=False)
+    scaler = None if checkpoint.get("vectorizer") else load(SCALER_FILE)
+    vectorizer = FeatureVectorizer.from_checkpoint(checkpoint, scaler)
+    label_encoder = checkpoint["label_encoder"]
+    print(f"Warm start from {source_path} (run {info['training_run_id']}, data up to {watermark})")
+
+    source, params, sampling = replay_source(view_name, watermark, replay_rows, seed=time.time_ns() % 2**31)
+    data = load_training_data(view_name, source=source, params=params,
+                              vectorizer=vectorizer, label_encoder=label_encoder)
+    if data.watermark is None or data.watermark <= watermark:
+        print(f"No new rows in {view_name} since {watermark}; nothing to train.")
+        return False
+    print(f"Loaded {data.describe()} (new rows + replay: {sampling})")
+
+    state_dict = checkpoint["model_state_dict"]
+    model = FirewallNet(input_size=len(vectorizer), output_size=state_dict["fc2.weight"].shape[0])
+    model.load_state_dict(state_dict)
+
+    training_start_time = time.time()
+    best = train(model, data.X_train, data.y_train, data.X_test, data.y_test,
+                 epochs=epochs, batch_size=batch_size, lr=lr, patience=FINE_TUNE_PATIENCE,
+                 eval_every=eval_every, threads=threads, num_classes=len(label_encoder.classes_))
+    training_duration = time.time() - training_start_time
+    print(f"Fine-tuning duration: {training_duration:.2f} seconds")
+
+    if not adopt_strategy(best["recall"]):
+        print("Fine-tuned model is not better than previous, will not be adopted.")
+        return False
+
+    torch.save({
+        'model_state_dict'  : best["state"],
+        'feature_order'     : vectorizer.feature_order,
+        'vectorizer'        : vectorizer.to_dict(),
+        'label_encoder'     : label_encoder,
+    }, MODEL_PATH)
+
+    return register_training_run(
+        accuracy            =   best["accuracy"],
+        recall              =   best["recall"],
+        loss                =   best["loss"],
+        notes               =   f"incremental warm-start from run {info['training_run_id']} ({len(data.X)} rows, "
+                                f"test split of new + replayed rows: recall not comparable with full runs)",
+        training_duration   =   training_duration,
+        model_hash          =   True,
+        compress            =   True,
+        data_watermark      =   data.watermark,
+        epoch_log           =   best["epochs"],
+    )
@@ -0,0 +1,263 @@
+"""
+Parallel model selection for FirewallNet.
+
+    from core.training.selection import candidate_grid, select_model
+    result = select_model(data, candidate_grid(lrs=(1e-3, 3e-4)), folds=3, workers=4)
+    result["best"]["params"], result["best"]["recall"], result["best"]["state"]
+
+- The TrainingData matrix is copied once into shared memory
+  (`SharedDataset`); every worker of the process pool maps the same block,
+  so a candidate costs no copy of the data (folds are row indices, see
+  `train(train_rows=...)`).
+- Candidates are a grid (`candidate_grid`) or a random sample of it
+  (`random_candidates`) over learning rate, class weighting and batch size.
+- Candidates are ranked on the training split only: without `folds`, each
+  trains on the first part of it and is scored on a held-out validation
+  part (`validation_size`); with `folds=k`, it is scored by the mean
+  validation recall over k folds. Either way the winner is then retrained
+  on the whole training split and only it is scored on the test split, so
+  the reported test metrics were not used to pick it.
+- Each worker gets `cpu_count // workers` torch threads, so the pool does
+  not oversubscribe the cores and wall time scales with the core count.
+
+Only the best candidate is returned with its weights; registering it is up
+to the caller (`scripts/ml/select_firewallnet.py`).
+"""
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.training.engine import TRAIN_BATCH_SIZE, train
+
+load_dotenv()
+
+SELECTION_WORKERS = int(os.getenv("SELECTION_WORKERS", "0"))    # 0: one per core
+SELECTION_EPOCHS = 30
+SELECTION_PATIENCE = 3
+SELECTION_VALIDATION_SIZE = 0.2
+
+CLASS_WEIGHTING = ("none", "balanced")
+
+
+class SharedDataset:
+    """X / y / n_train in one shared memory block, attachable by name from other processes."""
+
+    def __init__(self, shm, shape, n_train: int, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.n_train = n_train
+        self.owner = owner
+        rows, features = self.shape
+        self.X = np.ndarray((rows, features), dtype=np.float32, buffer=shm.buf)
+        self.y = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf, offset=self.X.nbytes)
+
+    @classmethod
+    def create(cls, X: np.ndarray, y: np.ndarray, n_train: int) -> "SharedDataset":
+        from multiprocessing import shared_memory
+
+        size = max(X.size * 4 + y.size * 8, 1)
+        dataset = cls(shared_memory.SharedMemory(create=True, size=size), X.shape, n_train, owner=True)
+        dataset.X[...] = X
+        dataset.y[...] = y
+        return dataset
+
+    @classmethod
+    def attach(cls, spec: Dict) -> "SharedDataset":
+        from multiprocessing import shared_memory
+
+        return cls(shared_memory.SharedMemory(name=spec["name"]), spec["shape"], spec["n_train"], owner=False)
+
+    def spec(self) -> Dict:
+        return {"name": self.shm.name, "shape": self.shape, "n_train": self.n_train}
+
+    def close(self):
+        self.X = self.y = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def candidate_grid(lrs: Sequence[float] = (1e-3, 3e-4, 1e-4),
+                   class_weighting: Sequence[str] = CLASS_WEIGHTING,
+                   batch_sizes: Sequence[int] = (TRAIN_BATCH_SIZE,)) -> List[Dict]:
+    """Every combination of the given hyperparameters."""
+    return [
+        {"lr": lr, "class_weighting": weighting, "batch_size": batch_size}
+        for lr, weighting, batch_size in itertools.product(lrs, class_weighting, batch_sizes)
+    ]
+
+
+def random_candidates(n: int, lr_range=(1e-4, 1e-2), class_weighting: Sequence[str] = CLASS_WEIGHTING,
+                      batch_sizes: Sequence[int] = (32, 64, 128, 256), seed: Optional[int] = None) -> List[Dict]:
+    """`n` candidates with a log-uniform learning rate and random weighting / batch size."""
+    rng = random.Random(seed)
+    low, high = np.log10(lr_range[0]), np.log10(lr_range[1])
+    return [
+        {"lr": float(10 ** rng.uniform(low, high)),
+         "class_weighting": rng.choice(list(class_weighting)),
+         "batch_size": rng.choice(list(batch_sizes))}
+        for _ in range(n)
+    ]
+
+
+def class_weights_for(weighting: str, y: np.ndarray, num_classes: int):
+    """None, or sklearn's "balanced" weights (classes absent from `y` get 1)."""
+    if weighting == "none":
+        return None
+    if weighting != "balanced":
+        raise ValueError(f"Unknown class weighting: {weighting}")
+    counts = np.bincount(y, minlength=num_classes).astype(np.float64)
+    present = counts > 0
+    weights = np.ones(num_classes)
+    weights[present] = len(y) / (present.sum() * counts[present])
+    return weights
+
+
+# ----------------------------------------------------------------------
+# Worker side
+# ----------------------------------------------------------------------
+
+_dataset: Optional[SharedDataset] = None
+
+
+def _init_worker(spec: Dict, threads: int):
+    global _dataset
+    import torch
+
+    torch.set_num_threads(threads)
+    _dataset = SharedDataset.attach(spec)
+
+
+def _run_candidate(task: Dict, dataset: Optional[SharedDataset] = None) -> Dict:
+    """
+    Trains one (candidate, fold) on the shared dataset; returns metrics and,
+    if asked, weights. `fold` is a validation fold of the training split
+    (with `folds=0`, fold 0 is the last `validation_size` of it), or None to
+    train on the whole training split and score on the test split.
+    """
+    from models.net import FirewallNet
+
+    dataset = dataset or _dataset
+    params = task["params"]
+    num_classes = task["num_classes"]
+    X_train, y_train = dataset.X[:dataset.n_train], dataset.y[:dataset.n_train]
+
+    if task["fold"] is None:
+        train_rows = None
+        X_eval, y_eval = dataset.X[dataset.n_train:], dataset.y[dataset.n_train:]
+    else:
+        # Training rows are already shuffled by the split: contiguous folds.
+        if task["folds"]:
+            bounds = np.linspace(0, dataset.n_train, task["folds"] + 1).astype(np.int64)
+            start, stop = bounds[task["fold"]], bounds[task["fold"] + 1]
+        else:
+            start, stop = dataset.n_train - int(dataset.n_train * task["validation_size"]), dataset.n_train
+        train_rows = np.concatenate([np.arange(start), np.arange(stop, dataset.n_train)])
+        X_eval, y_eval = X_train[start:stop], y_train[start:stop]
+
+    model = FirewallNet(input_size=dataset.shape[1], output_size=num_classes)
+    y_fit = y_train if train_rows is None else y_train[train_rows]
+    result = train(
+        model, X_train, y_train, X_eval, y_eval,
+        epochs          =   task["epochs"],
+        batch_size      =   params["batch_size"],
+        lr              =   params["lr"],
+        patience        =   task["patience"],
+        eval_every      =   task["epochs"],     # only the best state is evaluated
+        threads         =   None,
+        class_weights   =   class_weights_for(params["class_weighting"], y_fit, num_classes),
+        num_classes     =   num_classes,
+        seed            =   task["seed"],
+        train_rows      =   train_rows,
+        verbose         =   False,
+    )
+    if not task["keep_state"]:
+        result["state"] = None
+    else:
+        result["state"] = {name: tensor.numpy() for name, tensor in result["state"].items()}
+    result.update(params=params, fold=task["fold"])
+    return result
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+
+def select_model(data, candidates: Iterable[Dict], folds: int = 0, workers: int = SELECTION_WORKERS,
+                 epochs: int = SELECTION_EPOCHS, patience: int = SELECTION_PATIENCE,
+                 seed: int = 42, validation_size: float = SELECTION_VALIDATION_SIZE,
+                 verbose: bool = True) -> Dict:
+    """
+    Evaluates `candidates` on `data` (TrainingData) across a process pool.
+    Returns {"best", "candidates", "duration"}: "best" has "params",
+    "accuracy", "recall", "loss", "confusion", "epochs", "state" (test split
+    metrics of the refitted winner) and "cv_recall" with folds or
+    "validation_recall" without; "candidates" is the validation score of each.
+    """
+    import multiprocessing
+    import torch
+
+    candidates = list(candidates)
+    if not candidates:
+        raise ValueError("No candidates to evaluate")
+    if folds == 1 or folds < 0:
+        raise ValueError("folds must be 0 (validation split) or at least 2")
+    if not folds and not 0 < int(data.n_train * validation_size) < data.n_train:
+        raise ValueError(f"validation_size {validation_size} leaves no training or validation rows")
+    num_classes = len(data.label_encoder.classes_)
+    cores = os.cpu_count() or 1
+    fold_ids = list(range(folds)) if folds else [0]
+    tasks = [
+        {"params": params, "fold": fold, "folds": folds, "validation_size": validation_size,
+         "num_classes": num_classes, "epochs": epochs, "patience": patience, "seed": seed + i,
+         "keep_state": False}
+        for i, params in enumerate(candidates) for fold in fold_ids
+    ]
+    workers = min(workers or cores, len(tasks))
+    threads = max(1, cores // workers)
+
+    start = time.perf_counter()
+    if verbose:
+        print(f"Model selection: {len(candidates)} candidates x {len(fold_ids)} fold(s) "
+              f"on {workers} worker(s) x {threads} thread(s)")
+
+    with SharedDataset.create(data.X, data.y, data.n_train) as dataset:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(dataset.spec(), threads))
+        with pool:
+            results = list(pool.map(_run_candidate, tasks))
+
+        scores = []
+        for i, params in enumerate(candidates):
+            runs = results[i * len(fold_ids):(i + 1) * len(fold_ids)]
+            score = {"params": params, "recall": float(np.mean([r["recall"] for r in runs])),
+                     "accuracy": float(np.mean([r["accuracy"] for r in runs]))}
+            scores.append(score)
+            if verbose:
+                print(f"  {params}  recall: {score['recall']:.4f}  accuracy: {score['accuracy']:.4f}")
+
+        best_index = max(range(len(scores)), key=lambda i: scores[i]["recall"])
+        best_params = candidates[best_index]
+        # Refit the winner on the whole training split, scored on the test split
+        torch.set_num_threads(cores)
+        best = _run_candidate({**tasks[best_index * len(fold_ids)], "fold": None, "keep_state": True}, dataset)
+        best["cv_recall" if folds else "validation_recall"] = scores[best_index]["recall"]
+
+    best["state"] = {name: torch.from_numpy(array) for name, array in best["state"].items()}
+    duration = time.perf_counter() - start
+    if verbose:
+        print(f"Best: {best_params}  recall: {best['recall']:.4f}  accuracy: {best['accuracy']:.4f} "
+              f"({duration:.1f}s)")
+    return {"best": best, "candidates": scores, "duration": duration}
@@ -0,0 +1,362 @@
+"""
+Local columnar snapshot of an enrichment-strategy view.
+
+    from core.training.snapshot import load_snapshot_training_data
+    data = load_snapshot_training_data()        # same TrainingData as load_training_data
+
+A snapshot is a directory per (strategy id, view) under TRAIN_SNAPSHOT_DIR
+with one raw, memory-mappable file per column and a `meta.json`:
+
+- numeric feature columns as float32,
+- categorical columns and the label as int32 codes into lists kept in
+  `meta.json` (new values are appended, so existing codes never change),
+- `timestamp` as int64 microseconds since the epoch (`NULL_TIMESTAMP` for
+  NULL).
+
+Freshness comes from the view's refresh marker in `afw_view_refreshes`,
+bumped by `afw_refresh_view()` (db/functions.sql) on every REFRESH, so
+checking it reads one row and never scans the view:
+
+- If the marker's `version` is the one the snapshot was built from, no rows
+  are read.
+- If every refresh since then was declared append-only (`full_version` not
+  newer than the snapshot), only the rows after the snapshot's max
+  timestamp are streamed and appended.
+- Otherwise, when the view has no marker (refreshed without
+  `afw_refresh_view`), or with `rebuild=True`, the snapshot is rebuilt
+  into a new directory and swapped in.
+
+`meta.json` is written last and its `rows` bounds every file, so an
+interrupted refresh leaves the previous snapshot readable. Rows with a NULL
+timestamp are kept, but an append only picks up rows newer than the max
+timestamp, so NULL-timestamp rows added later only arrive with a rebuild.
+
+`ViewSnapshot.training_data` builds the split / scaled matrix from the
+memory-mapped columns exactly like `load_training_data` (same split, same
+feature order), so training, evaluation and model selection can use
+either source.
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from core.training.data import DEFAULT_CHUNK_ROWS, TrainingData, split_positions
+from core.vectorizer.features import CATEGORICAL_COLUMNS, NON_FEATURE_COLUMNS, FeatureVectorizer
+
+load_dotenv()
+
+TRAIN_SNAPSHOT = os.getenv("TRAIN_SNAPSHOT", "0") == "1"
+TRAIN_SNAPSHOT_DIR = os.getenv("TRAIN_SNAPSHOT_DIR", "data/snapshots")
+
+SNAPSHOT_VERSION = 2
+NULL_TIMESTAMP = np.iinfo(np.int64).min
+_DTYPES = {"numeric": np.float32, "categorical": np.int32}
+_LABEL_FILE, _TIMESTAMP_FILE = "label.i32", "timestamp.i64"
+
+
+def _epoch_us(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_epoch_us(value: Optional[int]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value // 1_000_000, tz=timezone.utc).replace(microsecond=value % 1_000_000)
+
+
+class ViewSnapshot:
+    """A snapshot directory: `meta.json` plus one raw file per column."""
+
+    def __init__(self, path: str, meta: Dict):
+        self.path = path
+        self.meta = meta
+
+    @classmethod
+    def open(cls, path: str) -> Optional["ViewSnapshot"]:
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return None
+        return cls(path, meta)
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        return _from_epoch_us(self.meta["max_timestamp_us"])
+
+    def _map(self, file: str, dtype) -> np.ndarray:
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, file), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped column: float32 values, or int32 codes into `meta["categories"][name]`."""
+        spec = self.meta["columns"][name]
+        return self._map(spec["file"], _DTYPES[spec["kind"]])
+
+    def labels(self) -> np.ndarray:
+        """int32 codes into `meta["labels"]` (-1: NULL)."""
+        return self._map(_LABEL_FILE, np.int32)
+
+    def timestamps(self) -> np.ndarray:
+        """int64 microseconds since the epoch (`NULL_TIMESTAMP`: NULL)."""
+        return self._map(_TIMESTAMP_FILE, np.int64)
+
+    def training_data(self, rows=None, test_size: float = 0.2, random_state: Optional[int] = 42,
+                      scale: bool = True, vectorizer: Optional[FeatureVectorizer] = None,
+                      label_encoder=None) -> TrainingData:
+        """
+        TrainingData from the snapshot (all rows, or the `rows` indices /
+        boolean mask), split and scaled like `load_training_data`.
+        """
+        from sklearn.preprocessing import LabelEncoder
+
+        start = time.perf_counter()
+        if rows is None:
+            index = np.arange(self.rows)
+        else:
+            rows = np.asarray(rows)
+            index = np.flatnonzero(rows) if rows.dtype == bool else rows
+
+        label_codes = self.labels()[index]
+        if (label_codes < 0).any():
+            raise ValueError("Rows without label in the snapshot")
+        present = np.zeros(len(self.meta["labels"]), dtype=bool)
+        present[label_codes] = True
+        present_labels = [label for label, seen in zip(self.meta["labels"], present) if seen]
+
+        categories = self.meta["categories"]
+        if vectorizer is None:
+            numeric = [name for name, spec in self.meta["columns"].items() if spec["kind"] == "numeric"]
+            # Categories of the selected rows, sorted, as the aggregate of load_training_data
+            present_categories = {}
+            for name, values in categories.items():
+                codes = self.column(name)[index]
+                seen = np.bincount(codes[codes >= 0], minlength=len(values)) > 0
+                present_categories[name] = sorted(value for value, s in zip(values, seen) if s)
+            vectorizer = FeatureVectorizer(numeric, present_categories)
+            fit_scaler = True
+        else:
+            fit_scaler = False
+        if label_encoder is None:
+            label_encoder = LabelEncoder().fit(present_labels)
+        unknown = set(present_labels) - set(label_encoder.classes_)
+        if unknown:
+            raise ValueError(f"Labels unknown to the model: {sorted(unknown)}; a full retrain is needed")
+
+        positions, n_train = split_positions(len(index), test_size, random_state)
+        order = np.empty(len(index), dtype=np.int64)
+        order[positions] = index           # snapshot row for each output row
+        X = np.zeros((len(index), len(vectorizer)), dtype=np.float32)
+        feature_index = {name: j for j, name in enumerate(vectorizer.feature_order)}
+        for name in vectorizer.numeric:
+            if name in self.meta["columns"]:
+                X[:, feature_index[name]] = self.column(name)[order]
+        for name, values in vectorizer.categories.items():
+            if name not in categories:
+                continue
+            codes = self.column(name)[order]
+            code_of = {value: code for code, value in enumerate(categories[name])}
+            for value in values:
+                if value in code_of:
+                    X[:, feature_index[f"{name}_{value}"]] = codes == code_of[value]
+
+        label_index = np.full(len(self.meta["labels"]), -1, dtype=np.int64)
+        for code, label in enumerate(self.meta["labels"]):
+            if label in label_encoder.classes_:
+                label_index[code] = int(np.searchsorted(label_encoder.classes_, label))
+        y = label_index[self.labels()[order]]
+
+        if fit_scaler:
+            vectorizer.fit_scaler(X[:n_train])
+        if scale:
+            vectorizer.apply_scaling(X)
+        timestamps = self.timestamps()[index]
+        newest = int(timestamps.max()) if len(timestamps) else NULL_TIMESTAMP
+        watermark = _from_epoch_us(newest) if newest != NULL_TIMESTAMP else None
+        return TrainingData(X, y, n_train, vectorizer, label_encoder, watermark, time.perf_counter() - start)
+
+
+def snapshot_path(strategy_id, view_name: str, root: str = TRAIN_SNAPSHOT_DIR) -> str:
+    return os.path.join(root, f"strategy_{strategy_id}", view_name)
+
+
+def _write_meta(path: str, meta: Dict):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def _append_rows(conn, path: str, meta: Dict, source, params: tuple, chunk_rows: int) -> int:
+    """
+    Streams `source` rows and appends them to the column files; returns the
+    rows appended and raises `meta["max_timestamp_us"]` to their newest timestamp.
+    """
+    from psycopg2 import sql
+
+    columns = meta["columns"]
+    names = list(columns) + [meta["label_column"]]
+    code_maps = {name: {value: code for code, value in enumerate(values)}
+                 for name, values in list(meta["categories"].items()) + [(meta["label_column"], meta["labels"])]}
+    value_lists = dict(meta["categories"], **{meta["label_column"]: meta["labels"]})
+
+    files = {}
+    for name, spec in columns.items():
+        files[name] = (spec["file"], _DTYPES[spec["kind"]])
+    files[meta["label_column"]] = (_LABEL_FILE, np.int32)
+    handles = {}
+    try:
+        for name, (file, dtype) in list(files.items()) + [("timestamp", (_TIMESTAMP_FILE, np.int64))]:
+            handle = open(os.path.join(path, file), "ab+")
+            # Drop bytes past meta["rows"] left by an interrupted refresh.
+            handle.truncate(meta["rows"] * np.dtype(dtype).itemsize)
+            handle.seek(0, os.SEEK_END)
+            handles[name] = handle
+
+        appended = 0
+        with conn.cursor(name="afw_training_snapshot") as cur:
+            cur.itersize = chunk_rows
+            cur.execute(sql.SQL("SELECT {}, (extract(epoch FROM {ts}) * 1000000)::int8 FROM {}").format(
+                sql.SQL(", ").join(sql.Identifier(name) for name in names), source,
+                ts=sql.Identifier("timestamp"),
+            ), params)
+            while rows := cur.fetchmany(chunk_rows):
+                chunk = list(zip(*rows))
+                for name, values in zip(names + ["timestamp"], chunk):
+                    if name == "timestamp":
+                        values = [NULL_TIMESTAMP if value is None else value for value in values]
+                        newest = max(values)
+                        if newest != NULL_TIMESTAMP and (meta["max_timestamp_us"] is None
+                                                         or newest > meta["max_timestamp_us"]):
+                            meta["max_timestamp_us"] = newest
+                    if name in code_maps:
+                        codes, known = code_maps[name], value_lists[name]
+                        for value in set(values) - codes.keys() - {None}:
+                            codes[value] = len(known)
+                            known.append(value)
+                        values = [-1 if value is None else codes[value] for value in values]
+                        dtype = np.int32
+                    else:
+                        dtype = files[name][1] if name in files else np.int64
+                    np.asarray(values, dtype=dtype).tofile(handles[name])
+                appended += len(rows)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return appended
+
+
+def refresh_snapshot(view_name: str, strategy_id, root: str = TRAIN_SNAPSHOT_DIR,
+                     categorical: Iterable[str] = CATEGORICAL_COLUMNS, exclude: Iterable[str] = NON_FEATURE_COLUMNS,
+                     label_column: str = "label_action", chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                     rebuild: bool = False, verbose: bool = True) -> ViewSnapshot:
+    """Brings the snapshot of `view_name` up to date (see the module docstring) and returns it."""
+    from psycopg2 import sql
+    from core.context.utils import is_valid_view_name
+    from core.storage.pool import connection
+
+    if not is_valid_view_name(view_name):
+        raise ValueError(f"Invalid view name: {view_name}")
+
+    path = snapshot_path(strategy_id, view_name, root)
+    current = None if rebuild else ViewSnapshot.open(path)
+    view, ts = sql.Identifier(view_name), sql.Identifier("timestamp")
+    spec = {"categorical": list(categorical), "exclude": sorted(exclude), "label_column": label_column}
+    if current is not None and any(current.meta[key] != value for key, value in spec.items()):
+        current = None
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cur.execute("SELECT version, full_version FROM afw_view_refreshes "
+                        "WHERE view_name = quote_ident(%s)::regclass::text;", (view_name,))
+            marker = cur.fetchone()
+            version, full_version = marker if marker else (None, None)
+
+            if current is not None and version is not None and current.meta["refresh_version"] is not None:
+                if version == current.meta["refresh_version"]:
+                    if verbose:
+                        print(f"Snapshot of {view_name} is fresh ({current.rows:,} rows), no rows read")
+                    return current
+                if full_version <= current.meta["refresh_version"]:
+                    # Only append-only refreshes since the snapshot was built
+                    meta = current.meta
+                    if meta["max_timestamp_us"] is None:
+                        source, params = sql.SQL("{} WHERE {} IS NOT NULL").format(view, ts), ()
+                    else:
+                        source, params = sql.SQL("{} WHERE {} > %s").format(view, ts), (current.watermark,)
+                    appended = _append_rows(conn, path, meta, source, params, chunk_rows)
+                    meta.update(rows=meta["rows"] + appended, refresh_version=version, refreshed_at=time.time())
+                    _write_meta(path, meta)
+                    if verbose:
+                        print(f"Snapshot of {view_name}: appended {appended:,} new rows ({meta['rows']:,} total)")
+                    return ViewSnapshot(path, meta)
+            if version is None and verbose:
+                print(f"⚠️ {view_name} has no refresh marker (refresh it with afw_refresh_view); rebuilding")
+
+            # Full build into a new directory, swapped in at the end
+            cur.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(view))
+            names = [d[0] for d in cur.description]
+            categorical = [name for name in categorical if name in names]
+            skip = set(exclude) | set(categorical) | {label_column, "timestamp"}
+            columns = {name: {"kind": "numeric", "file": f"n{i}.f32"}
+                       for i, name in enumerate(n for n in names if n not in skip)}
+            columns.update({name: {"kind": "categorical", "file": f"c{i}.i32"}
+                            for i, name in enumerate(categorical)})
+            meta = dict(spec, version=SNAPSHOT_VERSION, strategy_id=strategy_id, view=view_name, rows=0,
+                        refresh_version=version, max_timestamp_us=None, columns=columns, labels=[],
+                        categories={name: [] for name in categorical})
+
+        building = path + ".building"
+        shutil.rmtree(building, ignore_errors=True)
+        os.makedirs(building)
+        appended = _append_rows(conn, building, meta, view, (), chunk_rows)
+
+    meta.update(rows=appended, refreshed_at=time.time())
+    _write_meta(building, meta)
+    previous = path + ".previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, previous)
+    os.replace(building, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    if verbose:
+        print(f"Snapshot of {view_name} rebuilt: {appended:,} rows in {path}")
+    return ViewSnapshot(path, meta)
+
+
+def load_snapshot_training_data(view_name: Optional[str] = None, strategy_id=None,
+                                root: str = TRAIN_SNAPSHOT_DIR,
+                                categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+                                exclude: Iterable[str] = NON_FEATURE_COLUMNS, label_column: str = "label_action",
+                                test_size: float = 0.2, random_state: Optional[int] = 42, scale: bool = True,
+                                rebuild: bool = False) -> TrainingData:
+    """
+    `load_training_data` through the snapshot cache: refreshes the snapshot
+    of the view (the active strategy's by default) and builds the
+    TrainingData from it.
+    """
+    from core.context.utils import get_active_strategy_id, get_active_strategy_view
+
+    view_name = view_name or get_active_strategy_view()
+    strategy_id = get_active_strategy_id() if strategy_id is None else strategy_id
+    snapshot = refresh_snapshot(view_name, strategy_id, root, categorical, exclude, label_column, rebuild=rebuild)
+    return snapshot.training_data(test_size=test_size, random_state=random_state, scale=scale)
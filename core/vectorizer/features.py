@@ -0,0 +1,302 @@
+# core/vectorizer/features.py
+"""
+FeatureVectorizer: the single place that turns events / feature rows into the
+model's float32 matrix.
+
+It owns the feature order, the one-hot categories (same column names and
+order as `pd.get_dummies`) and the standardisation statistics, and it is
+used the same way by the training scripts and by every classifier:
+
+    vectorizer = FeatureVectorizer.fit(df)              # training
+    X = vectorizer.transform(df)                        # DataFrame / dict of columns
+    X = vectorizer.transform(rows)                      # list of feature dicts
+    X = vectorizer.transform(batch)                     # EventBatch
+
+Rows may carry the raw categorical value (`"action": "invalid_user"`) or the
+one-hot columns themselves (`"action_invalid_user": 1`). Missing features are
+0, like `DataFrame.reindex(fill_value=0)`, except in an EventBatch, which must
+carry every feature it cannot derive from the log lines (`set_feature()`).
+
+`mean_`, `scale_` and `transform(ndarray)` follow StandardScaler, and the
+scaling is computed in float64 like StandardScaler's; `to_scaler()` exports
+the statistics as a fitted StandardScaler for the scaler file.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+CATEGORICAL_COLUMNS = ("action", "parse_status")
+NON_FEATURE_COLUMNS = ("label_action", "label", "ip", "timestamp")
+
+
+class FeatureVectorizer:
+
+    def __init__(self, numeric: Sequence[str], categories: Optional[Dict[str, Sequence]] = None,
+                 feature_order: Optional[Sequence[str]] = None,
+                 mean=None, scale=None):
+        self.numeric = list(numeric)
+        self.categories = {name: list(values) for name, values in (categories or {}).items()}
+        if feature_order is None:
+            # pd.get_dummies order: plain columns first, then the dummies.
+            feature_order = self.numeric + [
+                f"{name}_{value}" for name, values in self.categories.items() for value in values
+            ]
+        self.feature_order = list(feature_order)
+        self.mean_ = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale_ = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self._seen = None       # partial_fit_scaler state: rows seen, mean and M2 per feature
+        self._compile()
+
+    def _compile(self):
+        index = {name: j for j, name in enumerate(self.feature_order)}
+        missing = [name for name in self.numeric if name not in index]
+        if missing:
+            raise ValueError(f"Numeric features not in feature_order: {missing}")
+
+        numeric_idx = [index[name] for name in self.numeric]
+        start = numeric_idx[0] if numeric_idx else 0
+        if numeric_idx == list(range(start, start + len(numeric_idx))):
+            # Contiguous numeric block (the usual case): one slice assignment per row.
+            self._numeric_idx = slice(start, start + len(numeric_idx))
+        else:
+            self._numeric_idx = np.asarray(numeric_idx)
+        self._numeric_names = tuple(self.numeric)
+
+        self._categorical = tuple(
+            (name,
+             {value: index[f"{name}_{value}"] for value in values},
+             tuple((index[f"{name}_{value}"], f"{name}_{value}") for value in values))
+            for name, values in self.categories.items()
+        )
+
+    def __len__(self):
+        return len(self.feature_order)
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def fit(cls, data, categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+            exclude: Iterable[str] = NON_FEATURE_COLUMNS, scale: bool = False) -> "FeatureVectorizer":
+        """
+        Learns numeric columns (every column not categorical or excluded, in
+        order) and the sorted categories of `data` (DataFrame or dict of
+        columns). With `scale=True` also fits the scaling on all of `data`;
+        use `fit_scaler()` to fit it on a training split only.
+        """
+        categorical = [name for name in categorical if name in data]
+        exclude = set(exclude) | set(categorical)
+        columns = list(data.columns) if hasattr(data, "columns") else list(data)
+        numeric = [name for name in columns if name not in exclude]
+        categories = {}
+        for name in categorical:
+            values = {v for v in np.asarray(data[name], dtype=object) if v is not None and v == v}
+            categories[name] = sorted(values)
+        vectorizer = cls(numeric, categories)
+        if scale:
+            vectorizer.fit_scaler(vectorizer.transform(data, scale=False))
+        return vectorizer
+
+    @classmethod
+    def from_feature_order(cls, feature_order: Sequence[str], categorical: Iterable[str] = CATEGORICAL_COLUMNS,
+                           scaler=None) -> "FeatureVectorizer":
+        """
+        Rebuilds a vectorizer from a model's saved `feature_order` (and its
+        fitted StandardScaler, if any): `<categorical>_<value>` names become
+        one-hot slots, everything else is numeric.
+        """
+        categorical = list(categorical)
+        numeric = []
+        categories = {}
+        for name in feature_order:
+            for prefix in categorical:
+                if name.startswith(prefix + "_"):
+                    categories.setdefault(prefix, []).append(name[len(prefix) + 1:])
+                    break
+            else:
+                numeric.append(name)
+        return cls(numeric, categories, feature_order,
+                   getattr(scaler, "mean_", None), getattr(scaler, "scale_", None))
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Dict, scaler=None) -> "FeatureVectorizer":
+        """Vectorizer saved with the checkpoint, or rebuilt from `feature_order` + scaler."""
+        if checkpoint.get("vectorizer"):
+            return cls.from_dict(checkpoint["vectorizer"])
+        if isinstance(scaler, cls):
+            # Scaler files briefly held a pickled vectorizer instead of a StandardScaler.
+            return scaler
+        return cls.from_feature_order(checkpoint["feature_order"], scaler=scaler)
+
+    def fit_scaler(self, X: np.ndarray) -> "FeatureVectorizer":
+        """Fits mean/std (population std, zero std -> 1, as StandardScaler) on vectorized rows."""
+        self._seen = None
+        return self.partial_fit_scaler(X)
+
+    def partial_fit_scaler(self, X: np.ndarray) -> "FeatureVectorizer":
+        """
+        Updates mean/std with one more chunk of vectorized rows, so the
+        scaling can be fitted while streaming. NaNs are ignored per feature,
+        like StandardScaler.partial_fit.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        count = (~np.isnan(X)).sum(axis=0)
+        mean = np.nansum(X, axis=0) / np.maximum(count, 1)
+        m2 = np.nansum((X - mean) ** 2, axis=0)
+
+        if self._seen is None:
+            seen, seen_mean, seen_m2 = count, mean, m2
+        else:
+            # Chan et al. pairwise update of the running mean / sum of squares.
+            seen, seen_mean, seen_m2 = self._seen
+            total = seen + count
+            weight = count / np.maximum(total, 1)
+            delta = mean - seen_mean
+            seen_mean = seen_mean + delta * weight
+            seen_m2 = seen_m2 + m2 + delta ** 2 * seen * weight
+            seen = total
+        self._seen = (seen, seen_mean, seen_m2)
+
+        self.mean_ = seen_mean
+        scale = np.sqrt(seen_m2 / np.maximum(seen, 1))
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        self.scale_ = scale
+        self._compile()
+        return self
+
+    def to_scaler(self):
+        """The fitted scaling as a sklearn StandardScaler (for `nn_firewall_scaler.joblib`)."""
+        from sklearn.preprocessing import StandardScaler
+
+        if self.mean_ is None or self.scale_ is None:
+            raise ValueError("The vectorizer has no fitted scaling")
+        scaler = StandardScaler()
+        scaler.mean_ = self.mean_.copy()
+        scaler.scale_ = self.scale_.copy()
+        if self._seen is not None:
+            seen, _, m2 = self._seen
+            scaler.var_ = m2 / np.maximum(seen, 1)
+            scaler.n_samples_seen_ = seen
+        else:
+            scaler.var_ = self.scale_ ** 2
+            scaler.n_samples_seen_ = 0
+        scaler.n_features_in_ = len(self.feature_order)
+        return scaler
+
+    def to_dict(self) -> Dict:
+        return {
+            "numeric"       : self.numeric,
+            "categories"    : self.categories,
+            "feature_order" : self.feature_order,
+            "mean"          : None if self.mean_ is None else self.mean_.tolist(),
+            "scale"         : None if self.scale_ is None else self.scale_.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "FeatureVectorizer":
+        return cls(state["numeric"], state["categories"], state["feature_order"],
+                   state.get("mean"), state.get("scale"))
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state["numeric"], state["categories"], state["feature_order"],
+                      state.get("mean"), state.get("scale"))
+
+    # ------------------------------------------------------------------
+    # Vectorization
+    # ------------------------------------------------------------------
+
+    def transform(self, data, out: Optional[np.ndarray] = None, scale: bool = True) -> np.ndarray:
+        """
+        Writes `data` into an (n, features) float32 array (`out` if given,
+        e.g. a reusable buffer) and standardises it when fitted and `scale`.
+        `data` is an EventBatch, a DataFrame / dict of columns, a sequence of
+        feature dicts, or an already vectorized ndarray (scaled only).
+        """
+        if isinstance(data, np.ndarray):
+            if scale and self._fitted:
+                # Scale from the caller's values, not from a float32 copy.
+                scaled = self._scaled(np.array(data, dtype=np.float64))
+                if out is None:
+                    return scaled.astype(np.float32)
+                np.copyto(out, scaled, casting="same_kind")
+                return out
+            if out is None:
+                out = np.array(data, dtype=np.float32)
+            else:
+                np.copyto(out, data)
+        else:
+            n = len(data[next(iter(data))]) if isinstance(data, dict) else len(data)
+            if out is None:
+                out = np.empty((n, len(self.feature_order)), dtype=np.float32)
+            if hasattr(data, "to_matrix"):
+                data.to_matrix(self.feature_order, out)
+            elif hasattr(data, "columns") or isinstance(data, dict):
+                self._transform_columns(data, out)
+            else:
+                self._transform_rows(data, out)
+        if scale:
+            self.apply_scaling(out)
+        return out
+
+    @property
+    def _fitted(self) -> bool:
+        return self.mean_ is not None or self.scale_ is not None
+
+    def _scaled(self, X: np.ndarray) -> np.ndarray:
+        """(X - mean) / scale on a float64 array, in place."""
+        if self.mean_ is not None:
+            X -= self.mean_
+        if self.scale_ is not None:
+            X /= self.scale_
+        return X
+
+    def apply_scaling(self, X: np.ndarray) -> np.ndarray:
+        """
+        Standardises vectorized rows in place (no-op when not fitted). The
+        arithmetic is done in float64 and only the result is stored in X.
+        """
+        if self._fitted:
+            X[...] = self._scaled(X.astype(np.float64))
+        return X
+
+    def _transform_columns(self, data, out: np.ndarray):
+        out.fill(0)
+        for j, name in enumerate(self.feature_order):
+            if name in data:
+                out[:, j] = np.asarray(data[name], dtype=np.float32)
+        for name, slots, onehots in self._categorical:
+            if name not in data:
+                continue    # One-hot columns, if present, were copied above.
+            column = np.asarray(data[name], dtype=object)
+            for value, j in slots.items():
+                out[:, j] = column == value
+
+    def _transform_rows(self, rows: Sequence[Dict], out: np.ndarray):
+        numeric_idx = self._numeric_idx
+        names = self._numeric_names
+        categorical = self._categorical
+        out.fill(0)
+        for i, row in enumerate(rows):
+            values = out[i]
+            get = row.get
+            values[numeric_idx] = [get(name) or 0 for name in names]
+            for name, slots, onehots in categorical:
+                value = get(name)
+                if value is not None:
+                    j = slots.get(value)
+                    if j is not None:
+                        values[j] = 1
+                else:
+                    for j, onehot in onehots:
+                        flag = get(onehot)
+                        if flag:
+                            values[j] = flag
+
+    def column_names(self) -> List[str]:
+        return list(self.feature_order)
@@ -1 +1,178 @@
 -- Functions definitions
+
+-- ---------------------------------------------------------------------
+-- Per-IP hourly rollups (tables in db/schema.sql)
+-- ---------------------------------------------------------------------
+
+-- Population: `events` / `invalid_user` count every row of log_events
+-- (trigger below), while the "view" enrichment source aggregates the rows of
+-- event_features_for_nn, which only holds the events that made it into the
+-- feature view. So count / ratio features read from the rollups can be
+-- higher than the same features read from the view (and than what a model
+-- trained on the view saw). `blocks` / `score_*` come from the feature view
+-- on rebuild and from recorded predictions afterwards.
+
+-- Adds pre-aggregated (ip, hour) deltas to both rollup tables. Rows are
+-- upserted in (ip, hour) order so concurrent writers lock them consistently.
+CREATE OR REPLACE FUNCTION afw_rollup_apply(
+    ips inet[], hours timestamptz[], events bigint[], invalid_user bigint[],
+    blocks bigint[], score_sum double precision[], score_n bigint[]
+) RETURNS void LANGUAGE sql AS $$
+    INSERT INTO ip_hourly_rollup AS r (ip, hour, events, invalid_user, blocks, score_sum, score_n)
+    SELECT * FROM unnest(ips, hours, events, invalid_user, blocks, score_sum, score_n)
+    ORDER BY 1, 2
+    ON CONFLICT (ip, hour) DO UPDATE SET
+        events       = r.events       + EXCLUDED.events,
+        invalid_user = r.invalid_user + EXCLUDED.invalid_user,
+        blocks       = r.blocks       + EXCLUDED.blocks,
+        score_sum    = r.score_sum    + EXCLUDED.score_sum,
+        score_n      = r.score_n      + EXCLUDED.score_n;
+
+    INSERT INTO ip_rollup_totals AS t (ip, events, invalid_user, blocks, score_sum, score_n)
+    SELECT d.ip, sum(d.events), sum(d.invalid_user), sum(d.blocks), sum(d.score_sum), sum(d.score_n)
+    FROM unnest(ips, hours, events, invalid_user, blocks, score_sum, score_n)
+         AS d(ip, hour, events, invalid_user, blocks, score_sum, score_n)
+    GROUP BY d.ip
+    ORDER BY d.ip
+    ON CONFLICT (ip) DO UPDATE SET
+        events       = t.events       + EXCLUDED.events,
+        invalid_user = t.invalid_user + EXCLUDED.invalid_user,
+        blocks       = t.blocks       + EXCLUDED.blocks,
+        score_sum    = t.score_sum    + EXCLUDED.score_sum,
+        score_n      = t.score_n      + EXCLUDED.score_n;
+$$;
+
+-- `ip` as inet, or NULL when it is not a valid address (so a malformed
+-- $remote_addr never makes the insert into log_events fail).
+CREATE OR REPLACE FUNCTION afw_try_inet(value text) RETURNS inet LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    RETURN value::inet;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$;
+
+-- Statement-level trigger: one aggregate + upsert per INSERT / COPY
+-- statement, however many rows it wrote (the buffered PostgresLogger
+-- writes a whole flush with one COPY).
+CREATE OR REPLACE FUNCTION afw_rollup_log_events() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM afw_rollup_apply(
+        array_agg(ip), array_agg(hour), array_agg(events), array_agg(invalid_user),
+        array_agg(0::bigint), array_agg(0::double precision), array_agg(0::bigint))
+    FROM (
+        -- Cast once per distinct address, not per row
+        SELECT afw_try_inet(ip::text) AS ip, hour, sum(events)::bigint AS events,
+               sum(invalid_user)::bigint AS invalid_user
+        FROM (
+            SELECT ip, date_trunc('hour', timestamp) AS hour,
+                   count(*) AS events,
+                   count(*) FILTER (WHERE action = 'invalid_user') AS invalid_user
+            FROM new_events
+            WHERE ip IS NOT NULL AND timestamp IS NOT NULL
+            GROUP BY 1, 2
+        ) raw
+        GROUP BY 1, 2
+    ) d
+    WHERE d.ip IS NOT NULL
+    HAVING count(*) > 0;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS log_events_rollup ON log_events;
+CREATE TRIGGER log_events_rollup
+    AFTER INSERT ON log_events
+    REFERENCING NEW TABLE AS new_events
+    FOR EACH STATEMENT EXECUTE FUNCTION afw_rollup_log_events();
+
+-- Scores and decisions are not columns of log_events: whoever produces them
+-- records them here (one call per batch), see `record_outcomes` in
+-- core/context/context_enricher.py.
+CREATE OR REPLACE FUNCTION afw_rollup_record_outcomes(
+    ips inet[], timestamps timestamptz[], scores double precision[], labels text[]
+) RETURNS void LANGUAGE sql AS $$
+    SELECT afw_rollup_apply(
+        array_agg(ip), array_agg(hour), array_agg(0::bigint), array_agg(0::bigint),
+        array_agg(blocks), array_agg(score_sum), array_agg(score_n))
+    FROM (
+        SELECT o.ip, date_trunc('hour', o.ts) AS hour,
+               count(*) FILTER (WHERE o.label = 'block') AS blocks,
+               coalesce(sum(o.score), 0) AS score_sum,
+               count(o.score) AS score_n
+        FROM unnest(ips, timestamps, scores, labels) AS o(ip, ts, score, label)
+        WHERE o.ip IS NOT NULL AND o.ts IS NOT NULL
+        GROUP BY 1, 2
+    ) d
+    HAVING count(*) > 0;
+$$;
+
+-- One-off (re)build from history: counts from log_events, scores and
+-- decisions from a feature view (event_features_for_nn by default).
+CREATE OR REPLACE FUNCTION afw_rollup_rebuild(feature_view regclass DEFAULT 'event_features_for_nn')
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE ip_hourly_rollup, ip_rollup_totals IN EXCLUSIVE MODE;
+    TRUNCATE ip_hourly_rollup, ip_rollup_totals;
+
+    INSERT INTO ip_hourly_rollup (ip, hour, events, invalid_user)
+    SELECT afw_try_inet(ip::text), hour, sum(events), sum(invalid_user)
+    FROM (
+        SELECT ip, date_trunc('hour', timestamp) AS hour,
+               count(*) AS events, count(*) FILTER (WHERE action = 'invalid_user') AS invalid_user
+        FROM log_events
+        WHERE ip IS NOT NULL AND timestamp IS NOT NULL
+        GROUP BY 1, 2
+    ) raw
+    WHERE afw_try_inet(ip::text) IS NOT NULL
+    GROUP BY 1, 2;
+
+    EXECUTE format($q$
+        INSERT INTO ip_hourly_rollup AS r (ip, hour, blocks, score_sum, score_n)
+        SELECT afw_try_inet(ip::text), hour, sum(blocks), sum(score_sum), sum(score_n)
+        FROM (
+            SELECT ip, date_trunc('hour', timestamp) AS hour,
+                   count(*) FILTER (WHERE label_action = 'block') AS blocks,
+                   coalesce(sum(score), 0) AS score_sum, count(score) AS score_n
+            FROM %s
+            WHERE ip IS NOT NULL AND timestamp IS NOT NULL
+            GROUP BY 1, 2
+        ) raw
+        WHERE afw_try_inet(ip::text) IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (ip, hour) DO UPDATE SET
+            blocks = EXCLUDED.blocks, score_sum = EXCLUDED.score_sum, score_n = EXCLUDED.score_n
+    $q$, feature_view);
+
+    INSERT INTO ip_rollup_totals (ip, events, invalid_user, blocks, score_sum, score_n)
+    SELECT ip, sum(events), sum(invalid_user), sum(blocks), sum(score_sum), sum(score_n)
+    FROM ip_hourly_rollup
+    GROUP BY ip;
+END;
+$$;
+
+-- ---------------------------------------------------------------------
+-- Strategy view refreshes (marker table in db/schema.sql)
+-- ---------------------------------------------------------------------
+
+-- Refreshes a strategy materialized view and bumps its refresh marker in
+-- the same transaction. Pass `append_only => true` only when the refresh
+-- cannot have changed rows that were already in the view (it only added
+-- newer ones); training snapshots then append instead of rebuilding.
+CREATE OR REPLACE FUNCTION afw_refresh_view(target regclass, append_only boolean DEFAULT false)
+RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    new_version bigint;
+BEGIN
+    EXECUTE format('REFRESH MATERIALIZED VIEW %s', target);
+
+    INSERT INTO afw_view_refreshes AS m (view_name, version, full_version, refreshed_at)
+    VALUES (target::text, 1, 1, now())
+    ON CONFLICT (view_name) DO UPDATE SET
+        version      = m.version + 1,
+        full_version = CASE WHEN append_only THEN m.full_version ELSE m.version + 1 END,
+        refreshed_at = now()
+    RETURNING m.version INTO new_version;
+    RETURN new_version;
+END;
+$$;
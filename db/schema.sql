@@ -1 +1,48 @@
 -- Schema definitions
+
+-- Newest row timestamp each training run was trained on; incremental
+-- retraining (`--incremental`) only fetches rows newer than the adopted
+-- model's watermark, plus a bounded replay sample of older rows.
+ALTER TABLE training_runs ADD COLUMN IF NOT EXISTS data_watermark TIMESTAMPTZ;
+
+-- Per-epoch training log written by core/training/engine.py:
+-- [{"epoch", "loss", "seconds", "samples_per_sec", "eval_seconds", "accuracy", "recall"}, ...]
+ALTER TABLE training_runs ADD COLUMN IF NOT EXISTS epoch_log JSONB;
+
+-- Per-IP hourly rollups behind the enrichment features (ENRICH_FEATURE_SOURCE=rollup).
+-- `events` / `invalid_user` are maintained from `log_events` by the
+-- `log_events_rollup` trigger (db/functions.sql); `blocks` / `score_*` are
+-- added by the writers of scores and decisions (`afw_rollup_record_outcomes`).
+-- `ip_rollup_totals` holds the all-time sums, so no lookup scans history.
+CREATE TABLE IF NOT EXISTS ip_hourly_rollup (
+    ip              INET                NOT NULL,
+    hour            TIMESTAMPTZ         NOT NULL,
+    events          BIGINT              NOT NULL DEFAULT 0,
+    invalid_user    BIGINT              NOT NULL DEFAULT 0,
+    blocks          BIGINT              NOT NULL DEFAULT 0,
+    score_sum       DOUBLE PRECISION    NOT NULL DEFAULT 0,
+    score_n         BIGINT              NOT NULL DEFAULT 0,
+    PRIMARY KEY (ip, hour)
+);
+
+CREATE TABLE IF NOT EXISTS ip_rollup_totals (
+    ip              INET                PRIMARY KEY,
+    events          BIGINT              NOT NULL DEFAULT 0,
+    invalid_user    BIGINT              NOT NULL DEFAULT 0,
+    blocks          BIGINT              NOT NULL DEFAULT 0,
+    score_sum       DOUBLE PRECISION    NOT NULL DEFAULT 0,
+    score_n         BIGINT              NOT NULL DEFAULT 0
+);
+
+-- Refresh marker of the strategy materialized views, maintained by
+-- `afw_refresh_view` (db/functions.sql). `version` grows on every refresh;
+-- `full_version` is the version of the last refresh that may have changed
+-- existing rows (not declared append-only). Local training snapshots
+-- (core/training/snapshot.py) compare them with the version they were built
+-- from instead of scanning the view.
+CREATE TABLE IF NOT EXISTS afw_view_refreshes (
+    view_name       TEXT                PRIMARY KEY,
+    version         BIGINT              NOT NULL,
+    full_version    BIGINT              NOT NULL,
+    refreshed_at    TIMESTAMPTZ         NOT NULL
+);
@@ -0,0 +1,133 @@
+"""
+Benchmark: auth.log lines/second, legacy per-line parser vs AuthLogParser.
+
+Generates a synthetic auth.log sample (or reads --file), checks that the per-line
+and bulk APIs match the original parser, and reports lines/second for:
+
+- legacy: the original parse_with_status (recompiled regex, strptime),
+  imported from the git revision that added core/parser/auth.py
+- parse_with_status: the current per-line API
+- parse_lines / parse_buffer: the bulk AuthLogParser API
+
+Usage:
+    python -m scripts.bench.bench_auth_parser [--lines 2000000] [--file auth.log]
+"""
+import argparse
+import os
+import random
+import subprocess
+import time
+import types
+from datetime import datetime
+
+from core.parser.auth import AuthLogParser, parse_with_status
+
+MESSAGES = (
+    "Failed password for {user} from {ip} port {port} ssh2",
+    "Accepted password for {user} from {ip} port {port} ssh2",
+    "Invalid user {user} from {ip} port {port}",
+    "Invalid user {user} from {ip}",
+    "Failed password for invalid user {user} from {ip} port {port} ssh2",
+    "Connection closed by {ip} port {port} [preauth]",
+    "pam_unix(sshd:session): session opened for user {user} by (uid=0)",
+)
+USERS = ("root", "admin", "ubuntu", "test", "oracle", "git", "deploy")
+
+
+def generate_lines(count: int, seed: int = 42) -> list[str]:
+    """Chronological sshd lines spread over the year so far, like a real log."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    start = datetime(now.year, 1, 1).timestamp()
+    step = (now.timestamp() - start) / max(count, 1)
+    lines = []
+    for i in range(count):
+        message = rng.choice(MESSAGES).format(
+            user=rng.choice(USERS),
+            ip=f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            port=rng.randint(1024, 65535),
+        )
+        stamp = datetime.fromtimestamp(start + i * step).strftime("%b %e %H:%M:%S")
+        lines.append(f"{stamp} srv01 sshd[{rng.randint(100, 99999)}]: {message}\n")
+    if count:
+        lines[rng.randrange(count)] = "garbage line that is not syslog\n"
+    return lines
+
+
+def load_baseline(path: str = "core/parser/auth.py", rev: str = None):
+    """
+    Imports `path` as it was at git revision `rev` (default: the commit that
+    added it) as a standalone module, so the baseline is the original code
+    rather than a copy of it. Returns (module, rev).
+    """
+    if rev is None:
+        added = subprocess.check_output(
+            ["git", "log", "--diff-filter=A", "--format=%h", "--", path], text=True).split()
+        if not added:
+            raise SystemExit(f"{path} has no git history to take a baseline from")
+        rev = added[-1]
+    source = subprocess.check_output(["git", "show", f"{rev}:{path}"], text=True)
+    module = types.ModuleType(f"baseline_{rev}")
+    # Relative imports resolve against the current package.
+    module.__package__ = os.path.dirname(path).replace("/", ".")
+    exec(compile(source, f"{rev}:{path}", "exec"), module.__dict__)
+    return module, rev
+
+
+def check_parity(label: str, lines, events, baseline):
+    """Compares `events` with the baseline parse of `lines` (failed events carry "now")."""
+    for line, event in zip(lines, events):
+        expected = baseline.parse_with_status(line)
+        if expected["parse_status"] == "failed":
+            expected["timestamp"] = event["timestamp"]
+        if event != expected:
+            raise SystemExit(f"{label} mismatch on line: {line!r}\n{event}\n{expected}")
+    print(f"Parity OK: {label} vs baseline on {len(lines):,} lines")
+
+
+def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>20}: {count / elapsed:12,.0f} lines/s  ({elapsed:.2f}s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--file", help="Use an existing auth.log instead of a synthetic sample")
+    parser.add_argument("--baseline-rev", help="git revision of the baseline parser (default: the first one)")
+    args = parser.parse_args()
+    baseline, rev = load_baseline(rev=args.baseline_rev)
+    print(f"Baseline: core/parser/auth.py at {rev}")
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            data = f.read()
+        lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    else:
+        lines = generate_lines(args.lines)
+        data = "".join(lines).encode()
+    count = len(lines)
+    print(f"Sample: {count:,} lines, {len(data) / 2**20:.1f} MiB")
+
+    # The baseline takes the current year for every line; the sample spans
+    # this year only, where the new year inference agrees with it.
+    sample = lines[:10_000]
+    sample_data = "".join(sample).encode()
+    check_parity("parse_with_status", sample, [parse_with_status(line) for line in sample], baseline)
+    check_parity("parse_lines", sample, list(AuthLogParser().parse_lines(sample)), baseline)
+    check_parity("parse_buffer", sample, AuthLogParser().parse_buffer(sample_data), baseline)
+    check_parity("parse_buffer_batch", sample, AuthLogParser().parse_buffer_batch(sample_data).to_dicts(),
+                 baseline)
+
+    legacy = timed("legacy", count, lambda: [baseline.parse_with_status(line) for line in lines])
+    timed("parse_with_status", count, lambda: [parse_with_status(line) for line in lines])
+    timed("parse_lines", count, lambda: list(AuthLogParser().parse_lines(lines)))
+    bulk = timed("parse_buffer", count, lambda: AuthLogParser().parse_buffer(data))
+    print(f"Speed-up parse_buffer vs legacy: {legacy / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
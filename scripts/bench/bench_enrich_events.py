@@ -0,0 +1,70 @@
+"""
+Benchmark: per-event cost of `enrich_event` vs `enrich_events`.
+
+Samples real (ip, timestamp) pairs from `event_features_for_nn`, checks that
+both paths return identical features, and prints the per-event cost of the
+batch API at batch sizes 1, 64 and 1024.
+
+Usage:
+    python -m scripts.bench.bench_enrich_events [--rounds N]
+"""
+import argparse
+import os
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+from core.context.context_enricher import enrich_event, enrich_events
+
+load_dotenv()
+PG_DSN = os.getenv("PG_DSN")
+
+BATCH_SIZES = (1, 64, 1024)
+
+
+def sample_events(limit: int) -> list[dict]:
+    with psycopg2.connect(PG_DSN) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT host(ip), timestamp FROM event_features_for_nn
+                ORDER BY random() LIMIT %s;
+            """, (limit,))
+            rows = cur.fetchall()
+    return [{"ip": ip, "timestamp": ts.isoformat()} for ip, ts in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    events = sample_events(max(BATCH_SIZES))
+    if not events:
+        raise SystemExit("event_features_for_nn is empty, nothing to benchmark.")
+
+    # Parity check on a small slice: the batch path must be bit-identical.
+    check = events[:64]
+    expected = [enrich_event(e) for e in check]
+    if enrich_events(check) != expected:
+        raise SystemExit("enrich_events() diverges from enrich_event()")
+    print(f"Parity OK on {len(check)} events")
+
+    start = time.perf_counter()
+    for event in check:
+        enrich_event(event)
+    per_event = (time.perf_counter() - start) / len(check)
+    print(f"{'enrich_event':>20}: {per_event * 1e3:8.3f} ms/event")
+
+    for size in BATCH_SIZES:
+        batch = (events * (size // len(events) + 1))[:size]
+        best = float("inf")
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            enrich_events(batch)
+            best = min(best, time.perf_counter() - start)
+        print(f"{f'enrich_events[{size}]':>20}: {best / size * 1e3:8.3f} ms/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: NNClassifier events/second, per-event predict + predict_proba
+vs classify_batch at several batch sizes.
+
+Uses the trained checkpoint (models/firewall_nn.pt, or --model) and random feature
+rows. Before timing, it checks that classify_batch and the per-event API
+match the original NNClassifier, imported from the git revision that added
+core/classifier/nn_model.py. The original fed features to the network
+unscaled, so it is given the rows the checkpoint's vectorizer scaled (the
+same rows for checkpoints without scaling statistics).
+
+Usage:
+    python -m scripts.bench.bench_inference [--events 20000] [--model models/firewall_nn.pt]
+"""
+import argparse
+import random
+import time
+
+import torch
+
+from core.classifier.nn_model import NNClassifier
+from scripts.bench.bench_auth_parser import load_baseline
+
+BATCH_SIZES = (1, 8, 64, 512, 4096)
+
+
+def generate_events(feature_order, count: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    return [{f: rng.random() * 10 for f in feature_order} for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--model", default="models/firewall_nn.pt")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--baseline-rev", help="git revision of the baseline classifier (default: the first one)")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    clf = NNClassifier(args.model)
+    events = generate_events(clf.feature_order, args.events)
+    print(f"Model: {args.model} ({len(clf.feature_order)} features), {len(events):,} events")
+
+    module, rev = load_baseline("core/classifier/nn_model.py", args.baseline_rev)
+    original = module.NNClassifier(args.model)
+    print(f"Baseline: core/classifier/nn_model.py at {rev}")
+
+    rows = [dict(zip(clf.feature_order, row)) for row in clf.vectorizer.transform(events).tolist()]
+    sample = events[:1000]
+    labels, scores = clf.classify_batch(sample)
+    for event, row, label, score in zip(sample, rows, labels, scores):
+        expected_label, expected_score = str(original.predict(row)), original.predict_proba(row)
+        if (str(label) != expected_label or abs(score - expected_score) > 1e-5
+                or str(clf.predict(event)) != expected_label
+                or abs(clf.predict_proba(event) - expected_score) > 1e-5):
+            raise SystemExit(f"Mismatch on {event}: {label} {score} vs baseline {expected_label} {expected_score}")
+    print(f"Parity OK: classify_batch and predict/predict_proba vs baseline on {len(sample):,} events")
+
+    start = time.perf_counter()
+    for row in rows:
+        original.predict(row)
+        original.predict_proba(row)
+    original_elapsed = time.perf_counter() - start
+    print(f"{'original':>12}: {len(events) / original_elapsed:12,.0f} events/s")
+
+    start = time.perf_counter()
+    for event in events:
+        clf.predict(event)
+        clf.predict_proba(event)
+    elapsed = time.perf_counter() - start
+    print(f"{'per-event':>12}: {len(events) / elapsed:12,.0f} events/s  "
+          f"({original_elapsed / elapsed:.1f}x)")
+
+    for size in BATCH_SIZES:
+        start = time.perf_counter()
+        for i in range(0, len(events), size):
+            clf.classify_batch(events[i:i + size])
+        elapsed = time.perf_counter() - start
+        print(f"{f'batch {size}':>12}: {len(events) / elapsed:12,.0f} events/s  "
+              f"({original_elapsed / elapsed:.1f}x, {elapsed / -(-len(events) // size) * 1e3:.3f} ms/batch)")
+
+
+if __name__ == "__main__":
+    main()
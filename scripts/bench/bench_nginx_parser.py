@@ -0,0 +1,108 @@
+"""
+Benchmark: nginx access-log lines/second for NginxLogParser.
+
+Generates a synthetic combined-format sample (or reads --file), checks that
+the bulk and columnar paths agree with the per-line parser, and reports
+lines/second for parse_lines, parse_buffer and parse_buffer_batch, next to
+a naive per-line regex + strptime baseline.
+
+Usage:
+    python -m scripts.bench.bench_nginx_parser [--lines 3000000] [--file access.log]
+        [--log-format '$remote_addr ...']
+"""
+import argparse
+import random
+import re
+from datetime import datetime, timedelta, timezone
+
+from core.parser.nginx import COMBINED_FORMAT, NginxLogParser
+from scripts.bench.bench_auth_parser import timed
+
+PATHS = ("/", "/login", "/web/login", "/api/v1/items", "/static/app.js", "/wp-login.php",
+         "/.env", "/favicon.ico", "/xmlrpc/2/object", "/robots.txt")
+METHODS = ("GET", "GET", "GET", "POST", "HEAD")
+STATUSES = (200, 200, 200, 301, 304, 400, 401, 403, 404, 500)
+AGENTS = ("Mozilla/5.0 (X11; Linux x86_64)", "curl/8.5.0", "python-requests/2.31",
+          "Go-http-client/1.1", "-")
+
+NAIVE_PATTERN = re.compile(
+    r'(?P<ip>\S+) - (?P<user>\S+) \[(?P<time>[^\]]+)\] "(?P<request>[^"]*)" '
+    r'(?P<status>\d{3}) (?P<bytes>\S+) "(?P<referer>[^"]*)" "(?P<agent>[^"]*)"'
+)
+
+
+def generate_lines(count: int, seed: int = 42) -> list[str]:
+    """Chronological combined-format lines, a few per second, like a busy vhost."""
+    rng = random.Random(seed)
+    tz = timezone(timedelta(hours=2))
+    start = datetime.now(tz) - timedelta(seconds=count // 4)
+    lines = []
+    for i in range(count):
+        stamp = (start + timedelta(seconds=i // 4)).strftime("%d/%b/%Y:%H:%M:%S %z")
+        ip = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        user = "admin" if rng.random() < 0.02 else "-"
+        request = f"{rng.choice(METHODS)} {rng.choice(PATHS)}?id={rng.randint(1, 9999)} HTTP/1.1"
+        lines.append(
+            f'{ip} - {user} [{stamp}] "{request}" {rng.choice(STATUSES)} {rng.randint(0, 50000)} '
+            f'"-" "{rng.choice(AGENTS)}"\n'
+        )
+    if count:
+        lines[rng.randrange(count)] = "garbage line that is not an access log\n"
+    return lines
+
+
+def naive_parse(line: str):
+    """One-regex-per-line parsing with strptime, as a typical ad-hoc script does it."""
+    match = NAIVE_PATTERN.match(line.strip())
+    if not match:
+        return None
+    event = match.groupdict()
+    event["time"] = datetime.strptime(event["time"], "%d/%b/%Y:%H:%M:%S %z").isoformat()
+    event["status"] = int(event["status"])
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=3_000_000)
+    parser.add_argument("--file", help="Use an existing access.log instead of a synthetic sample")
+    parser.add_argument("--log-format", default=COMBINED_FORMAT)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            data = f.read()
+        lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    else:
+        lines = generate_lines(args.lines)
+        data = "".join(lines).encode()
+    count = len(lines)
+    print(f"Sample: {count:,} lines, {len(data) / 2**20:.1f} MiB")
+
+    # The columnar path must rebuild the same events (failed events carry "now",
+    # batch timestamps come back normalized to UTC).
+    sample = lines[:10_000]
+    nginx = NginxLogParser(args.log_format)
+    per_line = list(nginx.parse_lines(sample))
+    columnar = nginx.parse_batch(sample).to_dicts()
+    for line, expected, event in zip(sample, per_line, columnar):
+        if expected["parse_status"] == "failed":
+            continue
+        expected_ts = datetime.fromisoformat(expected["timestamp"])
+        if datetime.fromisoformat(event.pop("timestamp")) != expected_ts:
+            raise SystemExit(f"Timestamp mismatch on line: {line!r}")
+        expected.pop("timestamp")
+        if event != expected:
+            raise SystemExit(f"Mismatch on line: {line!r}\n{event}\n{expected}")
+    failed = sum(e["parse_status"] == "failed" for e in per_line)
+    print(f"Parity OK on {len(sample):,} lines ({failed} failed)")
+
+    naive = timed("naive regex+strptime", count, lambda: [naive_parse(line) for line in lines])
+    timed("parse_lines", count, lambda: list(NginxLogParser(args.log_format).parse_lines(lines)))
+    timed("parse_buffer", count, lambda: NginxLogParser(args.log_format).parse_buffer(data))
+    bulk = timed("parse_buffer_batch", count, lambda: NginxLogParser(args.log_format).parse_buffer_batch(data))
+    print(f"Speed-up parse_buffer_batch vs naive: {naive / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
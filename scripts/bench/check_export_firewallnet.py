@@ -0,0 +1,72 @@
+"""
+Smoke check: export a FirewallNet checkpoint and score events with the NumPy runtime.
+
+`export_firewallnet` already compares the runtime with the torch model on a
+random feature matrix. This also scores feature dicts through
+`NumpyNNClassifier.classify_batch` / `predict` (the FeatureBuffer +
+FeatureVectorizer path the scorers use) and checks they match the matrix
+path, so a change in either signature fails here instead of at load time.
+
+Usage:
+    python -m scripts.bench.check_export_firewallnet [--rows 1000] [--checkpoint models/firewall_nn.pt]
+        [--scaler models/nn_firewall_scaler.joblib]
+"""
+import argparse
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from core.classifier.export import export_firewallnet
+from core.classifier.numpy_runtime import NumpyNNClassifier
+from core.vectorizer.features import FeatureVectorizer
+
+ACTIONS = ("login_attempt", "invalid_user", "other")
+PARSE_STATUSES = ("parsed", "partial", "failed")
+
+
+def generate_rows(feature_order, count: int, seed: int = 42) -> list[dict]:
+    """Feature dicts with raw categorical values, as the enrich stage produces them."""
+    rng = random.Random(seed)
+    numeric = [f for f in feature_order if not f.startswith(("action_", "parse_status_"))]
+    rows = []
+    for _ in range(count):
+        row = {f: rng.random() * rng.choice((1, 10, 100)) for f in numeric}
+        row["action"] = rng.choice(ACTIONS)
+        row["parse_status"] = rng.choice(PARSE_STATUSES)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--checkpoint", default="models/firewall_nn.pt")
+    parser.add_argument("--scaler", default="models/nn_firewall_scaler.joblib")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "firewall_nn.afw")
+        scaler = args.scaler if args.scaler and os.path.exists(args.scaler) else None
+        report = export_firewallnet(args.checkpoint, out, scaler)
+        print(f"export: OK  {report['bytes']:,} bytes  max prob diff vs torch {report['max_prob_diff']:.2e}")
+
+        runtime = NumpyNNClassifier(out)
+        rows = generate_rows(runtime.feature_order, args.rows)
+        labels, probs = runtime.classify_batch(rows)
+
+        matrix = FeatureVectorizer.from_feature_order(runtime.feature_order).transform(rows, scale=False)
+        expected = runtime.probabilities(matrix)
+        expected_labels = runtime.classes[expected.argmax(axis=1)].tolist()
+        max_diff = float(np.abs(np.asarray(probs) - expected.max(axis=1)).max())
+        mismatches = sum(a != b for a, b in zip(labels, expected_labels))
+        single = runtime.predict(rows[0])
+        if mismatches or max_diff > 1e-6 or single != expected_labels[0]:
+            raise SystemExit(f"runtime: MISMATCH  label mismatches {mismatches}/{len(rows)}  "
+                             f"max prob diff {max_diff:.2e}")
+        print(f"runtime: OK  {len(rows)} rows  labels {sorted(set(labels))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Parity check: ActionPredictor (FeatureVectorizer, scaler folded or not) vs the
+former predict_action path (one-row DataFrame + reindex + scaler.transform).
+
+Builds random feature rows for the trained model, compares labels and
+probabilities row by row, and times per-event inference on each path.
+The timings cover vectorizing + scaling + one forward pass only: rows are
+already enriched, so the `enrich_event` query that dominates a real
+`predict_action` call is not included.
+
+Usage:
+    python -m scripts.bench.check_predictor_parity [--rows 5000] [--model models/firewall_nn.pt]
+        [--scaler models/nn_firewall_scaler.joblib] [--no-verify]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+from core.classifier.predictor import MODEL_FILE, SCALER_FILE, ActionPredictor, build_feature_row
+
+ACTIONS = ("login_attempt", "invalid_user", "other")
+PARSE_STATUSES = ("parsed", "partial", "failed")
+
+
+def generate_rows(feature_order, count: int, seed: int = 42) -> list[dict]:
+    """Rows as `predict_action` builds them: base event features + context features."""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        event = {
+            "timestamp"     : f"2025-05-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:10:00Z",
+            "action"        : rng.choice(ACTIONS),
+            "parse_status"  : rng.choice(PARSE_STATUSES),
+            "success"       : rng.random() < 0.2,
+        }
+        enriched = {
+            f: rng.random() * rng.choice((1, 10, 100))
+            for f in feature_order if not f.startswith(("action_", "parse_status_"))
+        }
+        rows.append(build_feature_row(event, rng.randint(0, 200), rng.randint(0, 50), enriched))
+    return rows
+
+
+def legacy_probs(state, row) -> np.ndarray:
+    """The former per-event path, with the categoricals one-hot encoded as `pd.get_dummies` does."""
+    row = dict(row)
+    for column in ("action", "parse_status"):
+        row[f"{column}_{row.pop(column)}"] = 1
+    df = pd.DataFrame([row])
+    df = df.reindex(columns=state.feature_order, fill_value=0)
+    scaled = state.scaler.transform(df)
+    with torch.no_grad():
+        logits = state.legacy_model(torch.tensor(scaled, dtype=torch.float32))
+        return F.softmax(logits, dim=1).numpy()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    parser.add_argument("--no-verify", action="store_true", help="skip the model integrity check")
+    args = parser.parse_args()
+
+    plain = ActionPredictor(args.model, args.scaler, verify_integrity=not args.no_verify, fold_scaler=False)
+    folded = ActionPredictor(args.model, args.scaler, verify_integrity=not args.no_verify, fold_scaler=True)
+    state = plain.state
+    state.legacy_model = plain.state.model      # Unfolded weights, as loaded before.
+    rows = generate_rows(state.feature_order, args.rows)
+
+    for name, predictor in (("vectorizer", plain), ("folded", folded)):
+        max_diff = 0.0
+        mismatches = 0
+        for row in rows:
+            expected = legacy_probs(state, row)
+            probs = predictor._infer(predictor.state, predictor.vectorize(row))[0]
+            max_diff = max(max_diff, float(np.abs(probs - expected).max()))
+            mismatches += int(probs.argmax() != expected.argmax())
+        status = "OK" if mismatches == 0 and max_diff < 1e-5 else "MISMATCH"
+        print(f"{name:>14}: {status}  label mismatches {mismatches}/{len(rows)}  max prob diff {max_diff:.2e}")
+
+    def per_event(fn):
+        start = time.perf_counter()
+        for row in rows:
+            fn(row)
+        return len(rows) / (time.perf_counter() - start)
+
+    print(f"{'legacy':>14}: {per_event(lambda row: legacy_probs(state, row)):10,.0f} events/s")
+    for name, predictor in (("vectorizer", plain), ("folded", folded)):
+        model_state = predictor.state
+        buffer = predictor._row_buffer(model_state)
+        vectorizer = model_state.vectorizer
+        rate = per_event(lambda row: predictor._infer(model_state, vectorizer.transform([row], out=buffer, scale=False)))
+        print(f"{name:>14}: {rate:10,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
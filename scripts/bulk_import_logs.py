@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import os
+from dotenv import load_dotenv
+
+from core.ingest.bulk_import import DEFAULT_CHUNK_BYTES, bulk_import, print_report
+from core.storage.postgres import PostgresLogger
+
+load_dotenv()
+
+PG_DSN = os.getenv("PG_DSN")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk import auth.log files and rotated .gz archives")
+    parser.add_argument("paths", nargs="+", help="auth.log, auth.log.1, auth.log.2.gz, ...")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_BYTES >> 20,
+                        help="split size for plain files")
+    parser.add_argument("--dry-run", action="store_true", help="parse only, do not write to Postgres")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    chunk_bytes = args.chunk_mb << 20
+
+    if args.dry_run:
+        report = await bulk_import(args.paths, None, args.workers, chunk_bytes)
+    else:
+        # Batches are already bounded by --chunk-mb: one COPY each, no re-buffering.
+        async with PostgresLogger(PG_DSN) as logger:
+            report = await bulk_import(args.paths, logger, args.workers, chunk_bytes)
+
+    print_report(report)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+import asyncio
+import os
+from collections import deque
+from dotenv import load_dotenv
+
+from core.ingest.pipeline import IngestPipeline
+from core.ingest.tail_log import LogFollower
+from core.storage.postgres import PostgresLogger
+
+load_dotenv()
+
+LOG_PATH = os.getenv("AUTH_LOG_PATH", "/var/log/auth.log")
+CHECKPOINT_PATH = os.getenv("AUTH_LOG_CHECKPOINT", "auth.log.checkpoint.json")
+PG_DSN = os.getenv("PG_DSN")
+
+async def main():
+    follower = LogFollower(LOG_PATH, checkpoint_path=CHECKPOINT_PATH, autocommit=False)
+
+    # With one parse and one store worker, batches reach the store in read
+    # order, so each stored batch can commit the position it was read at.
+    positions = deque()
+
+    async def read_batches():
+        async for lines in follower.abatches():
+            positions.append(follower.position)
+            yield lines
+
+    class CheckpointingStore:
+        def __init__(self, logger):
+            self.logger = logger
+
+        async def insert_batch(self, batch):
+            await self.logger.insert_batch(batch)
+            follower.commit(positions.popleft())
+
+    async with PostgresLogger(PG_DSN) as logger:
+        pipeline = IngestPipeline(CheckpointingStore(logger), parse_workers=1, store_workers=1,
+                                  report_interval=60)
+        try:
+            await pipeline.run(read_batches())
+        finally:
+            follower.close()
+            pipeline.print_report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
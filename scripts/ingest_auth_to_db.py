@@ -3,7 +3,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-from core.parser.auth import parse_with_status
+from core.ingest.pipeline import IngestPipeline
 from core.ingest.tail_log import replay_log
 from core.storage.postgres import PostgresLogger
 
@@ -13,15 +13,12 @@ LOG_PATH = Path("tests/fixtures/ingest/samples/auth.log")
 PG_DSN = os.getenv("PG_DSN")
 
 async def main():
-    logger = PostgresLogger(PG_DSN)
-    await logger.connect()
+    async with PostgresLogger(PG_DSN) as logger:
+        pipeline = IngestPipeline(logger, report_interval=10)
+        await pipeline.run(replay_log(LOG_PATH))
 
-    for line in replay_log(LOG_PATH):
-        event = parse_with_status(line)
-        print(f"✅ Inserted: {event['timestamp']} - {event['action']}")
-        await logger.insert_event(event)
-
-    await logger.close()
+    pipeline.print_report()
+    print(f"✅ Inserted: {logger.flush_stats()['rows']} events")
 
 if __name__ == "__main__":
     asyncio.run(main())
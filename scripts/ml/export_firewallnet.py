@@ -0,0 +1,24 @@
+import argparse
+import time
+
+from core.classifier.export import export_firewallnet
+from core.classifier.numpy_runtime import NumpyNNClassifier
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export FirewallNet + scaler for the NumPy runtime")
+    parser.add_argument("--checkpoint", default="models/firewall_nn.pt")
+    parser.add_argument("--scaler", default="models/nn_firewall_scaler.joblib")
+    parser.add_argument("--out", default="models/firewall_nn.afw")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = export_firewallnet(args.checkpoint, args.out, args.scaler)
+
+    start = time.perf_counter()
+    NumpyNNClassifier(args.out)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    print(f"✅ Exported {report['path']} ({report['bytes']:,} bytes)")
+    print(f"   layers: {', '.join(report['layers'])}  features: {report['features']}  classes: {report['classes']}")
+    print(f"   max prob diff vs torch: {report['max_prob_diff']:.2e}  load time: {load_ms:.2f} ms")
@@ -0,0 +1,89 @@
+import time
+import torch
+from joblib                     import dump
+from config.config              import MODEL_PATH
+from core.context.utils         import get_active_strategy_view
+from core.context.utils         import register_training_run
+from core.context.utils         import adopt_strategy
+from core.training.data         import load_training_data
+from core.training.engine       import TRAIN_BATCH_SIZE
+from core.training.selection    import CLASS_WEIGHTING, SELECTION_EPOCHS, SELECTION_WORKERS
+from core.training.selection    import candidate_grid, random_candidates, select_model
+from core.training.snapshot     import TRAIN_SNAPSHOT, load_snapshot_training_data
+
+
+def select_firewall_model(candidates, folds=0, workers=SELECTION_WORKERS, epochs=SELECTION_EPOCHS, seed=42,
+                          snapshot=TRAIN_SNAPSHOT):
+    # 1. Load the active strategy view once; workers share the matrix
+    view_name = get_active_strategy_view()
+    print(f"Loading data from materialized view {view_name} ...")
+    data = load_snapshot_training_data(view_name) if snapshot else load_training_data(view_name)
+    print(f"Loaded {data.describe()}")
+
+    # 2. Evaluate every candidate across the process pool
+    training_start_time = time.time()
+    result = select_model(data, candidates, folds=folds, workers=workers, epochs=epochs, seed=seed)
+    best = result["best"]
+    training_duration = time.time() - training_start_time
+
+    # 3. Register only the best candidate
+    if not adopt_strategy(best["recall"]):
+        print("Best candidate is not better than previous, will not be adopted.")
+        return False
+
+    print("Best candidate is better than previous, will be adopted.")
+    vectorizer = data.vectorizer
+    dump(vectorizer.feature_order, 'models/nn_firewall_feature_order.joblib')
+    dump(data.label_encoder, 'models/nn_firewall_label_encoder.joblib')
+    dump(vectorizer, 'models/nn_firewall_vectorizer.joblib')
+    dump(vectorizer.to_scaler(), 'models/nn_firewall_scaler.joblib')
+    torch.save({
+        'model_state_dict'  : best["state"],
+        'feature_order'     : vectorizer.feature_order,
+        'vectorizer'        : vectorizer.to_dict(),
+        'label_encoder'     : data.label_encoder
+    }, MODEL_PATH)
+
+    cv = (f", {folds}-fold CV recall {best['cv_recall']:.4f}" if folds
+          else f", validation recall {best['validation_recall']:.4f}")
+    return register_training_run(
+        accuracy            =   best["accuracy"],
+        recall              =   best["recall"],
+        loss                =   best["loss"],
+        notes               =   f"model selection: best of {len(result['candidates'])} candidates "
+                                f"{best['params']}{cv}",
+        training_duration   =   training_duration,
+        model_hash          =   True,
+        compress            =   True,
+        data_watermark      =   data.watermark,
+        epoch_log           =   best["epochs"]
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Select FirewallNet hyperparameters in parallel and register the best")
+    parser.add_argument("--lr", type=float, nargs="+", default=[1e-3, 3e-4, 1e-4], help="grid of learning rates")
+    parser.add_argument("--class-weighting", nargs="+", choices=CLASS_WEIGHTING, default=list(CLASS_WEIGHTING))
+    parser.add_argument("--batch-size", type=int, nargs="+", default=None,
+                        help=f"batch sizes (default: {TRAIN_BATCH_SIZE} for the grid, 32-256 for --random)")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="random search: N candidates (log-uniform lr) instead of the grid")
+    parser.add_argument("--folds", type=int, default=0,
+                        help="k-fold CV on the training split (0: one held-out validation split)")
+    parser.add_argument("--workers", type=int, default=SELECTION_WORKERS, help="processes (0: one per core)")
+    parser.add_argument("--epochs", type=int, default=SELECTION_EPOCHS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--snapshot", action=argparse.BooleanOptionalAction, default=TRAIN_SNAPSHOT,
+                        help="read the view through the local snapshot cache")
+    args = parser.parse_args()
+
+    if args.random:
+        sizes = {"batch_sizes": args.batch_size} if args.batch_size else {}
+        candidates = random_candidates(args.random, class_weighting=args.class_weighting, seed=args.seed, **sizes)
+    else:
+        candidates = candidate_grid(args.lr, args.class_weighting, args.batch_size or [TRAIN_BATCH_SIZE])
+    select_firewall_model(candidates, args.folds, args.workers, args.epochs, args.seed, args.snapshot)
@@ -0,0 +1,19 @@
+import argparse
+import asyncio
+
+from core.service.scoring import SCORING_LATENCY_BUDGET_MS, SCORING_MAX_BATCH, SCORING_SOCKET, serve
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local scoring daemon (JSON lines)")
+    parser.add_argument("--socket", default=SCORING_SOCKET, help="Unix socket path")
+    parser.add_argument("--port", type=int, default=None, help="listen on 127.0.0.1:PORT instead of a socket")
+    parser.add_argument("--max-batch", type=int, default=SCORING_MAX_BATCH)
+    parser.add_argument("--latency-budget-ms", type=float, default=SCORING_LATENCY_BUDGET_MS)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        asyncio.run(serve(args.socket, args.port, args.max_batch, args.latency_budget_ms))
+    except KeyboardInterrupt:
+        print("👋 Scoring daemon stopped")